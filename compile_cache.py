@@ -0,0 +1,217 @@
+"""
+a bounded, content addressed cache of compiled scripts, for web.py
+
+scripts are keyed by the sha1 of their text and the compiler's version
+(see source_version), so a changed compiler doesn't get the old one's
+output. the most recently used ones are kept in memory, and if there is a
+directory, compiled scripts are also written there as <key>.js, so a
+restart doesn't start from nothing. the directory keeps at most
+disk_size of them, the ones read or written longest ago go first.
+the disk is only ever a cache: when reading, writing or pruning it
+fails (a full disk, say), that's counted in disk_errors and the
+compiled script is still kept in memory and returned
+"""
+import errno
+import os
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def script_key(script, version=''):
+    if isinstance(script, unicode):
+        script = script.encode('utf-8')
+    return hashlib.sha1(version + '\0' + script).hexdigest()
+
+
+def source_version(*modules):
+    """
+    a version for a compiler made of modules: the sha1 of their source
+    """
+    digest = hashlib.sha1()
+    for module in modules:
+        path = module.__file__
+        if path.endswith(('.pyc', '.pyo')):
+            path = path[:-1]
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class DBNCompileCache:
+    """
+    compile_function turns script text into compiled text (js, for us)
+    size is how many compiled scripts are kept in memory
+    directory is where to keep them on disk, or None
+    disk_size is how many are kept there
+    version is the compiler's, see source_version
+    """
+
+    def __init__(self, compile_function, size=128, directory=None, disk_size=4096, version=''):
+        if size < 1:
+            raise ValueError("Compile cache size must be at least 1, not %d" % size)
+        if disk_size < 1:
+            raise ValueError("Compile cache disk size must be at least 1, not %d" % disk_size)
+        self.compile_function = compile_function
+        self.size = size
+        self.directory = directory
+        self.disk_size = disk_size
+        self.version = version
+        self._disk_entries = 0
+        if directory is not None:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            self._disk_entries = len(self._disk_files())
+
+        self._compiled = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self.disk_errors = 0
+
+    def compile(self, script):
+        """
+        returns the compiled script, compiling it only if it isn't cached
+        exceptions from compile_function are raised, and not cached
+        """
+        key = script_key(script, self.version)
+        with self._lock:
+            compiled = self._compiled.pop(key, None)
+            if compiled is not None:
+                self._compiled[key] = compiled  # most recently used goes last
+                self.hits += 1
+                return compiled
+
+        compiled = self._read(key)
+        if compiled is not None:
+            with self._lock:
+                self.disk_hits += 1
+        else:
+            compiled = self.compile_function(script)
+            self._write(key, compiled)
+            with self._lock:
+                self.misses += 1
+
+        self._remember(key, compiled)
+        return compiled
+
+    def _remember(self, key, compiled):
+        with self._lock:
+            self._compiled.pop(key, None)
+            self._compiled[key] = compiled
+            while len(self._compiled) > self.size:
+                self._compiled.popitem(last=False)
+                self.evictions += 1
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.js')
+
+    def _disk_files(self):
+        return [name for name in os.listdir(self.directory) if name.endswith('.js')]
+
+    def _disk_error(self):
+        with self._lock:
+            self.disk_errors += 1
+
+    def _read(self, key):
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                compiled = f.read()
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                self._disk_error()
+            return None
+        try:
+            os.utime(path, None)  # used just now, for _prune
+        except OSError:
+            pass
+        return compiled
+
+    def _write(self, key, compiled):
+        """
+        writes to a temporary file first, so a reader never sees half a script
+        """
+        if self.directory is None:
+            return
+        temp_path = None
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                f.write(compiled)
+            os.rename(temp_path, self._path(key))
+        except (IOError, OSError):
+            self._disk_error()
+            if temp_path is not None and os.path.exists(temp_path):
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+            return
+        with self._lock:
+            self._disk_entries += 1
+            full = self._disk_entries > self.disk_size
+        if full:
+            self._prune()
+
+    def _prune(self):
+        """
+        takes the directory down to three quarters of disk_size, so it
+        doesn't have to be looked through again on the very next write
+        """
+        try:
+            paths = [os.path.join(self.directory, name) for name in self._disk_files()]
+        except OSError:
+            self._disk_error()
+            return
+        modified = []
+        for path in paths:
+            try:
+                modified.append((os.path.getmtime(path), path))
+            except OSError:
+                pass  # another thread (or process) got it first
+        modified.sort()
+        keep = self.disk_size * 3 // 4
+        removed = 0
+        for _, path in modified[:max(0, len(modified) - keep)]:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_entries = len(modified) - removed
+            self.disk_evictions += removed
+
+    def clear(self):
+        """
+        empties the memory tier (the disk tier is left alone)
+        """
+        with self._lock:
+            self._compiled.clear()
+
+    def __len__(self):
+        return len(self._compiled)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'entries': len(self._compiled),
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'directory': self.directory,
+                'disk_size': self.disk_size,
+                'disk_entries': self._disk_entries,
+                'disk_evictions': self.disk_evictions,
+                'disk_errors': self.disk_errors,
+            }
@@ -0,0 +1,293 @@
+"""
+runs a nest of Repeats that only draws (Set [x y] and Line, with
+arithmetic arguments) all at once with numpy, instead of one state per
+pixel. only for states that don't keep a history (mutable ones): with a
+history, every Set is a state of its own that the gui wants to see
+
+every Repeat of the nest becomes a table, with a row per time around
+(inner Repeats repeat their parent's rows, so a range may depend on the
+variables around it), and every expression is worked out for all the rows
+at once. the writes are put back in the order they would have run in, and
+set_pixels keeps the last write of a pixel, so overlapping writes come out
+the same. the Repeat variables are left with their last values, like the
+Repeats would have left them
+
+when something can't be done this way at run time (dividing by 0, numbers
+too big for int64, a redefined Line, too many rows, more steps than the
+state's limits have left) the Repeat runs as usual
+"""
+import numpy
+
+import builtins
+import utils
+from dbnstate import RECURSION_LIMIT
+
+# rows in any one table before giving up
+MAX_ROWS = 1 << 20
+
+# operands bigger than this might overflow int64 when multiplied
+MAX_FACTOR = 1 << 31
+
+
+class DBNBatchFallback(Exception):
+    """
+    the batch can't run, the Repeat has to run as usual
+    """
+    pass
+
+
+def expression_names(node):
+    """
+    the variable names an arithmetic expression reads,
+    or None if it isn't one (it reads a pixel)
+    """
+    if node.type == 'number':
+        return set()
+    if node.type == 'word':
+        return set([node.name])
+    if node.type == 'hoisted':
+        return expression_names(node.children[0])
+    if node.type != 'operation':
+        return None
+
+    names = set()
+    for child in node.children:
+        child_names = expression_names(child)
+        if child_names is None:
+            return None
+        names.update(child_names)
+    return names
+
+
+def loop_variables(node):
+    """
+    the names of node and every Repeat inside it
+    """
+    names = set()
+    if node.type == 'repeat':
+        names.add(node.children[0].name)
+    for child in node.children:
+        names.update(loop_variables(child))
+    return names
+
+
+def batchable(repeat):
+    """
+    whether repeat is a nest of Repeats, Set [x y]s and Lines that reads
+    every Repeat variable only inside its Repeat
+    """
+    nest_names = loop_variables(repeat)
+
+    def check_expressions(expressions, scope):
+        for expression in expressions:
+            names = expression_names(expression)
+            if names is None:
+                return False
+            # a Repeat variable outside its Repeat would be whatever it was last
+            if names & nest_names - scope:
+                return False
+        return True
+
+    def check_repeat(node, scope):
+        var, start, end, body = node.children
+        if var.name in scope:
+            return False
+        if not check_expressions([start, end], scope):
+            return False
+        scope = scope | set([var.name])
+        for statement in body.children:
+            if statement.type == 'set':
+                lvalue, rvalue = statement.children
+                if lvalue.type != 'bracket':
+                    return False
+                if not check_expressions(lvalue.children + [rvalue], scope):
+                    return False
+            elif statement.type == 'command':
+                if statement.name != 'Line' or len(statement.children) != 4:
+                    return False
+                if not check_expressions(statement.children, scope):
+                    return False
+            elif statement.type == 'repeat':
+                if not check_repeat(statement, scope):
+                    return False
+            else:
+                return False
+        return True
+
+    return check_repeat(repeat, set())
+
+
+def last_line_no(repeat):
+    """
+    the line_no of the last statement a Repeat runs
+    """
+    body = repeat.children[3]
+    if not body.children:
+        return repeat.line_no
+    last = body.children[-1]
+    if last.type == 'repeat':
+        return last_line_no(last)
+    return last.line_no
+
+
+def small(values, limit):
+    return abs(int(numpy.max(numpy.abs(values)))) < limit
+
+
+class DBNBatch:
+    """
+    the batch for one batchable Repeat node
+    """
+
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.has_line = 'Line' in [statement.name for statement in self.statements(repeat)]
+
+    def statements(self, repeat):
+        for statement in repeat.children[3].children:
+            yield statement
+            if statement.type == 'repeat':
+                for inner in self.statements(statement):
+                    yield inner
+
+    def apply(self, state):
+        """
+        returns the state after the Repeat, or None if it has to run as usual
+        state has to be mutable, with its line_no already at the Repeat
+        """
+        if self.has_line:
+            if state.lookup_command('Line') is not builtins.BUILTIN_PROCS['Line']:
+                return None
+            if state.stack_depth >= RECURSION_LIMIT:
+                return None  # leave the error to the Line
+        self.state = state
+        self.last_values = {}
+        self.steps = 0
+        try:
+            table = {}
+            _, xs, ys, values = self.run_repeat(self.repeat, table, 1)
+        except DBNBatchFallback:
+            return None
+        finally:
+            del self.state
+
+        limits = state.limits
+        if limits is not None:
+            if not limits.fits(self.steps):
+                return None  # so the Repeat stops at the same step it would have
+            limits.charge(self.steps, state)
+        if len(xs):
+            state.image = state.image.set_pixels(xs, ys, values)
+        for slot, value in self.last_values.items():
+            state = state.set_slot(slot, value)
+        return state.set_line_no(last_line_no(self.repeat))
+
+    def evaluate(self, node, table):
+        """
+        the value of an expression in every row of table, as an int64
+        array, or a single int when it is the same in all of them
+        """
+        if node.type == 'number':
+            return node.value
+        if node.type == 'word':
+            if node.name in table:
+                return table[node.name]
+            value = self.state.lookup_slot(node.slot)
+            if not small(value, MAX_FACTOR):
+                raise DBNBatchFallback()
+            return value
+        if node.type == 'hoisted':
+            return self.evaluate(node.children[0], table)
+
+        left, right = node.children
+        left = self.evaluate(left, table)
+        right = self.evaluate(right, table)
+        if not small(left, MAX_FACTOR) or not small(right, MAX_FACTOR):
+            raise DBNBatchFallback()
+        if node.name == '+':
+            return left + right
+        if node.name == '-':
+            return left - right
+        if node.name == '*':
+            return left * right
+        if numpy.any(numpy.asarray(right) == 0):
+            raise DBNBatchFallback()  # so the ZeroDivisionError comes from the right place
+        return numpy.floor_divide(left, right)  # like python 2's int /
+
+    def evaluate_rows(self, node, table, row_count):
+        return numpy.broadcast_to(numpy.asarray(self.evaluate(node, table), numpy.int64), (row_count,))
+
+    def run_repeat(self, node, table, row_count):
+        """
+        runs a Repeat once for each of the row_count rows of table
+
+        returns the writes as (rows, xs, ys, values), in the order they
+        would have happened, where rows are the rows of table they came from
+        """
+        var, start, end, body = node.children
+        if node.static_range is not None:
+            starts, ends = [numpy.broadcast_to(numpy.int64(value), (row_count,)) for value in node.static_range]
+        else:
+            starts = self.evaluate_rows(start, table, row_count)
+            ends = self.evaluate_rows(end, table, row_count)
+
+        counts = numpy.abs(ends - starts) + 1
+        inner_count = int(counts.sum())
+        if inner_count > MAX_ROWS:
+            raise DBNBatchFallback()
+
+        # the rows of the inner table, parent row by parent row
+        parents = numpy.repeat(numpy.arange(row_count), counts)
+        firsts = numpy.cumsum(counts) - counts
+        offsets = numpy.arange(inner_count) - firsts[parents]
+        steps = numpy.where(ends > starts, 1, -1)
+        inner = dict((name, values[parents]) for name, values in table.items())
+        inner[var.name] = starts[parents] + steps[parents] * offsets
+        self.last_values[var.slot] = int(inner[var.name][-1])
+        # the steps (see limits.py) it would have taken: one each time
+        # around, and one for each statement in the body
+        self.steps += inner_count * (1 + len(body.children))
+
+        writes = []
+        for statement in body.children:
+            if statement.type == 'repeat':
+                writes.append(self.run_repeat(statement, inner, inner_count))
+            elif statement.type == 'set':
+                writes.append(self.run_set(statement, inner, inner_count))
+            else:
+                writes.append(self.run_line(statement, inner, inner_count))
+        rows, xs, ys, values = merge(writes)
+        return parents[rows], xs, ys, values
+
+    def run_set(self, node, table, row_count):
+        lvalue, rvalue = node.children
+        x, y = [self.evaluate_rows(child, table, row_count) for child in lvalue.children]
+        values = self.evaluate_rows(rvalue, table, row_count)
+        return (numpy.arange(row_count), x, utils.pixel_to_coord(y, 'y'), utils.scale_100_array(values))
+
+    def run_line(self, node, table, row_count):
+        ends = [self.evaluate_rows(child, table, row_count) for child in node.children]
+        xs, ys, rows = [], [], []
+        for row, line_ends in enumerate(zip(*ends)):
+            (line_xs, line_ys), _ = builtins.line_points(*[int(end) for end in line_ends])
+            xs.append(line_xs)
+            ys.append(line_ys)
+            rows.append(numpy.repeat(row, len(line_xs)))
+        xs, ys, rows = [numpy.concatenate(arrays) for arrays in (xs, ys, rows)]
+        color = utils.scale_100(self.state.pen_color)
+        return (rows, xs, ys, numpy.repeat(numpy.uint8(color), len(xs)))
+
+
+def merge(writes):
+    """
+    the writes of a body's statements, each sorted by row, into one list
+    sorted by row, where the writes of a row keep the statements' order
+    """
+    if not writes:
+        empty = numpy.zeros(0, numpy.int64)
+        return empty, empty, empty, numpy.zeros(0, numpy.uint8)
+    columns = [numpy.concatenate(column) for column in zip(*writes)]
+    if len(writes) > 1:
+        order = numpy.argsort(columns[0], kind='mergesort')
+        columns = [column[order] for column in columns]
+    return tuple(columns)
@@ -0,0 +1,71 @@
+"""
+little benchmarks for pydbn
+
+run them from the pydbn directory, like
+    python -m benchmarks.engines
+"""
+import glob
+import os
+import resource
+import time
+import cPickle
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'test_dbns')
+
+
+def corpus():
+    """
+    returns a sorted list of (name, script text) for every .dbn in test_dbns
+    """
+    paths = glob.glob(os.path.join(CORPUS_DIR, '*.dbn'))
+    paths += glob.glob(os.path.join(CORPUS_DIR, '*', '*.dbn'))
+    scripts = []
+    for path in sorted(paths):
+        name = os.path.relpath(path, CORPUS_DIR)
+        scripts.append((name, open(path).read()))
+    return scripts
+
+
+def best_of(function, repeat=3):
+    """
+    calls function repeat times, returns the fastest wall time in seconds
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        function()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def measure(function):
+    """
+    calls function in a forked child process, so its memory use
+    can be seen on its own. returns (wall time in seconds, peak rss in kb)
+    of the child, or raises the child's exception
+    """
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        try:
+            start = time.time()
+            function()
+            elapsed = time.time() - start
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            result = (elapsed, peak)
+        except Exception as e:
+            result = e
+        with os.fdopen(write_end, 'wb') as out:
+            cPickle.dump(result, out, 2)
+        os._exit(0)
+
+    os.close(write_end)
+    with os.fdopen(read_end, 'rb') as result_file:
+        result = cPickle.load(result_file)
+    os.waitpid(pid, 0)
+    if isinstance(result, Exception):
+        raise result
+    return result
@@ -0,0 +1,54 @@
+"""
+drawing Repeat nests on the tree engine without a history, run one
+statement at a time and run as batches (see batch.py)
+"""
+import sys
+
+from benchmarks import best_of
+from tokenizer import DBNTokenizer
+from parser import DBNParser
+from optimizer import DBNOptimizer
+from dbnstate import DBNInterpreterState
+
+SCRIPTS = [
+    ('grid', """Repeat A 0 100 {
+  Repeat B 0 100 {
+    Set [A B] (A + B)
+  }
+}
+"""),
+    ('triangle, overlapping', """Repeat A 0 100 {
+  Repeat B A 100 {
+    Set [B (A / 2)] (A - B)
+    Set [(B / 2) A] B
+  }
+}
+"""),
+    ('lines', """Pen 50
+Repeat A 0 100 {
+  Line 0 A A 100
+  Line A 0 100 A
+  Set [A A] 100
+}
+"""),
+]
+
+
+def run(script, batch):
+    optimizer = DBNOptimizer()
+    dbn_ast = optimizer.optimize(DBNParser().parse(DBNTokenizer().tokenize(script)))
+    if batch:
+        optimizer.batch(dbn_ast)
+    return lambda: dbn_ast.apply(DBNInterpreterState(record_history=False, symbols=dbn_ast.symbols))
+
+
+def main(repeat=3):
+    print "%-30s%12s%12s%10s" % ("script", "sequential", "batched", "speedup")
+    for name, script in SCRIPTS:
+        sequential = best_of(run(script, False), repeat)
+        batched = best_of(run(script, True), repeat)
+        print "%-30s%11.4fs%11.4fs%9.1fx" % (name, sequential, batched, sequential / batched)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,64 @@
+"""
+compares the execution engines of dbn.run_script_text on the test_dbns corpus
+
+only the execution is timed: every script is tokenized and parsed once up front
+(the python engine's time includes generating and compiling its source,
+and it only renders the final image)
+"""
+import sys
+
+from benchmarks import corpus, best_of
+from tokenizer import DBNTokenizer
+from parser import DBNParser
+from dbnstate import DBNInterpreterState
+from bytecode import DBNVirtualMachine
+from codegen import DBNPythonScript
+
+
+def tree_engine(dbn_ast):
+    return dbn_ast.apply(DBNInterpreterState(symbols=dbn_ast.symbols))
+
+
+def vm_engine(dbn_ast):
+    return DBNVirtualMachine().apply(dbn_ast, DBNInterpreterState(symbols=dbn_ast.symbols))
+
+
+def python_engine(dbn_ast):
+    return DBNPythonScript(dbn_ast).apply(DBNInterpreterState(symbols=dbn_ast.symbols))
+
+
+ENGINES = [
+    ('tree', tree_engine),
+    ('vm', vm_engine),
+    ('python', python_engine),
+]
+
+
+def main(repeat=3):
+    tokenizer = DBNTokenizer()
+    parser = DBNParser()
+    totals = dict((name, 0.0) for name, _ in ENGINES)
+
+    print "%-30s" % "script" + "".join("%12s" % name for name, _ in ENGINES)
+    for script_name, script in corpus():
+        try:
+            dbn_ast = parser.parse(tokenizer.tokenize(script))
+            tree_engine(dbn_ast)
+        except Exception:
+            continue  # the corpus has scripts that are meant to fail
+
+        row = "%-30s" % script_name
+        for name, engine in ENGINES:
+            elapsed = best_of(lambda: engine(dbn_ast), repeat)
+            totals[name] += elapsed
+            row += "%11.4fs" % elapsed
+        print row
+
+    print "%-30s" % "total" + "".join("%11.4fs" % totals[name] for name, _ in ENGINES)
+    baseline = totals[ENGINES[0][0]]
+    for name, _ in ENGINES[1:]:
+        print "%s speedup over %s: %.2fx" % (name, ENGINES[0][0], baseline / totals[name])
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
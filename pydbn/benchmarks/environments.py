@@ -0,0 +1,102 @@
+"""
+variable reads and writes through Command calls, on the tree and vm engines
+
+the scripts are the nesting and recursion ones from test_dbns/commands,
+a chain of Commands 40 calls deep whose innermost body reads variables
+set at the top (so every read used to walk the whole chain), and Repeats
+that set 40, 400 and 4000 variables, about 8000 Sets each. runs with a
+history also get their peak memory
+
+then what one Set costs with that many variables, for the ways frames
+have kept their values: a dict copied on every Set, a list copied on
+every Set, and the persistent vector they use now
+"""
+import os
+import sys
+
+import timeit
+
+from benchmarks import best_of, measure, CORPUS_DIR
+from pmap import DBNPersistentVector
+from tokenizer import DBNTokenizer
+from parser import DBNParser
+from dbnstate import DBNInterpreterState
+from bytecode import DBNVirtualMachine
+
+
+def deep_script(depth=40, repeat=50):
+    lines = ["Command Level0 N {",
+             "  Repeat I 0 %d {" % repeat,
+             "    Set [(I + N) (Top1 + Top2 - Top3)] (Top4 + N)",
+             "  }",
+             "}"]
+    for level in range(1, depth):
+        lines += ["Command Level%d N {" % level,
+                  "  Level%d (N + 1)" % (level - 1),
+                  "}"]
+    lines += ["Set Top1 10", "Set Top2 20", "Set Top3 5", "Set Top4 50"]
+    lines += ["Repeat K 0 4 {", "  Level%d K" % (depth - 1), "}"]
+    return '\n'.join(lines) + '\n'
+
+
+def variables_script(count=40, repeat=200):
+    lines = ["Set V%d %d" % (index, index) for index in range(count)]
+    lines += ["Repeat A 0 %d {" % repeat]
+    lines += ["  Set V%d (V%d + A)" % (index, (index + 1) % count) for index in range(count)]
+    lines += ["}"]
+    return '\n'.join(lines) + '\n'
+
+
+def scripts():
+    out = []
+    for name in ['nesting.dbn', 'recursion.dbn']:
+        out.append(('commands/' + name, open(os.path.join(CORPUS_DIR, 'commands', name)).read()))
+    out.append(('40 Commands deep', deep_script()))
+    for count in [40, 400, 4000]:
+        out.append(('%d variables' % count, variables_script(count, 8000 // count)))
+    return out
+
+
+def set_costs(counts=(40, 400, 4000), number=2000):
+    """
+    microseconds per Set of one of count variables, for each way of keeping them
+    """
+    print "%-24s%12s%12s%12s" % ("variables", "dict copy", "list copy", "vector")
+    for count in counts:
+        as_dict = dict(('V%d' % index, index) for index in range(count))
+        as_list = range(count)
+        vector = DBNPersistentVector()
+        for index in range(count):
+            vector = vector.set(index, index)
+
+        def dict_set():
+            new = dict(as_dict)
+            new['V1'] = 0
+
+        def list_set():
+            new = list(as_list)
+            new[1] = 0
+
+        costs = [min(timeit.repeat(function, number=number, repeat=3)) / number * 1e6
+                 for function in (dict_set, list_set, lambda: vector.set(1, 0))]
+        print "%-24d%10.2fus%10.2fus%10.2fus" % ((count,) + tuple(costs))
+
+
+def main(repeat=3):
+    print "%-24s%10s%12s%12s%12s" % ("script", "history", "tree", "vm", "tree peak")
+    for name, script in scripts():
+        dbn_ast = DBNParser().parse(DBNTokenizer().tokenize(script))
+        for record_history in (True, False):
+            tree = best_of(lambda: dbn_ast.apply(DBNInterpreterState(record_history=record_history, symbols=dbn_ast.symbols)), repeat)
+            vm = best_of(lambda: DBNVirtualMachine().apply(dbn_ast, DBNInterpreterState(record_history=record_history, symbols=dbn_ast.symbols)), repeat)
+            row = "%-24s%10s%11.4fs%11.4fs" % (name, record_history and 'yes' or 'no', tree, vm)
+            if record_history:
+                _, peak = measure(lambda: dbn_ast.apply(DBNInterpreterState(symbols=dbn_ast.symbols)))
+                row += "%10dMB" % (peak // 1024)
+            print row
+    print
+    set_costs()
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,45 @@
+"""
+compares running with the full state history against record_history=False,
+in wall time and peak memory (each run happens in its own process)
+
+besides test_dbns, there is a synthetic script that fills the whole image
+with Set, which is the worst case for the history
+"""
+from benchmarks import corpus, measure
+import dbn
+
+FILL_SCRIPT = """
+Paper 0
+Repeat Y 0 100 {
+  Repeat X 0 100 {
+    Set [X Y] ((X + Y) / 2)
+  }
+}
+"""
+
+
+def baseline():
+    pass
+
+
+def main():
+    scripts = [(name, script) for name, script in corpus()]
+    scripts.append(('<fill 101x101>', FILL_SCRIPT))
+
+    _, empty_peak = measure(baseline)
+    print "peak memory is measured above an empty child process (%d kb)" % empty_peak
+    print "%-30s%14s%12s%14s%12s" % ("script", "history", "", "no history", "")
+
+    for name, script in scripts:
+        row = "%-30s" % name
+        try:
+            for record_history in (True, False):
+                elapsed, peak = measure(lambda: dbn.run_script_text(script, record_history=record_history))
+                row += "%13.3fs%10.1fMB" % (elapsed, (peak - empty_peak) / 1024.0)
+        except Exception:
+            continue  # the corpus has scripts that are meant to fail
+        print row
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+the tree engine on nested Repeats, with the optimizer folding constants
+only, and folding and hoisting loop invariants
+
+the scripts are a grid (two Repeats), a cube (three, the inner one fills a
+row) and the grid inside a Command, where the invariants read its arguments
+"""
+import sys
+
+from benchmarks import best_of
+from tokenizer import DBNTokenizer
+from parser import DBNParser
+from optimizer import DBNOptimizer
+from dbnstate import DBNInterpreterState
+
+SCRIPTS = [
+    ('grid', """Paper 0
+Set S 3
+Repeat Y 0 100 {
+  Repeat X 0 100 {
+    Set [X Y] ((Y * S + 7) / 2 - (S * S + 1) + X / 4)
+  }
+}
+"""),
+    ('cube', """Paper 0
+Repeat Z 0 20 {
+  Repeat Y 0 25 {
+    Repeat X 0 25 {
+      Set [(X + Z * 3) (Y * 2 + Z)] ((Z * 4 + Y) / 2 + X)
+    }
+  }
+}
+"""),
+    ('grid in a Command', """Command Grid L B S {
+  Repeat Y 0 50 {
+    Repeat X 0 50 {
+      Set [(L + X) (B + Y)] ((Y * S + B) / 3 + (L * 2 + S) - X)
+    }
+  }
+}
+Paper 0
+Grid 0 0 1
+Grid 50 0 2
+Grid 0 50 3
+Grid 50 50 4
+"""),
+]
+
+
+def run(script, hoist, record_history):
+    optimizer = DBNOptimizer()
+    dbn_ast = optimizer.optimize(DBNParser().parse(DBNTokenizer().tokenize(script)))
+    if hoist:
+        optimizer.hoist(dbn_ast)
+    return lambda: dbn_ast.apply(DBNInterpreterState(record_history=record_history, symbols=dbn_ast.symbols))
+
+
+def main(repeat=3):
+    print "%-30s%10s%12s%12s%10s" % ("script", "history", "folded", "hoisted", "speedup")
+    for name, script in SCRIPTS:
+        for record_history in (False, True):
+            folded = best_of(run(script, False, record_history), repeat)
+            hoisted = best_of(run(script, True, record_history), repeat)
+            print "%-30s%10s%11.3fs%11.3fs%9.2fx" % (
+                name, record_history and 'yes' or 'no', folded, hoisted, folded / hoisted)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
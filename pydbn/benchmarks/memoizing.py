@@ -0,0 +1,65 @@
+"""
+Commands that only draw, on the tree engine without a history, run as
+usual and memoized (see memo.py): colin.dbn's K called over and over
+with a few arguments, and the same with a nested Command and a variable
+from the caller
+"""
+import sys
+
+from benchmarks import best_of
+from tokenizer import DBNTokenizer
+from parser import DBNParser
+from optimizer import DBNOptimizer
+from dbnstate import DBNInterpreterState
+
+SCRIPTS = [
+    ('K, 10 places', """Paper 60
+Pen 25
+Command K X Y {
+    Line X (Y + 10) X Y
+    Line X (Y + 5) (X + 5) (Y + 10)
+    Line X (Y + 5) (X + 5) Y
+}
+Repeat A 0 2000 {
+    K ((A - A / 10 * 10) * 9) 50
+}
+"""),
+    ('nested, variable from caller', """Command Tick X Y {
+  Set T (X + S)
+  Line X Y T (Y + 10)
+  Set [T Y] (X * 2)
+}
+Command Ticks X {
+  Repeat I 0 5 {
+    Tick X (I * 15)
+  }
+}
+Repeat A 0 2000 {
+  Set S (A / 500)
+  Ticks (A / 100)
+}
+"""),
+]
+
+
+def run(script, memoize):
+    optimizer = DBNOptimizer()
+    dbn_ast = optimizer.optimize(DBNParser().parse(DBNTokenizer().tokenize(script)))
+    if memoize:
+        optimizer.memoize(dbn_ast)
+    return optimizer, lambda: dbn_ast.apply(DBNInterpreterState(record_history=False, symbols=dbn_ast.symbols))
+
+
+def main(repeat=3):
+    print "%-32s%12s%12s%10s%10s" % ("script", "as usual", "memoized", "speedup", "hit rate")
+    for name, script in SCRIPTS:
+        _, usual = run(script, False)
+        optimizer, memoized = run(script, True)
+        usual_time = best_of(usual, repeat)
+        memoized_time = best_of(memoized, repeat)
+        hits, misses, hit_rate = optimizer.memo_stats()
+        print "%-32s%11.4fs%11.4fs%9.1fx%9.1f%%" % (name, usual_time, memoized_time, usual_time / memoized_time, hit_rate * 100)
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,71 @@
+"""
+bytes per interpreter state, per token and per ast node
+
+for each, a big run's peak memory (in a forked child, see measure) less
+that of an empty run, over how many there were, and the size of one
+object by itself (sys.getsizeof, plus its __dict__ if it has one)
+"""
+import sys
+
+from benchmarks import measure
+from tokenizer import DBNTokenizer
+from parser import DBNParser
+from dbnstate import DBNInterpreterState
+
+
+STATES_SCRIPT = """Repeat A 0 300 {
+  Set B (A * 2)
+  Set C (B + A)
+}
+""" * 10
+
+def tokens_script(line_count=20000):
+    return '\n'.join("Set [(%d / 7) (X + %d)] (X - Y)" % (index, index % 101) for index in range(line_count)) + '\n'
+
+
+def object_size(obj):
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def count_nodes(node):
+    return 1 + sum(count_nodes(child) for child in node.children)
+
+
+def run_states():
+    dbn_ast = DBNParser().parse(DBNTokenizer().tokenize(STATES_SCRIPT))
+    return dbn_ast.apply(DBNInterpreterState(symbols=dbn_ast.symbols))
+
+
+def extra_peak(build):
+    """
+    the extra peak memory of build() over doing nothing, in bytes
+    """
+    _, empty_peak = measure(lambda: None)
+    _, peak = measure(build)
+    return (peak - empty_peak) * 1024.0
+
+
+def main():
+    # measured first, while this process is still small
+    script = tokens_script()
+    state_bytes = extra_peak(run_states)
+    token_bytes = extra_peak(lambda: DBNTokenizer().tokenize(script))
+    tokens = DBNTokenizer().tokenize(script)
+    node_bytes = extra_peak(lambda: DBNParser().parse(tokens))
+
+    state = run_states()
+    states = state.step + 1
+    tree = DBNParser().parse(tokens)
+    nodes = count_nodes(tree)
+
+    print "%-16s%10s%16s%16s" % ("object", "count", "bytes in a run", "bytes alone")
+    print "%-16s%10d%16.0f%16d" % ("state", states, state_bytes / states, object_size(state))
+    print "%-16s%10d%16.0f%16d" % ("token", len(tokens), token_bytes / len(tokens), object_size(tokens[0]))
+    print "%-16s%10d%16.0f%16d" % ("ast node", nodes, node_bytes / nodes, object_size(tree.children[0].children[1]))
+
+
+if __name__ == "__main__":
+    main()
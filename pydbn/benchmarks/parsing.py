@@ -0,0 +1,74 @@
+"""
+parse time of generated scripts, to show it grows linearly
+
+there are flat scripts (lots of top-level statements) and nested ones
+(Repeats inside Repeats, with statements at every level), from 1000 up
+to 100000 lines. the time per line should stay about the same
+
+and single expressions with up to 100000 terms, where the time
+per term should stay about the same too
+"""
+from benchmarks import best_of
+from tokenizer import DBNTokenizer
+from parser import DBNParser
+
+LINE_COUNTS = [1000, 10000, 100000]
+DEPTHS = [10, 100, 400]  # the parser recurses, so python's recursion limit caps this
+TERM_COUNTS = [1000, 10000, 100000]
+
+
+def statement(index):
+    return "Set [(%d / 7) (X + %d * 2)] ((X - Y) * %d)" % (index, index % 101, index % 9)
+
+
+def flat_script(line_count):
+    return '\n'.join(statement(index) for index in range(line_count)) + '\n'
+
+
+def nested_script(line_count, depth):
+    """
+    depth Repeats, one inside the other, with the lines spread over every level
+    """
+    per_level = max(1, (line_count - 2 * depth) // depth)
+    lines = []
+    for level in range(depth):
+        lines.extend(statement(index) for index in range(per_level))
+        lines.append("Repeat X 0 %d {" % level)
+    lines.extend(statement(index) for index in range(per_level))
+    lines.extend("}" for level in range(depth))
+    return '\n'.join(lines) + '\n'
+
+
+def expression_script(term_count):
+    operations = '+-*/'
+    terms = ['(X %s %d)' % (operations[index % 4], index) if index % 10 == 0 else str(index)
+             for index in range(term_count)]
+    return "Set A (%s)\n" % ''.join(term + ' %s ' % operations[index % 4] for index, term in enumerate(terms))[:-3]
+
+
+def parse_time(script):
+    tokens = DBNTokenizer().tokenize(script)
+    # the big ones take long enough to time once
+    repeat = 3 if len(tokens) < 1000000 else 1
+    return best_of(lambda: DBNParser().parse(tokens), repeat)
+
+
+def main():
+    print "%-26s%10s%12s%14s" % ("script", "lines", "parse", "us per line")
+    for line_count in LINE_COUNTS:
+        scripts = [('flat', flat_script(line_count))]
+        scripts.extend(('nested, depth %d' % depth, nested_script(line_count, depth)) for depth in DEPTHS)
+        for name, script in scripts:
+            lines = script.count('\n')
+            elapsed = parse_time(script)
+            print "%-26s%10d%11.3fs%14.1f" % (name, lines, elapsed, elapsed / lines * 1e6)
+
+    print
+    print "%-26s%10s%12s%14s" % ("expression", "terms", "parse", "us per term")
+    for term_count in TERM_COUNTS:
+        elapsed = parse_time(expression_script(term_count))
+        print "%-26s%10d%11.3fs%14.1f" % ("one Set", term_count, elapsed, elapsed / term_count * 1e6)
+
+
+if __name__ == "__main__":
+    main()
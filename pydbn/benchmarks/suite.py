@@ -0,0 +1,215 @@
+"""
+the benchmark suite: tokenize, parse, execute (the tree engine, with a
+history) and render (the final image as a PNG) timed one at a time, for
+every script in test_dbns and some big generated ones, with how many
+states each run made and the peak memory of all four together
+
+    python -m benchmarks.suite [-r REPEAT] [-o results.json] [-b baseline.json] [-t THRESHOLD]
+
+-o writes the results as json, and the json of an earlier run makes a
+good baseline: any phase that got more than THRESHOLD (a fraction)
+slower than it was there, or a peak more than that much bigger, is a
+regression, and the suite exits with status 1. the best of fewer than
+MIN_REPEAT runs is too noisy to compare, and so are numbers under
+MINIMUMS in the baseline, or changes smaller than them. a script that
+looks slower is timed again, up to RETRIES more times, keeping its best
+times, and only what's still slower after that counts
+"""
+import copy
+import json
+import sys
+from cStringIO import StringIO
+from optparse import OptionParser
+
+from benchmarks import corpus, best_of
+from benchmarks.memory import extra_peak
+from benchmarks.parsing import flat_script
+from benchmarks.environments import deep_script, variables_script
+from tokenizer import DBNTokenizer
+from parser import DBNParser
+from dbnstate import DBNInterpreterState
+
+PHASES = ('tokenize', 'parse', 'execute', 'render')
+
+# below these in the baseline, or changed by less than these, it's just noise
+MINIMUMS = {
+    'tokenize': 0.01,
+    'parse': 0.01,
+    'execute': 0.01,
+    'render': 0.01,
+    'peak_kb': 4096,
+}
+
+# runs (-r) each side of a comparison needs at least
+MIN_REPEAT = 3
+
+# times a script that looks slower than the baseline is timed again
+RETRIES = 3
+
+option_parser = OptionParser(usage="python -m benchmarks.suite [options]")
+option_parser.add_option('-r', '--repeat', type="int", dest="repeat", help="time each phase this many times, and keep the best", default=3)
+option_parser.add_option('-o', '--output', dest="output", help="write the results to this json file")
+option_parser.add_option('-b', '--baseline', dest="baseline", help="compare to the results in this json file")
+option_parser.add_option('-t', '--threshold', type="float", dest="threshold", help="how much slower than the baseline is a regression (default 0.2, 20%)", default=0.2)
+
+
+def generated():
+    """
+    (name, script text) of the big generated scripts, only as big as
+    their histories (the ghosts of every dot, mostly) fit in memory
+    """
+    grid = "Repeat A 0 100 {\n  Repeat B 0 100 {\n    Set [A B] (A + B)\n  }\n}\n"
+    lines = '\n'.join("Line %d 0 %d 100" % (index % 101, (index * 7) % 101) for index in range(500)) + '\n'
+    return [
+        ('generated/2000 Sets', flat_script(2000)),
+        ('generated/grid', grid),
+        ('generated/500 Lines', lines),
+        ('generated/40 Commands deep', deep_script()),
+        ('generated/400 variables', variables_script(400, 20)),
+    ]
+
+
+def render(state):
+    """
+    the final image of state as PNG bytes
+    """
+    out = StringIO()
+    # a copy, so the PIL image isn't cached from the last time
+    copy.copy(state.image)._image.save(out, 'PNG')
+    return out.getvalue()
+
+
+def run(script):
+    tokens = DBNTokenizer().tokenize(script)
+    dbn_ast = DBNParser().parse(tokens)
+    state = dbn_ast.apply(DBNInterpreterState(symbols=dbn_ast.symbols))
+    render(state)
+
+
+def benchmark(script, repeat=3):
+    """
+    a dict of the seconds each phase took, the number of tokens and
+    states, and the peak memory in kb
+    """
+    result = {}
+    # first, while this process is still small
+    result['peak_kb'] = int(extra_peak(lambda: run(script)) / 1024)
+    result['tokenize'] = best_of(lambda: DBNTokenizer().tokenize(script), repeat)
+    tokens = DBNTokenizer().tokenize(script)
+    result['parse'] = best_of(lambda: DBNParser().parse(tokens), repeat)
+    dbn_ast = DBNParser().parse(tokens)
+    result['execute'] = best_of(lambda: dbn_ast.apply(DBNInterpreterState(symbols=dbn_ast.symbols)), repeat)
+    state = dbn_ast.apply(DBNInterpreterState(symbols=dbn_ast.symbols))
+    result['render'] = best_of(lambda: render(state), repeat)
+
+    result['tokens'] = len(tokens)
+    result['states'] = state.step + 1
+    return result
+
+
+def run_suite(repeat=3, out=sys.stdout):
+    """
+    the results of every script: {'scripts': {name: benchmark or {'error': message}}}
+    """
+    results = {}
+    print >> out, "%-34s%10s%10s%10s%10s%10s%10s" % (("script",) + PHASES + ("states", "peak"))
+    for name, script in corpus() + generated():
+        try:
+            result = benchmark(script, repeat)
+        except Exception as e:
+            # the corpus has scripts that are meant to fail
+            results[name] = {'error': '%s: %s' % (type(e).__name__, e)}
+            print >> out, "%-34s  %s" % (name, results[name]['error'])
+            continue
+        results[name] = result
+        row = "%-34s" % name
+        row += ''.join("%9.4fs" % result[phase] for phase in PHASES)
+        row += "%10d%8dMB" % (result['states'], result['peak_kb'] // 1024)
+        print >> out, row
+    return {'repeat': repeat, 'scripts': results}
+
+
+def retime(results, names, repeat=3):
+    """
+    times the scripts called names again, keeping the best of the old
+    and new times of each phase in results
+    """
+    scripts = dict(corpus() + generated())
+    for name in names:
+        again = benchmark(scripts[name], repeat)
+        result = results['scripts'][name]
+        for phase in PHASES:
+            result[phase] = min(result[phase], again[phase])
+
+
+def regressions(results, baseline, threshold=0.2):
+    """
+    a sorted list of (script, phase or 'peak_kb', baseline value, value)
+    for everything more than threshold (and its MINIMUMS) worse than in
+    baseline, and of (script, 'error', None, message) for a script that
+    ran in baseline but fails or is missing now
+
+    raises ValueError if either side is the best of fewer than MIN_REPEAT runs
+    """
+    for side, repeat in (('results', results.get('repeat', 0)), ('baseline', baseline.get('repeat', 0))):
+        if repeat < MIN_REPEAT:
+            raise ValueError("The %s are the best of %d runs, comparing needs at least %d" % (side, repeat, MIN_REPEAT))
+
+    found = []
+    for name, old in sorted(baseline['scripts'].items()):
+        if 'error' in old:
+            continue
+        result = results['scripts'].get(name)
+        if result is None:
+            found.append((name, 'error', None, "missing"))
+        elif 'error' in result:
+            found.append((name, 'error', None, result['error']))
+
+    for name, result in sorted(results['scripts'].items()):
+        old = baseline['scripts'].get(name, {})
+        for key in PHASES + ('peak_kb',):
+            if key not in result or key not in old or old[key] < MINIMUMS[key]:
+                continue
+            if result[key] > max(old[key] * (1 + threshold), old[key] + MINIMUMS[key]):
+                found.append((name, key, old[key], result[key]))
+    return sorted(found)
+
+
+def main(args):
+    options, _ = option_parser.parse_args(args)
+    if options.baseline and options.repeat < MIN_REPEAT:
+        option_parser.error("comparing to a baseline needs -r %d or more" % MIN_REPEAT)
+    results = run_suite(options.repeat)
+
+    if options.output:
+        with open(options.output, 'w') as out:
+            json.dump(results, out, indent=2, sort_keys=True)
+
+    if options.baseline:
+        baseline = json.load(open(options.baseline))
+        try:
+            found = regressions(results, baseline, options.threshold)
+        except ValueError as e:
+            print >> sys.stderr, e
+            return 2
+        for _ in range(RETRIES):
+            slower = sorted(set(name for name, key, _, _ in found if key in PHASES))
+            if not slower:
+                break
+            print "timing again: %s" % ', '.join(slower)
+            retime(results, slower, options.repeat)
+            found = regressions(results, baseline, options.threshold)
+        print
+        for name, key, old, new in found:
+            if key == 'error':
+                print "regression: %s %s" % (name, new)
+            else:
+                print "regression: %s %s %.4g -> %.4g (+%.0f%%)" % (name, key, old, new, (new / float(old) - 1) * 100)
+        if found:
+            return 1
+        print "no regressions over %.0f%% against %s" % (options.threshold * 100, options.baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
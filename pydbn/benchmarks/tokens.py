@@ -0,0 +1,44 @@
+"""
+tokenizer throughput, in tokens per second, on big generated scripts
+
+the generated scripts are the test_dbns corpus pasted together until
+they are big enough (the corpus has every kind of token, and comments).
+for comparison, the 'classify' column matches the same text with the
+master regex and then classifies each token string the old way, by
+trying every token type in turn
+"""
+from benchmarks import corpus, best_of
+from tokenizer import DBNTokenizer
+
+SIZES = [10000, 100000, 1000000]  # characters
+
+
+def generated_script(size):
+    scripts = []
+    length = 0
+    while length < size:
+        for name, script in corpus():
+            scripts.append(script + '\n')
+            length += len(script) + 1
+    return ''.join(scripts)
+
+
+def classify_all(tokenizer, script):
+    token_re = tokenizer.token_re()
+    return [tokenizer.classify(match.group(0)) for match in token_re.finditer(script)]
+
+
+def main():
+    tokenizer = DBNTokenizer()
+    print "%-12s%10s%16s%16s" % ("characters", "tokens", "tokens/s", "classify tok/s")
+    for size in SIZES:
+        script = generated_script(size)
+        token_count = len(tokenizer.tokenize(script))
+        elapsed = best_of(lambda: tokenizer.tokenize(script))
+        classify_elapsed = best_of(lambda: classify_all(tokenizer, script))
+        print "%-12d%10d%16.0f%16.0f" % (len(script), token_count,
+            token_count / elapsed, token_count / classify_elapsed)
+
+
+if __name__ == "__main__":
+    main()
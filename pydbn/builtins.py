@@ -2,64 +2,86 @@ import utils
 
 from dbnast import DBNPythonNode
 from dbnstate import Producer, DBNImage
-from structures import DBNProcedure
+from structures import DBNProcedure, BUILTIN_SYMBOLS, BUILTIN_FORMALS
 
 def builtin(*formals):
+    """
+    formals have to be in structures.BUILTIN_FORMALS
+    """
     def decorator(function):        
         def inner(state):
-            args = [state.lookup_variable(f) for f in formals]
+            args = [state.lookup_slot(slot) for slot in proc_node.formal_slots]
             return function(state, *args)
         builtin_node = DBNPythonNode(inner)
-        proc_node = DBNProcedure(formals, builtin_node)
+        assert all(name in BUILTIN_FORMALS for name in formals)
+        proc_node = DBNProcedure(formals, [BUILTIN_SYMBOLS.get(name) for name in formals], builtin_node)
         return proc_node
     return decorator
+
+def builtin_procedure(name):
+    """
+    the builtin procedure with the given name, for unpickling them
+    """
+    return BUILTIN_PROCS[name]
         
-@builtin('blX', 'blY', 'trX', 'trY')
-@Producer
-def Line(old, new, *args):
-    
-    blX, blY, trX, trY = args
-    
+def line_points(blX, blY, trX, trY):
+    """
+    returns the points (in PIL coordinates) of a line between
+    two points in DBN coordinates, as arrays (xs, ys),
+    and the converted endpoints
+    """
     blX = utils.pixel_to_coord(blX, 'x')
     blY = utils.pixel_to_coord(blY, 'y')
     trX = utils.pixel_to_coord(trX, 'x')
     trY = utils.pixel_to_coord(trY, 'y')
     
-    # use list so I can reuse the iterable
-    points = list(utils.bresenham_line(blX, blY, trX, trY))
-    
-    color = utils.scale_100(old.pen_color)
-    pixel_list = ((x, y, color) for x, y in points)
+    points = utils.bresenham_arrays(blX, blY, trX, trY)
+    return points, (blX, blY, trX, trY)
+
+def draw_line(image, pen_color, points):
+    """
+    returns image with the points drawn in pen_color
+    """
+    xs, ys = points
+    return image.set_pixels(xs, ys, utils.scale_100(pen_color))
+
+def paper_image(value, mutable=False):
+    """
+    returns a blank image of the given DBN color
+    """
+    return DBNImage(color=utils.scale_100(value), mutable=mutable)
+
+def clip_pen(value):
+    return utils.clip_100(value)
+
+@builtin('blX', 'blY', 'trX', 'trY')
+@Producer
+def Line(old, new, *args):
     
-    new.image = old.image.set_pixels(pixel_list)
+    points, (blX, blY, trX, trY) = line_points(*args)
+    new.image = draw_line(old.image, old.pen_color, points)
     
-    current_line_no = new.line_no
-    new_ghosts = (old.ghosts
-                .add_dimension_line(current_line_no, 1, 'horizontal', blX, blY)  # for blX
-                .add_dimension_line(current_line_no, 2, 'vertical', blX, blY) # for blY
-                .add_dimension_line(current_line_no, 3, 'horizontal', trX, trY) # for trX
-                .add_dimension_line(current_line_no, 4, 'vertical', trX, trY) # for trY
-    )
+    if old.ghosts is None:
+        return
     
-    ## traverse up the environments,
-    ## adding these points to the ghost pointer
-    new_ghosts = new_ghosts.add_points_to_callstack(new.env, 0, points)
-
-    new.ghosts = new_ghosts
+    ## the dimension lines of the ends, and the points all
+    ## the way up the environments
+    new.ghosts = old.ghosts.add_line(new.line_no, new.env, (blX, blY, trX, trY), points)
 
 @builtin('value')
 @Producer
 def Paper(old, new, value):
-    color = utils.scale_100(value)
-    new.image = DBNImage(color=color)
+    new.image = paper_image(value, mutable=old.image.mutable)
 
 @builtin('value')
 @Producer
 def Pen(old, new, value):
-    new.pen_color = utils.clip_100(value)
+    new.pen_color = clip_pen(value)
     
 BUILTIN_PROCS = {
     'Line': Line,
     'Paper': Paper,
     'Pen': Pen,
-}
\ No newline at end of file
+}
+for name, proc in BUILTIN_PROCS.items():
+    proc.builtin_name = name
@@ -0,0 +1,354 @@
+"""
+a compiler that lowers a parsed dbn ast into a flat list of
+instructions, and a small stack machine that runs them
+
+the machine threads the same immutable DBNInterpreterState through
+the same state methods as the ast nodes' apply, so the images and
+ghosts it produces are the ones the tree walker produces. what goes
+away is the per node overhead: children unpacking, the operator and
+question tables being rebuilt on every evaluation, a python call per
+node, and the state the tree walker makes for every statement just
+to move the line number. the machine only moves the line on the
+next state it makes anyway, so its timeline has the tree walker's
+states that change something, but not the ones in between that only
+moved the line (a Question that didn't branch, say).
+
+an instruction is an (opcode, argument) tuple. a block is compiled
+once into a DBNCode; command bodies are compiled the first time
+they are called and kept on the compiler.
+"""
+import operator
+
+from structures import DBNDot, DBNProcedure
+from dbnast import DBNPythonNode
+
+# statements
+LINE_NO = 0      # arg: line_no                 state = state.set_line_no(arg)
+SET = 1          # pops rval, lval              state = state.set(lval, rval)
+REPEAT = 2       # arg: jump target             pops end, start, pushes a loop
+NEXT = 3         # arg: (slot, exit target)     sets the next loop value, or pops the loop and jumps
+JUMP = 4         # arg: target
+QUESTION = 5     # arg: (test, target)          pops right, left, jumps to target unless test(left, right)
+DEFINE = 6       # arg: (name, formals, formal slots, body, line_no)
+CALL = 7         # arg: (name, arg count)       pops the arguments
+APPLY = 8        # arg: node                    state = node.apply(state), for nodes the compiler doesn't know
+
+# expressions
+CONST = 10       # arg: value                   pushes a constant
+LOAD = 11        # arg: slot                    pushes a variable's value
+BINARY = 12      # arg: function                pops right, left, pushes function(left, right)
+PIXEL = 13       # pops y, x                    pushes the pixel at x, y
+DOT = 14         # pops y, x                    pushes a DBNDot
+EVALUATE = 15    # arg: node                    pushes node.evaluate(state)
+
+OPERATIONS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '/': operator.div,  # all numbers are always ints!
+    '*': operator.mul,
+}
+
+QUESTIONS = {
+    'Same': operator.eq,
+    'NotSame': operator.ne,
+    'Smaller': operator.lt,
+    'NotSmaller': operator.ge,
+}
+
+OPCODE_NAMES = dict((value, name) for name, value in globals().items()
+                    if name.isupper() and isinstance(value, int))
+
+
+class DBNCode:
+    """
+    a compiled block: the flat instruction list
+    """
+    def __init__(self, instructions):
+        self.instructions = instructions
+
+    def __len__(self):
+        return len(self.instructions)
+
+    def pformat(self):
+        lines = []
+        for index, (opcode, arg) in enumerate(self.instructions):
+            if arg is None:
+                lines.append("%4d %s" % (index, OPCODE_NAMES[opcode]))
+            else:
+                lines.append("%4d %-10s %r" % (index, OPCODE_NAMES[opcode], arg))
+        return '\n'.join(lines)
+
+    def pprint(self):
+        print self.pformat()
+
+
+class DBNCompiler:
+    """
+    turns DBNBlockNodes into DBNCode
+
+    statement nodes are compiled by compile_<type>, expressions by
+    compile_<type>_expression (and compile_<type>_lvalue for the left
+    side of a Set). a node without one of those is left to its own
+    apply or evaluate
+    """
+
+    def __init__(self):
+        self._bodies = {}
+
+    def compile(self, block):
+        instructions = []
+        self.compile_block(block, instructions)
+        return DBNCode(instructions)
+
+    def body_code(self, block):
+        """
+        returns the (cached) code for a command body
+        """
+        code = self._bodies.get(id(block))
+        if code is None or code[0] is not block:
+            code = (block, self.compile(block))
+            self._bodies[id(block)] = code
+        return code[1]
+
+    def compile_block(self, block, out):
+        for child in block.children:
+            self.compile_statement(child, out)
+
+    def compile_statement(self, node, out):
+        method = getattr(self, 'compile_' + node.type, None)
+        if method is None:
+            out.append((APPLY, node))
+        else:
+            method(node, out)
+
+    def compile_expression(self, node, out):
+        method = getattr(self, 'compile_%s_expression' % node.type, None)
+        if method is None:
+            out.append((EVALUATE, node))
+        else:
+            method(node, out)
+
+    def compile_set(self, node, out):
+        out.append((LINE_NO, node.line_no))
+        left, right = node.children
+        getattr(self, 'compile_%s_lvalue' % left.type)(left, out)
+        self.compile_expression(right, out)
+        out.append((SET, None))
+
+    def compile_repeat(self, node, out):
+        out.append((LINE_NO, node.line_no))
+        var, start, end, body = node.children
+        self.compile_expression(start, out)
+        self.compile_expression(end, out)
+        out.append((REPEAT, None))
+
+        next_index = len(out)
+        out.append(None)  # patched once we know where the loop ends
+        self.compile_block(body, out)
+        out.append((JUMP, next_index))
+        out[next_index] = (NEXT, (var.slot, len(out)))
+
+    def compile_question(self, node, out):
+        out.append((LINE_NO, node.line_no))
+        lvalue, rvalue, body = node.children
+        self.compile_expression(lvalue, out)
+        self.compile_expression(rvalue, out)
+
+        question_index = len(out)
+        out.append(None)
+        self.compile_block(body, out)
+        out[question_index] = (QUESTION, (QUESTIONS[node.name], len(out)))
+
+    def compile_command(self, node, out):
+        out.append((LINE_NO, node.line_no))
+        for arg in node.children:
+            self.compile_expression(arg, out)
+        out.append((CALL, (node.name, len(node.children))))
+
+    def compile_command_definition(self, node, out):
+        out.append((LINE_NO, node.line_no))
+        # [name, arg1, ..., argN, body]
+        command_name = node.children[0].evaluate_lazy().name
+        formals = [word.evaluate_lazy() for word in node.children[1:-1]]
+        body = node.children[-1]
+        out.append((DEFINE, (command_name, [formal.name for formal in formals], [formal.slot for formal in formals], body, node.line_no)))
+
+    def compile_number_expression(self, node, out):
+        out.append((CONST, node.value))
+
+    def compile_word_expression(self, node, out):
+        out.append((LOAD, node.slot))
+
+    def compile_operation_expression(self, node, out):
+        left, right = node.children
+        self.compile_expression(left, out)
+        self.compile_expression(right, out)
+        out.append((BINARY, OPERATIONS[node.name]))
+
+    def compile_bracket_expression(self, node, out):
+        left, right = node.children
+        self.compile_expression(left, out)
+        self.compile_expression(right, out)
+        out.append((PIXEL, None))
+
+    def compile_bracket_lvalue(self, node, out):
+        left, right = node.children
+        self.compile_expression(left, out)
+        self.compile_expression(right, out)
+        out.append((DOT, None))
+
+    def compile_word_lvalue(self, node, out):
+        out.append((CONST, node.variable))
+
+
+class DBNVirtualMachine:
+    """
+    runs DBNCode against a DBNInterpreterState
+    """
+
+    def __init__(self, compiler=None):
+        self.compiler = compiler or DBNCompiler()
+
+    def apply(self, block, state):
+        """
+        compiles and runs the block, returns the final state
+        """
+        return self.run(self.compiler.compile(block), state)
+
+    def run(self, code, state):
+        instructions = code.instructions
+        end = len(instructions)
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        loops = []
+        pc = 0
+        # the line of the statement being run. it is only put on the
+        # state by the next instruction that changes the state anyway
+        line_no = state.line_no
+
+        while pc < end:
+            opcode, arg = instructions[pc]
+            pc += 1
+
+            if opcode == LOAD:
+                push(state.lookup_slot(arg))
+
+            elif opcode == CONST:
+                push(arg)
+
+            elif opcode == BINARY:
+                right = pop()
+                stack[-1] = arg(stack[-1], right)
+
+            elif opcode == LINE_NO:
+                line_no = arg
+
+            elif opcode == NEXT:
+                slot, exit_target = arg
+                try:
+                    value = loops[-1].next()
+                except StopIteration:
+                    loops.pop()
+                    pc = exit_target
+                else:
+                    if state.line_no != line_no:
+                        state = self.at_line(state, line_no)
+                    state = state.set_slot(slot, value)
+
+            elif opcode == JUMP:
+                pc = arg
+
+            elif opcode == SET:
+                rval = pop()
+                lval = pop()
+                if state.line_no != line_no:
+                    state = self.at_line(state, line_no)
+                state = state.set(lval, rval)
+
+            elif opcode == QUESTION:
+                test, target = arg
+                right = pop()
+                left = pop()
+                if not test(left, right):
+                    pc = target
+
+            elif opcode == PIXEL:
+                y = pop()
+                x = pop()
+                push(state.image.query_pixel(x, y))
+
+            elif opcode == DOT:
+                y = pop()
+                x = pop()
+                push(DBNDot(x, y))
+
+            elif opcode == CALL:
+                name, arg_count = arg
+                if arg_count:
+                    evaluated_args = stack[-arg_count:]
+                    del stack[-arg_count:]
+                else:
+                    evaluated_args = []
+                if state.line_no != line_no:
+                    state = self.at_line(state, line_no)
+                state = self.call(state, name, evaluated_args)
+                line_no = state.line_no
+
+            elif opcode == REPEAT:
+                end_val = pop()
+                start_val = pop()
+                #+1 because it is end inclusive
+                if end_val > start_val:
+                    loops.append(iter(xrange(start_val, end_val + 1)))
+                else:
+                    loops.append(reversed(xrange(end_val, start_val + 1)))
+
+            elif opcode == DEFINE:
+                command_name, args, slots, body, def_line_no = arg
+                proc = DBNProcedure(args, slots, body, line_no=def_line_no)
+                if state.line_no != line_no:
+                    state = self.at_line(state, line_no)
+                state = state.add_command(command_name, proc)
+
+            elif opcode == EVALUATE:
+                push(arg.evaluate(state))
+
+            elif opcode == APPLY:
+                state = arg.apply(state)
+                line_no = state.line_no
+
+            else:
+                raise ValueError("Unknown opcode %r" % opcode)
+
+        if state.line_no != line_no:
+            state = self.at_line(state, line_no)
+        return state
+
+    def at_line(self, state, line_no):
+        """
+        puts line_no on the state, in place if it is the mutable one
+        """
+        if state.mutable:
+            state.line_no = line_no
+            return state
+        return state.set_line_no(line_no)
+
+    def call(self, state, name, evaluated_args):
+        proc = state.lookup_command(name)
+        if proc is None:
+            raise ValueError("Command %s not found!" % name)
+
+        # get the arg count of proc.. it has to be equal to length of evaluated args
+        if proc.arg_count != len(evaluated_args):
+            raise ValueError("%s requires %d arguments, but %d given" % \
+                (name, proc.arg_count, len(evaluated_args)))
+
+        state = state.push()
+        state = state.set_arguments(proc.formal_slots, evaluated_args)
+        if isinstance(proc.body, DBNPythonNode):
+            state = proc.body.apply(state)
+        else:
+            state = self.run(self.compiler.body_code(proc.body), state)
+        state = state.pop()
+        return state
@@ -0,0 +1,330 @@
+"""
+an engine that translates a parsed dbn ast into python source,
+compiles it once, and runs it
+
+Repeat becomes a for loop, each Command definition a python function,
+arithmetic plain integer arithmetic, and Line, Paper and Pen call the
+drawing functions in builtins directly. nothing but the image and the
+pen color is kept, so there is no timeline and there are no ghosts:
+this is for rendering the final image.
+
+variables are dynamically scoped in dbn. a frame is a (dict, caller frame)
+pair, and a function only ever writes to its own dict. so while a function
+runs, nothing it reads from its callers can change, and every name it
+uses can live in a python local, looked up once when the function starts.
+
+python only allows 20 nested blocks in a function, so a Repeat or
+Question nested deeper than MAX_NESTED_BLOCKS becomes a helper function
+of its own. it shares the frame of the function it came from, which has
+every variable written through to it, and that function reloads the
+variables the helper set when it returns.
+"""
+import re
+
+import utils
+import builtins
+from dbnstate import DBNInterpreterState, RECURSION_LIMIT
+
+QUESTIONS = {
+    'Same': '==',
+    'NotSame': '!=',
+    'Smaller': '<',
+    'NotSmaller': '>=',
+}
+
+# nested for and if blocks in one generated function, before the next goes in a helper
+MAX_NESTED_BLOCKS = 16
+
+OPERATIONS = {
+    '+': '+',
+    '-': '-',
+    '/': '//',  # all numbers are always ints!
+    '*': '*',
+}
+
+
+def lookup(frame, name):
+    """
+    searches the frame, then its callers
+    """
+    while frame is not None:
+        inner, frame = frame
+        if name in inner:
+            return inner[name]
+    return 0
+
+
+def repeat_range(start, end):
+    #+1 because it is end inclusive
+    if end > start:
+        return xrange(start, end + 1)
+    else:
+        return xrange(start, end - 1, -1)
+
+
+class DBNRuntime:
+    """
+    the mutable state a generated script runs against
+    """
+
+    def __init__(self, image, pen_color):
+        self.image = image
+        self.pen_color = pen_color
+        self.depth = 0
+        self.commands = {
+            'Line': (4, DBNRuntime.line),
+            'Paper': (1, DBNRuntime.paper),
+            'Pen': (1, DBNRuntime.pen),
+        }
+
+    def call(self, frame, name, *args):
+        entry = self.commands.get(name)
+        if entry is None:
+            raise ValueError("Command %s not found!" % name)
+
+        arg_count, function = entry
+        if arg_count != len(args):
+            raise ValueError("%s requires %d arguments, but %d given" % \
+                (name, arg_count, len(args)))
+
+        if self.depth >= RECURSION_LIMIT:
+            raise ValueError("Recursion too deep! %d" % self.depth)
+        self.depth += 1
+        function(self, frame, *args)
+        self.depth -= 1
+
+    def set_dot(self, x, y, value):
+        x_coord = utils.pixel_to_coord(x, 'x')
+        y_coord = utils.pixel_to_coord(y, 'y')
+        self.image = self.image.set_pixel(x_coord, y_coord, utils.scale_100(value))
+
+    def query_pixel(self, x, y):
+        return self.image.query_pixel(x, y)
+
+    def line(self, frame, blX, blY, trX, trY):
+        points, _ = builtins.line_points(blX, blY, trX, trY)
+        self.image = builtins.draw_line(self.image, self.pen_color, points)
+
+    def paper(self, frame, value):
+        self.image = builtins.paper_image(value)
+
+    def pen(self, frame, value):
+        self.pen_color = builtins.clip_pen(value)
+
+
+class DBNFunctionWriter:
+    """
+    collects the source lines of one generated function
+    """
+
+    def __init__(self, name, formals, helper=False):
+        self.name = name
+        self.formals = formals
+        # a helper runs in its caller's frame (see DBNCodeGenerator.generate_helper)
+        self.helper = helper
+        self.lines = []
+        self.depth = 1
+        self.reads = set()
+        self.assigned = set()
+
+    def emit(self, line):
+        self.lines.append("    " * self.depth + line)
+
+    def source(self, top_level=False):
+        if top_level:
+            header = ["def %s(rt):" % self.name, "    f = {}", "    frame = (f, None)"]
+        elif self.helper:
+            header = ["def %s(rt, f, frame):" % self.name]
+        else:
+            # a repeated formal takes the last value, like the environment's update
+            params = ''.join(', arg_%d' % index for index in range(len(self.formals)))
+            header = ["def %s(rt, caller%s):" % (self.name, params)]
+            header.append("    f = {%s}" % ', '.join("%r: arg_%d" % (formal, index) for index, formal in enumerate(self.formals)))
+            header.append("    frame = (f, caller)")
+            for formal in sorted(set(self.formals)):
+                header.append("    %s = f[%r]" % (variable_name(formal), formal))
+
+        for name in sorted(self.reads - set(self.formals)):
+            if self.helper:
+                header.append("    %s = lookup(frame, %r)" % (variable_name(name), name))
+            elif top_level:
+                header.append("    %s = 0" % variable_name(name))
+            else:
+                header.append("    %s = lookup(caller, %r)" % (variable_name(name), name))
+
+        body = self.lines or ["    pass"]
+        return '\n'.join(header + body)
+
+
+def variable_name(name):
+    if re.match(r'^\w+$', name):
+        return 'v_' + name
+    return 'v_x' + name.encode('hex')
+
+
+class DBNCodeGenerator:
+    """
+    turns a DBNBlockNode into the source of a python module
+    with a run(rt) function
+
+    statements are generated by generate_<type>, expressions by
+    expression_<type>
+    """
+
+    def generate(self, block):
+        self.functions = []
+        self.command_count = 0
+        self.helper_count = 0
+
+        top = DBNFunctionWriter('run', [])
+        self.generate_block(block, top)
+        self.functions.append(top.source(top_level=True))
+        return '\n\n'.join(self.functions) + '\n'
+
+    def generate_block(self, block, out):
+        for child in block.children:
+            method = getattr(self, 'generate_' + child.type, None)
+            if method is None:
+                raise ValueError("Cannot generate python for a %s node" % child.type)
+            method(child, out)
+
+    def expression(self, node, out):
+        method = getattr(self, 'expression_' + node.type, None)
+        if method is None:
+            raise ValueError("Cannot generate python for a %s expression" % node.type)
+        return method(node, out)
+
+    def assign(self, name, value, out):
+        """
+        emits an assignment to the variable name
+        writes through to the frame dict, so commands called later can see it
+        """
+        out.reads.add(name)
+        out.assigned.add(name)
+        out.emit("%s = f[%r] = %s" % (variable_name(name), name, value))
+
+    def generate_helper(self, node, out):
+        """
+        emits a call to a new helper function that runs node (a Repeat or a
+        Question) in out's frame, then reloads what it set
+        """
+        self.helper_count += 1
+        writer = DBNFunctionWriter("block_%d" % self.helper_count, [], helper=True)
+        getattr(self, 'generate_' + node.type)(node, writer)
+        self.functions.append(writer.source())
+
+        out.emit("%s(rt, f, frame)" % writer.name)
+        for name in sorted(writer.assigned):
+            out.reads.add(name)
+            out.assigned.add(name)
+            # a Question's body might not have run
+            out.emit("%s = f.get(%r, %s)" % (variable_name(name), name, variable_name(name)))
+
+    def generate_set(self, node, out):
+        left, right = node.children
+        if left.type == 'bracket':
+            x, y = left.children
+            out.emit("rt.set_dot(%s, %s, %s)" % (
+                self.expression(x, out), self.expression(y, out), self.expression(right, out)))
+        else:
+            self.assign(left.name, self.expression(right, out), out)
+
+    def generate_repeat(self, node, out):
+        if out.depth > MAX_NESTED_BLOCKS:
+            return self.generate_helper(node, out)
+        var, start, end, body = node.children
+        name = var.name
+        out.reads.add(name)
+        out.assigned.add(name)
+        out.emit("for %s in repeat_range(%s, %s):" % (
+            variable_name(name), self.expression(start, out), self.expression(end, out)))
+        out.depth += 1
+        out.emit("f[%r] = %s" % (name, variable_name(name)))
+        self.generate_block(body, out)
+        out.depth -= 1
+
+    def generate_question(self, node, out):
+        if out.depth > MAX_NESTED_BLOCKS:
+            return self.generate_helper(node, out)
+        lvalue, rvalue, body = node.children
+        out.emit("if %s %s %s:" % (
+            self.expression(lvalue, out), QUESTIONS[node.name], self.expression(rvalue, out)))
+        out.depth += 1
+        line_count = len(out.lines)
+        self.generate_block(body, out)
+        if len(out.lines) == line_count:
+            out.emit("pass")
+        out.depth -= 1
+
+    def generate_command(self, node, out):
+        args = ''.join(', ' + self.expression(arg, out) for arg in node.children)
+        out.emit("rt.call(frame, %r%s)" % (node.name, args))
+
+    def generate_command_definition(self, node, out):
+        # [name, arg1, ..., argN, body]
+        command_name = node.children[0].evaluate_lazy().name
+        args = [word.evaluate_lazy().name for word in node.children[1:-1]]
+        body = node.children[-1]
+
+        self.command_count += 1
+        function_name = "command_%d" % self.command_count
+        writer = DBNFunctionWriter(function_name, args)
+        self.generate_block(body, writer)
+        self.functions.append(writer.source())
+
+        out.emit("rt.commands[%r] = (%d, %s)" % (command_name, len(args), function_name))
+
+    def expression_number(self, node, out):
+        return str(node.value)
+
+    def expression_word(self, node, out):
+        out.reads.add(node.name)
+        return variable_name(node.name)
+
+    def expression_operation(self, node, out):
+        left, right = node.children
+        return "(%s %s %s)" % (
+            self.expression(left, out), OPERATIONS[node.name], self.expression(right, out))
+
+    def expression_bracket(self, node, out):
+        left, right = node.children
+        return "rt.query_pixel(%s, %s)" % (self.expression(left, out), self.expression(right, out))
+
+
+class DBNPythonScript:
+    """
+    a dbn script compiled to python
+    """
+
+    def __init__(self, block):
+        self.source = DBNCodeGenerator().generate(block)
+        try:
+            code = compile(self.source, '<dbn>', 'exec', 0, True)
+        except SyntaxError as e:
+            # python only allows so many nested blocks
+            raise ValueError("Cannot compile script to python: %s" % e)
+        namespace = {
+            'lookup': lookup,
+            'repeat_range': repeat_range,
+        }
+        exec code in namespace
+        self.function = namespace['run']
+
+    def run(self, image, pen_color):
+        """
+        runs the script, returns the DBNRuntime it ran against
+        """
+        runtime = DBNRuntime(image, pen_color)
+        self.function(runtime)
+        return runtime
+
+    def apply(self, state):
+        """
+        runs the script starting from the image and pen color of state,
+        returns a new state with the final image and pen color (and no history)
+        """
+        runtime = self.run(state.image, state.pen_color)
+        new = DBNInterpreterState()
+        new.image = runtime.image
+        new.pen_color = runtime.pen_color
+        return new
@@ -1,10 +1,17 @@
+import json
 import sys
 from optparse import OptionParser
 
 from tokenizer import DBNTokenizer
 from parser import DBNParser
 from dbnstate import DBNInterpreterState
-import output
+from structures import DBNSymbolTable
+from bytecode import DBNVirtualMachine
+from codegen import DBNPythonScript
+from optimizer import DBNOptimizer
+from profiler import DBNProfiler, profiling
+
+ENGINES = ('tree', 'vm', 'python')
 
 option_parser = OptionParser()
 option_parser.add_option('-v', '--verbose', action="store_true", dest="verbose", help="verbose!", default=False)
@@ -13,12 +20,34 @@ option_parser.add_option('-j', '--javscript', action="store_true", dest="javascr
 option_parser.add_option('-l', '--line-numbers', action="store_true", dest="line_numbers", help="print line numbers!", default=False)
 option_parser.add_option('-f', '--full', action="store_true", dest="full", help="full interface!", default=False)
 option_parser.add_option('-t', '--time', action="store_true", dest="time", help="quit asap", default=False)
+option_parser.add_option('-n', '--no-history', action="store_false", dest="record_history", help="only keep the final state (no timeline or ghosts)", default=True)
+option_parser.add_option('-O', '--optimize', action="store_true", dest="optimize", help="fold constants (and hoist loop invariants) before running", default=False)
+option_parser.add_option('-p', '--profile', action="store_true", dest="profile", help="print the hottest lines and Commands (tree engine only)", default=False)
+option_parser.add_option('--profile-json', dest="profile_json", help="write the profile to this json file", metavar="FILE")
+option_parser.add_option('-e', '--engine', type="choice", choices=ENGINES, dest="engine", help="how to execute the script: %s" % ', '.join(ENGINES), default='tree')
 
 
 def run_script_text(dbn_script, **options):
     options = options or {}
     VERBOSE = options.get('verbose', False)
     dump_javascript = options.get('javascript', False)
+    engine = options.get('engine', 'tree')
+    record_history = options.get('record_history', True)
+    optimize = options.get('optimize', False)
+    # a profiler.DBNProfiler to record the run in
+    profiler = options.get('profiler')
+    # a limits.DBNLimits to stop the run at
+    limits = options.get('limits')
+    # a function to give each new state to, instead of linking them (see stream.py)
+    stream = options.get('stream')
+    if engine not in ENGINES:
+        raise ValueError("Unknown engine %s" % engine)
+    if profiler is not None and engine != 'tree':
+        raise ValueError("Only the tree engine can be profiled")
+    if limits is not None and engine != 'tree':
+        raise ValueError("Only the tree engine can be limited")
+    if stream is not None and engine == 'python':
+        raise ValueError("The python engine can't be streamed")
     
     tokenizer = DBNTokenizer()
     parser = DBNParser()
@@ -30,18 +59,119 @@ def run_script_text(dbn_script, **options):
             print token
 
     dbn_ast = parser.parse(tokens)
+    if optimize:
+        optimizer = DBNOptimizer()
+        dbn_ast = optimizer.optimize(dbn_ast)
+        if engine == 'tree':
+            # the vm and the generated python run their Repeats their own way
+            dbn_ast = optimizer.hoist(dbn_ast)
+            dbn_ast = optimizer.batch(dbn_ast)
+            dbn_ast = optimizer.memoize(dbn_ast)
+        if VERBOSE:
+            print "optimizer: folded %d nodes, %d static Repeat ranges, hoisted %d expressions, %d batched Repeats, %d memoized Commands" % (
+                optimizer.folded, optimizer.static_repeats, optimizer.hoisted, optimizer.batched, len(optimizer.memos))
+
     if dump_javascript:
         print dbn_ast.to_js(varname='ast')
 
     if VERBOSE:
         dbn_ast.pprint()
 
-    state = DBNInterpreterState()
-    state = dbn_ast.apply(state)
+    if limits is not None:
+        limits.start()
+    state = DBNInterpreterState(record_history=record_history, limits=limits, stream=stream, symbols=dbn_ast.symbols)
+    if stream is not None:
+        stream(state)
+    if engine == 'vm':
+        state = DBNVirtualMachine().apply(dbn_ast, state)
+    elif engine == 'python':
+        # only the final image and pen color, no timeline
+        script = DBNPythonScript(dbn_ast)
+        if VERBOSE:
+            print script.source
+        state = script.apply(state)
+    else:
+        if profiler is not None:
+            with profiling(profiler):
+                state = dbn_ast.apply(state)
+        else:
+            state = dbn_ast.apply(state)
+        if VERBOSE and optimize:
+            for memo in optimizer.memos:
+                print "memo %s: %d hits, %d misses" % (memo.name, memo.hits, memo.misses)
+            hits, misses, hit_rate = optimizer.memo_stats()
+            print "memos: %d hits, %d misses, %.0f%% hit rate" % (hits, misses, hit_rate * 100)
     
     return state
 
+
+def statement_signature(node):
+    """
+    what a top-level statement's run depends on in its source: the type,
+    value and line of each of its tokens (states and ghosts remember lines)
+    """
+    return tuple((token.type, token.value, token.line_no) for token in node.tokens)
+
+
+class DBNIncrementalRunner:
+    """
+    runs successive versions of a script, with history, reusing the states
+    of the top-level statements that haven't changed since the last run
+
+    a top-level statement only sees the state the ones before it left, so
+    the run resumes from the saved state right before the first statement
+    whose signature changed
+    """
+
+    def __init__(self):
+        self.signatures = []
+        # every version is parsed with the same symbol table, so the saved
+        # states' slots mean the same in all of them
+        self.symbols = DBNSymbolTable()
+        # checkpoints[i] is the state before the ith top-level statement,
+        # the last one is the final state
+        self.checkpoints = [DBNInterpreterState(symbols=self.symbols)]
+        self.reused = 0
+
+    def run(self, dbn_script):
+        """
+        returns the final state of dbn_script
+        """
+        tokens = DBNTokenizer().tokenize(dbn_script)
+        statements = DBNParser().parse(tokens, self.symbols).children
+        signatures = [statement_signature(node) for node in statements]
+
+        reused = 0
+        for old, new in zip(self.signatures, signatures):
+            if old != new:
+                break
+            reused += 1
+
+        checkpoints = self.checkpoints[:reused + 1]
+        state = checkpoints[-1]
+        # cut the old timeline off here (the producers would relink it
+        # anyway, but maybe nothing runs after this state)
+        old_next = state.next
+        state.next = None
+        try:
+            for node in statements[reused:]:
+                state = node.apply(state)
+                checkpoints.append(state)
+        except:
+            checkpoints[reused].next = old_next
+            raise
+
+        self.signatures = signatures
+        self.checkpoints = checkpoints
+        self.reused = reused
+        return state
+
+
 if __name__ == "__main__":
+    # only here, it needs Tk, and everything else runs headless
+    import output
+    from stream import stream_states
+
     (options, args) = option_parser.parse_args()
 
     VERBOSE = options.verbose
@@ -51,7 +181,24 @@ if __name__ == "__main__":
         filename = args[0]
         dbn_script = open(filename).read()
         
-        state = run_script_text(dbn_script, verbose=VERBOSE, javascript=JAVASCRIPT)
+        if options.animate or options.line_numbers:
+            # these start straight away, with the states as they're made
+            states = stream_states(dbn_script, engine=options.engine, optimize=options.optimize)
+            if options.animate:
+                output.animate_state(states)
+            else:
+                output.print_line_numbers(states)
+            sys.exit(0)
+        
+        profiler = None
+        if options.profile or options.profile_json:
+            profiler = DBNProfiler()
+        state = run_script_text(dbn_script, verbose=VERBOSE, javascript=JAVASCRIPT, engine=options.engine, record_history=options.record_history, optimize=options.optimize, profiler=profiler)
+        if options.profile:
+            print profiler.report(dbn_script)
+        if options.profile_json:
+            with open(options.profile_json, 'w') as out:
+                json.dump(profiler.as_dict(), out, indent=2, sort_keys=True)
         first = state
         while first.previous is not None:
             first = first.previous
@@ -61,9 +208,9 @@ if __name__ == "__main__":
         first = 5
 
     if options.animate: 
-        output.animate_state(first, 'next')
+        output.animate_state(output.walk(first, 'next'))
     elif options.line_numbers:
-        output.print_line_numbers(first)
+        output.print_line_numbers(output.walk(first, 'next'))
     elif options.full:
         # we have to destroy local references to this huge ass state.
         # first save it in a container
@@ -12,13 +12,28 @@ are the ones that this matters for
 Also, note that the line_no of the stored procedure created by the
 DefineCommandNode gets set to the line_no of the DefineCommandNode
 """
-from structures import DBNDot, DBNVariable, DBNProcedure
+from structures import DBNDot, DBNVariable, DBNProcedure, DBNSlotted
 
 VERBOSE = False
 
-class DBNBaseNode:
+# a profiler.DBNProfiler while one is on, see profiler.profiling
+PROFILER = None
+
+OPERATIONS = {
+    '+': lambda a, b: a + b,
+    '-': lambda a, b: a - b,
+    '/': lambda a, b: a / b,  # all numbers are always ints!
+    '*': lambda a, b: a * b,
+}
+
+class DBNBaseNode(DBNSlotted):
+    """
+    nodes are slotted (see DBNSlotted), so a subclass with attributes of
+    its own has to add them to its __slots__
+    """
     
     type = 'base'
+    __slots__ = ('line_no', 'tokens', 'children', 'name')
     
     def __init__(self, name=None, children=None, tokens=None, line_no=-1):
         self.line_no = line_no
@@ -70,6 +85,12 @@ class DBNBaseNode:
 class DBNBlockNode(DBNBaseNode):
     
     type = 'block'
+    __slots__ = ('symbols',)
+    
+    def __init__(self, *args, **kwargs):
+        DBNBaseNode.__init__(self, *args, **kwargs)
+        # the structures.DBNSymbolTable of the script, on the tree's root (set by the parser)
+        self.symbols = None
     
     def apply(self, state):
         """
@@ -77,7 +98,12 @@ class DBNBlockNode(DBNBaseNode):
         
         returns the state
         """
+        if PROFILER is not None:
+            return PROFILER.apply_block(self, state)
+        limits = state.limits
         for child in self.children:
+            if limits is not None:
+                limits.check(state)
             state = child.apply(state)
         return state
 
@@ -88,6 +114,7 @@ class DBNSetNode(DBNBaseNode):
     """
     
     type = 'set'
+    __slots__ = ()
     
     def apply(self, state):
         state = state.set_line_no(self.line_no)
@@ -104,25 +131,63 @@ class DBNSetNode(DBNBaseNode):
 class DBNRepeatNode(DBNBaseNode):
     
     type = 'repeat'
+    __slots__ = ('static_range', 'hoisted', 'batch')
+    
+    def __init__(self, *args, **kwargs):
+        DBNBaseNode.__init__(self, *args, **kwargs)
+        # (start, end) when both are numbers, set by the optimizer
+        self.static_range = None
+        # DBNHoistedNodes from the body to evaluate once on the way in, also the optimizer
+        self.hoisted = ()
+        # a batch.DBNBatch to run the whole nest at once, for states without a history
+        self.batch = None
     
     def apply(self, state):
         state = state.set_line_no(self.line_no)
         
+        if self.batch is not None and state.mutable:
+            batched = self.batch.apply(state)
+            if batched is not None:
+                return batched
+        
         var, start, end, body = self.children
         
         variable = var.evaluate_lazy(state)
-        start_val = start.evaluate(state)
-        end_val = end.evaluate(state)
+        if self.static_range is not None:
+            start_val, end_val = self.static_range
+        else:
+            start_val = start.evaluate(state)
+            end_val = end.evaluate(state)
         
         #+1 because it is end inclusive
         if end_val > start_val:
-            repeat_range = range(start_val, end_val + 1)
+            repeat_range = xrange(start_val, end_val + 1)
         else:
-            repeat_range = reversed(range(end_val, start_val + 1))
+            repeat_range = xrange(start_val, end_val - 1, -1)
         
-        for variable_value in repeat_range:
-            state = state.set_variable(variable.name, variable_value)
-            state = body.apply(state)
+        limits = state.limits
+        if not self.hoisted:
+            for variable_value in repeat_range:
+                if limits is not None:
+                    limits.check(state)
+                state = state.set_slot(variable.slot, variable_value)
+                state = body.apply(state)
+            return state
+        
+        # only the ones that entered exit, if working one out fails
+        entered = 0
+        try:
+            for hoisted in self.hoisted:
+                hoisted.enter(state)
+                entered += 1
+            for variable_value in repeat_range:
+                if limits is not None:
+                    limits.check(state)
+                state = state.set_slot(variable.slot, variable_value)
+                state = body.apply(state)
+        finally:
+            for hoisted in self.hoisted[:entered]:
+                hoisted.exit()
         
         return state
 
@@ -130,6 +195,7 @@ class DBNRepeatNode(DBNBaseNode):
 class DBNQuestionNode(DBNBaseNode):
     
     type = 'question'
+    __slots__ = ()
     
     def apply(self, state):
         state = state.set_line_no(self.line_no)
@@ -156,8 +222,14 @@ class DBNQuestionNode(DBNBaseNode):
 class DBNCommandNode(DBNBaseNode):
     
     type = 'command'
+    __slots__ = ()
     
     def apply(self, state):
+        if PROFILER is not None:
+            return PROFILER.apply_command(self, state)
+        return self.call(state)
+    
+    def call(self, state):
         state = state.set_line_no(self.line_no)
         
         evaluated_args = [arg.evaluate(state) for arg in self.children]
@@ -170,8 +242,13 @@ class DBNCommandNode(DBNBaseNode):
             raise ValueError("%s requires %d arguments, but %d given" % \
                 (self.name, proc.arg_count, len(evaluated_args)))
         
+        if proc.memo is not None and state.mutable:
+            memoized = proc.memo.apply(proc, evaluated_args, state)
+            if memoized is not None:
+                return memoized
+        
         state = state.push()
-        state = state.set_variables(**dict(zip(proc.formal_args, evaluated_args)))
+        state = state.set_arguments(proc.formal_slots, evaluated_args)
         state = proc.body.apply(state)
         state = state.pop()
         return state
@@ -180,16 +257,23 @@ class DBNCommandNode(DBNBaseNode):
 class DBNCommandDefinitionNode(DBNBaseNode):
     
     type = 'command_definition'
+    __slots__ = ('memo',)
+    
+    def __init__(self, *args, **kwargs):
+        DBNBaseNode.__init__(self, *args, **kwargs)
+        # a memo.DBNCommandMemo for the procedures it defines, set by the optimizer when they are pure
+        self.memo = None
     
     def apply(self, state):
         state = state.set_line_no(self.line_no)
         
         # [name, arg1, ..., argN, body]
         command_name = self.children[0].evaluate_lazy().name
-        args = [word.evaluate_lazy().name for word in self.children[1:-1]]
+        formals = [word.evaluate_lazy() for word in self.children[1:-1]]
         body = self.children[-1]
         
-        proc = DBNProcedure(args, body, line_no=self.line_no)
+        proc = DBNProcedure([formal.name for formal in formals], [formal.slot for formal in formals], body, line_no=self.line_no)
+        proc.memo = self.memo
         
         state = state.add_command(command_name, proc)
         return state
@@ -200,6 +284,7 @@ class DBNPythonNode(DBNBaseNode):
     also, never created by the parser, only by me
     """
     type = 'python'
+    __slots__ = ('function',)
     
     def __init__(self, function):
         DBNBaseNode.__init__(self, tokens=[])
@@ -221,6 +306,7 @@ class DBNPythonNode(DBNBaseNode):
 class DBNBracketNode(DBNBaseNode):
     
     type = 'bracket'
+    __slots__ = ()
     
     def evaluate(self, state):
         """
@@ -249,6 +335,7 @@ class DBNBracketNode(DBNBaseNode):
 class DBNBinaryOpNode(DBNBaseNode):
     
     type = 'operation'
+    __slots__ = ()
     
     def __str__(self):
         return "(%s %s %s)" % (self.operation, str(self.left), str(self.right))
@@ -259,39 +346,81 @@ class DBNBinaryOpNode(DBNBaseNode):
         left = left.evaluate(state)
         right = right.evaluate(state)
         
-        ops = {
-            '+': lambda a, b: a + b,
-            '-': lambda a, b: a - b,
-            '/': lambda a, b: a / b,  # all numbers are always ints!
-            '*': lambda a, b: a * b,
-        }
-        
-        return ops[self.name](left, right)
+        return OPERATIONS[self.name](left, right)
+
+
+class DBNHoistedNode(DBNBaseNode):
+    """
+    an expression the optimizer moved out of a Repeat body. the Repeat
+    evaluates it once as it starts (enter), and every evaluate in the
+    body gives back that value until the Repeat is done (exit)
+
+    the values are a stack, because the same Repeat can be started again
+    (by a recursive Command) before the first one is done
+    """
+    
+    type = 'hoisted'
+    __slots__ = ('values',)
+    
+    def __init__(self, *args, **kwargs):
+        DBNBaseNode.__init__(self, *args, **kwargs)
+        self.values = []
+    
+    def enter(self, state):
+        self.values.append(self.children[0].evaluate(state))
+    
+    def exit(self):
+        self.values.pop()
+    
+    def evaluate(self, state):
+        return self.values[-1]
 
 
 class DBNNumberNode(DBNBaseNode):
+    """
+    the int value is worked out once, when the node is made
+    """
     
     type = 'number'
+    __slots__ = ('value',)
+    
+    def __init__(self, *args, **kwargs):
+        DBNBaseNode.__init__(self, *args, **kwargs)
+        self.value = int(self.name)
     
     def evaluate(self, state):
-        return int(self.name)
+        return self.value
     
     def pformat(self, depth, indent):
         return "%s(number %s)\n" % (" "*depth*indent, self.name)
 
 class DBNWordNode(DBNBaseNode):
+    """
+    the slot of the variable, in the script's symbol table (see
+    structures.DBNSymbolTable), is worked out once, when the parser
+    resolves the script's names
+    """
     
     type = 'word'
-
+    __slots__ = ('slot', 'variable')
+    
+    def __init__(self, *args, **kwargs):
+        DBNBaseNode.__init__(self, *args, **kwargs)
+        self.slot = None
+        self.variable = None
+    
+    def resolve(self, symbols):
+        self.slot = symbols.slot(self.name)
+        self.variable = DBNVariable(self.name, self.slot)
     
     def evaluate(self, state):
-        return state.lookup_variable(self.name)
+        return state.lookup_slot(self.slot)
     
     def evaluate_lazy(self, state=None):
         """
         state is optional here, because we don't need it!
         """
-        return DBNVariable(self.name)
+        return self.variable
     
     def pformat(self, depth, indent):
         return "%s(word %s)\n" % (" "*depth*indent, self.name)
@@ -22,12 +22,12 @@ class DBNImageCanvas(Tkinter.Canvas):
         self.itemconfigure(self.canvas_image, image=tkinter_image)
         self._dbn_image = tkinter_image
         
-    def set_ghost(self, key, ghost_hash):
-        image = ghost_hash.get(key)
+    def set_ghost(self, key, ghosts):
+        image = ghosts.render(key)
         if image is None:
             return None
         else:
-            ghost_tkinter_image = ImageTk.BitmapImage(image._image.resize((202, 202)), foreground="red")
+            ghost_tkinter_image = ImageTk.BitmapImage(image.resize((202, 202)), foreground="red")
             self.itemconfigure(self.ghost_image, image=ghost_tkinter_image)
             self._ghost_image = ghost_tkinter_image
             return True
@@ -123,7 +123,7 @@ class DBNTextInput(Tkinter.Text):
                      int_arg_index = index
                      break
              if int_arg_index is not None:
-                 return "l%sa%d" % (str_line_no, int_arg_index)
+                 return (int(str_line_no), int_arg_index)
                  
              else:
                  return None
@@ -276,6 +276,7 @@ class DBNInterface:
         self.master = master
         self.state_wrapper = state_wrapper
         self.initial_script = initial_script
+        self.runner = dbn.DBNIncrementalRunner()
         
         self.add_widgets()
         self.bind_events()
@@ -325,17 +326,14 @@ class DBNInterface:
 
     def draw_frame_numbered(self, n):
         """
-        will get the current state, rewind it,
-        then walk forward to the nth.
-        not elegeant at all.
-        REDO THIS (state player wrapper class?)
+        moves the state wrapper to the nth state and draws it
         """        
         self.state_wrapper.seek(n)
         self.draw_cursor()
 
     def draw_text(self):
         dbn_script = self.text.get_contents()
-        new_state = dbn.run_script_text(dbn_script)
+        new_state = self.runner.run(dbn_script)
         self.state_wrapper.change_state(new_state)
         self.draw_cursor()
 
@@ -353,7 +351,7 @@ class DBNInterface:
         if key is None:
             self.image_canvas.clear_ghost()
         else:
-            success = self.image_canvas.set_ghost(key, self.state_wrapper.cursor.ghosts._ghost_hash)
+            success = self.image_canvas.set_ghost(key, self.state_wrapper.cursor.ghosts)
             if success is None:
                 self.image_canvas.clear_ghost()
 
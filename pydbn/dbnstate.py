@@ -1,16 +1,28 @@
 import copy
 
+import numpy
 from PIL import Image
 
 import utils
-from structures import DBNVariable, DBNDot
+from pmap import DBNPersistentMap, DBNPersistentVector, DBNMutableVector
+from structures import DBNVariable, DBNDot, DBNSlotted, DBNSymbolTable
 
 RECURSION_LIMIT = 50
 
 
 def Producer(function): 
+    """
+    makes a method that returns a changed copy of its instance
+
+    an instance with a true mutable attribute is changed in place instead,
+    and returned itself (without any forward and back links). one with a
+    stream hands the copy to it instead of linking it
+    """
     def inner(old, *args, **kwargs):
-        new = copy.copy(old)
+        if getattr(old, 'mutable', False):
+            new = old
+        else:
+            new = copy.copy(old)
             
         retval = function(*((old, new) + args), **kwargs)
             
@@ -19,6 +31,14 @@ def Producer(function):
         else:
             raise AssertionError("must return new instance from Producer method")
             
+        if new is old:
+            return new
+        
+        stream = getattr(new, 'stream', None)
+        if stream is not None:
+            stream(new)
+            return new
+        
         # attach forward and back links if they exist
         if hasattr(old, 'next'):
             old.next = new
@@ -32,72 +52,128 @@ def Producer(function):
 
 class DBNProcedureSet():
     """
-    For now, just the built ins (Line, Paper, Pen)
+    the built ins (Line, Paper, Pen) and the Commands defined so far,
+    in a persistent map (see pmap), so a copy shares it
     """
     
-    def __init__(self):
-        self.dispatch = {}
-        self.dispatch.update(builtins.BUILTIN_PROCS)  # adds the builtins
+    mutable = False
+    
+    def __init__(self, mutable=False, dispatch=None):
+        self.mutable = mutable
+        if dispatch is None:
+            dispatch = DBNPersistentMap().update(builtins.BUILTIN_PROCS)
+        self.dispatch = dispatch
         
     def __copy__(self):
-        new = DBNProcedureSet() # because the builtins come builtin
-        new.dispatch = copy.copy(self.dispatch)
-        return new
+        return DBNProcedureSet(dispatch=self.dispatch)
+    
+    def __getstate__(self):
+        return {'mutable': self.mutable, 'dispatch': self.dispatch.items()}
+    
+    def __setstate__(self, state):
+        self.mutable = state['mutable']
+        self.dispatch = DBNPersistentMap().update(state['dispatch'])
     
     def get(self, command_name):
         return self.dispatch.get(command_name, None)
     
     @Producer
     def add(old, new, command_name, proc):
-        new.dispatch[command_name] = proc
+        new.dispatch = old.dispatch.set(command_name, proc)
 
         
-class DBNEnvironment(object):
+class DBNEnvironment(DBNSlotted):
+    """
+    a frame of variables: a persistent vector (see pmap) of values indexed
+    by slot, None where a variable isn't set. symbols is the
+    structures.DBNSymbolTable the slots are in, which every frame of a run
+    shares, for getting at variables by name
+
+    variables are dynamically scoped, but Set only ever writes the
+    innermost frame, so a frame can't change while there is a frame pushed
+    on it. a pushed frame starts with its parent's vector, and a read never
+    has to look further than the frame it's in. a set only copies the path
+    down to the slot, so frames and their copies share the rest
+
+    a mutable environment has a DBNMutableVector instead, and a pushed
+    frame gets a copy of it
+    """
+    
+    __slots__ = ('base_line_no', 'parent', 'mutable', 'values', 'symbols')
     
-    def __init__(self, parent=None, base_line_no=-1):
+    def __init__(self, parent=None, base_line_no=-1, mutable=False, values=None, symbols=None):
         self.base_line_no = base_line_no
         self.parent = parent
-        self._inner = {}
+        self.mutable = mutable
+        if values is None:
+            values = DBNMutableVector() if mutable else DBNPersistentVector()
+        self.values = values
+        self.symbols = symbols if symbols is not None else DBNSymbolTable()
 
     def __copy__(self):
-        new = DBNEnvironment(parent=self.parent, base_line_no=self.base_line_no)
-        new._inner = copy.copy(self._inner)
-        return new
+        return DBNEnvironment(parent=self.parent, base_line_no=self.base_line_no, values=self.values, symbols=self.symbols)
+    
+    def __getstate__(self):
+        state = DBNSlotted.__getstate__(self)
+        state['values'] = self.values.items()
+        return state
+    
+    def __setstate__(self, state):
+        values = state.pop('values')
+        DBNSlotted.__setstate__(self, state)
+        self.values = DBNMutableVector() if self.mutable else DBNPersistentVector()
+        for slot, value in values:
+            self.values = self.values.set(slot, value)
     
     def __len__(self):
-        return len(self._inner)
+        return len(self.values)
     
     def __getitem__(self, key):
         out = self.get(key)
         if out is None:
             raise KeyError("%s not found in environment heirarchy" % key)
+        return out
+    
+    def get_slot(self, slot, default=None):
+        return self.values.get(slot, default)
     
     def get(self, key, default=None):
+        slot = self.symbols.get(key)
+        if slot is None:
+            return default
+        return self.values.get(slot, default)
+    
+    def variables(self):
         """
-        searches this first, then parents
+        returns a dict of the names and values of every variable set here or in a parent
         """
-        try:
-            return self._inner[key]
-        except KeyError:
-            if self.parent is None:
-                return default
-            else:
-                return self.parent.get(key, default)        
+        names = self.symbols.names
+        return dict((names[slot], value) for slot, value in self.values.items())
     
     @Producer
-    def set(old, new, key, value):
-        new._inner[key] = value
-        
+    def set_slot(old, new, slot, value):
+        new.values = old.values.set(slot, value)
+    
     @Producer
-    def update(old, new, dct):
-        new._inner.update(dct)
+    def set_slots(old, new, slots, values):
+        for slot, value in zip(slots, values):
+            new.values = new.values.set(slot, value)
+    
+    def set(self, key, value):
+        return self.set_slot(self.symbols.slot(key), value)
+        
+    def update(self, dct):
+        items = dct.items()
+        return self.set_slots([self.symbols.slot(key) for key, _ in items], [value for _, value in items])
       
     @Producer
     def delete(old, new, key):
-        del new._inner[key]
+        # back to what the parent has
+        slot = old.symbols.slot(key)
+        new.values = old.values.set(slot, old.parent.get_slot(slot) if old.parent is not None else None)
       
     def push(self, base_line_no):
-        child = DBNEnvironment(parent=self, base_line_no=base_line_no)
+        child = DBNEnvironment(parent=self, base_line_no=base_line_no, mutable=self.mutable, values=self.values.copy(), symbols=self.symbols)
         return child
     
     def pop(self):
@@ -107,32 +183,59 @@ class DBNEnvironment(object):
             return self.parent
         
         
-class DBNInterpreterState(object):
+class DBNInterpreterState(DBNSlotted):
     """
     The state of the interpreter.
     Really, just the pen color, master environment?
     and, of course, the image.
     
     fucking immutable!
+    
+    unless record_history is False: then there is only ever the one
+    state, changed in place along with its image, environments and
+    commands. it has no previous or next, and no ghosts (ghosts is None).
+    
+    with a stream (a function, see stream.py) each new state is given to
+    it instead of being linked to the one before, and there are no ghosts
+    either, so nothing keeps the states the stream has let go of.
+    
+    there are a lot of these, so they're slotted (see DBNSlotted)
     """ 
     
-    next = None
-    previous = None     
+    __slots__ = ('mutable', 'image', 'pen_color', 'env', 'commands', 'ghosts',
+                 'stack_depth', 'line_no', 'step', 'next', 'previous', 'limits', 'stream')
     
-    def __init__(self, new=True):
+    def __init__(self, new=True, record_history=True, limits=None, stream=None, symbols=None):
+        self.next = None
+        self.previous = None
+        self.mutable = False
+        self.stream = None
         if new:
-            self.image = DBNImage(color=255)
+            # a limits.DBNLimits for the run, or None
+            self.limits = limits
+            if stream is not None and not record_history:
+                raise ValueError("Only states with a history can be streamed")
+            self.stream = stream
+            self.mutable = not record_history
+            self.image = DBNImage(color=255, mutable=self.mutable)
             self.pen_color = 100
-            self.env = DBNEnvironment()
-            self.commands = DBNProcedureSet()
-            self.ghosts = DBNGhosts()
+            # the structures.DBNSymbolTable of the tree it runs, see DBNEnvironment
+            self.env = DBNEnvironment(mutable=self.mutable, symbols=symbols)
+            self.commands = DBNProcedureSet(mutable=self.mutable)
+            if record_history and stream is None:
+                self.ghosts = DBNGhosts()
+            else:
+                self.ghosts = None
             
             self.stack_depth = 0
             self.line_no = -1
+            self.step = 0
             
     
     def __copy__(self):
         new = DBNInterpreterState(new=False)
+        # how many states came before this one, lets timelines index in O(1)
+        new.step = self.step + 1
 
         new.image = self.image
         new.pen_color = self.pen_color
@@ -142,8 +245,16 @@ class DBNInterpreterState(object):
         
         new.stack_depth = self.stack_depth
         new.line_no = self.line_no
-        
+        new.limits = self.limits
+        new.stream = self.stream
+
         return new
+
+    def __getstate__(self):
+        state = DBNSlotted.__getstate__(self)
+        # the stream is only any good to the run that made the state
+        state['stream'] = None
+        return state
         
       
     def lookup_command(self, name):
@@ -155,15 +266,29 @@ class DBNInterpreterState(object):
         
     def lookup_variable(self, var):
         return self.env.get(var, 0)
+    
+    def lookup_slot(self, slot):
+        return self.env.values.get(slot, 0)
      
     @Producer
     def set_variable(old, new, var, to):
         new.env = old.env.set(var, to)
     
+    @Producer
+    def set_slot(old, new, slot, to):
+        new.env = old.env.set_slot(slot, to)
+    
     @Producer
     def set_variables(old, new, **kwargs):
         new.env = old.env.update(kwargs)
     
+    @Producer
+    def set_arguments(old, new, slots, values):
+        """
+        sets the variables at slots to values (a Command's formal_slots and its arguments)
+        """
+        new.env = old.env.set_slots(slots, values)
+    
     @Producer
     def set(old, new, lval, rval):
         """
@@ -177,19 +302,14 @@ class DBNInterpreterState(object):
             color = utils.scale_100(rval)
             new.image = old.image.set_pixel(x_coord, y_coord, color)
             
+            if old.ghosts is None:
+                return
+            
             ##### hinting stuff
-            line_no = new.line_no
-
-            new_ghosts = (old.ghosts
-                            .add_dimension_line(line_no, 1, 'horizontal', x_coord, y_coord)
-                            .add_dimension_line(line_no, 2, 'vertical', x_coord, y_coord)
-            )
-            new_ghosts = new_ghosts.add_point(line_no, 0, (x_coord, y_coord))
-            new_ghosts = new_ghosts.add_point_to_callstack(new.env, 0, (x_coord, y_coord))
-            new.ghosts = new_ghosts
+            new.ghosts = old.ghosts.add_dot(new.line_no, new.env, x_coord, y_coord)
             
         elif isinstance(lval, DBNVariable):
-            new.env = old.env.set(lval.name, rval)
+            new.env = old.env.set_slot(lval.slot, rval)
         
         else:
             raise ValueError("Unknown lvalue! %s" % str(lval))
@@ -218,116 +338,344 @@ class DBNInterpreterState(object):
 class DBNGhosts:
     """
     immutable state object representing ghosts
+    
+    for every (line_no, arg_no) key there is a persistent linked list of
+    (entry, rest) pairs, newest first. an entry is a flat pixel index
+    (y * 101 + x), an array of them, or a (direction, x, y) dimension line.
+    the list heads are in a persistent map (see pmap), so a copy shares
+    them and adding to one only copies its way down the trie, dimension
+    lines cost a tuple, and a ghost is only drawn into a bitmap when
+    render asks for it
     """
     
     def __init__(self):
-        self._ghost_hash = {}
+        self._ghost_hash = DBNPersistentMap()
+        # key: (list head, image) of the ghosts render has drawn
+        self._rendered = {}
     
     def __copy__(self):
         new = DBNGhosts()
-        new._ghost_hash = copy.copy(self._ghost_hash)
+        new._ghost_hash = self._ghost_hash
         return new
     
-    def _make_key(self, line_no, arg_no):
-        return "l%da%d" % (line_no, arg_no)
+    def __getstate__(self):
+        return {'_ghost_hash': self._ghost_hash.items()}
     
-    def _get_image(self, line_no, arg_no):
-        key = self._make_key(line_no, arg_no)
-        return self._ghost_hash.get(key)
-
-    def _set_image(self, line_no, arg_no, dbnimage):
-        key = self._make_key(line_no, arg_no)
-        self._ghost_hash[key] = dbnimage
-        return dbnimage
-        
-    def _add_points(self, line_no, arg_no, points):
+    def __setstate__(self, state):
+        self._ghost_hash = DBNPersistentMap().update(state['_ghost_hash'])
+        self._rendered = {}
+    
+    def keys(self):
+        return self._ghost_hash.keys()
+    
+    def render(self, key):
         """
-        points is a list of tuples
+        returns a mode '1' PIL image of the ghost at the (line_no, arg_no) key,
+        or None if there isn't one
         """
-        image = self._get_image(line_no, arg_no)
-        if image is None:
-            image = DBNImage(color=0, mode='1')  # bitmap mode
-            
-        new_image = image.set_pixels((x, y, 1) for x,y in points)
-        self._set_image(line_no, arg_no, new_image)
+        head = self._ghost_hash.get(key)
+        if head is None:
+            return None
+        
+        rendered = self._rendered
+        if key in rendered and rendered[key][0] is head:
+            return rendered[key][1]
+        
+        singles = []
+        arrays = []
+        dimension_lines = set()
+        node = head
+        while node is not None:
+            entry, node = node
+            if isinstance(entry, int):
+                singles.append(entry)
+            elif isinstance(entry, tuple):
+                dimension_lines.add(entry)
+            else:
+                arrays.append(entry)
+        arrays.append(numpy.array(singles, dtype=numpy.int16))
+        for direction, x, y in dimension_lines:
+            arrays.append(flat_pixels(*utils.dimension_line_arrays(direction, x, y)))
+        
+        size = DBNImage.SIZE
+        bitmap = numpy.zeros(size * size, numpy.uint8)
+        bitmap[numpy.concatenate(arrays)] = 255
+        image = Image.fromarray(bitmap.reshape(size, size), 'L').convert('1', dither=Image.NONE)
+        rendered[key] = (head, image)
+        return image
+        
+    def _add(self, line_no, arg_no, entry):
+        key = (line_no, arg_no)
+        rest = self._ghost_hash.get(key)
+        if rest is not None:
+            head = rest[0]
+            if head is entry or (type(head) is type(entry) is not numpy.ndarray and head == entry):
+                return  # the same thing again, nothing new to see
+        self._ghost_hash = self._ghost_hash.set(key, (entry, rest))
+    
+    def _add_to_callstack(self, walking_env, arg_no, entry):
+        while walking_env.parent is not None:
+            line_no = walking_env.base_line_no
+            if line_no == -1:
+                raise AssertionError("base_line_no of an environment should not be -1 unless it is the root environment")
+            self._add(line_no, arg_no, entry)
+            walking_env = walking_env.parent
     
     @Producer
     def add_points(old, new, line_no, arg_no, points):
-        new._add_points(line_no, arg_no, points)
+        """
+        points is a pair of arrays (xs, ys)
+        """
+        new._add(line_no, arg_no, flat_pixels(*points))
     
     @Producer
     def add_point(old, new, line_no, arg_no, point):
         """
         point is an (x, y) tuple
         """
-        new._add_points(line_no, arg_no, [point])
+        new._add(line_no, arg_no, flat_pixel(*point))
     
     @Producer
     def add_dimension_line(old, new, line_no, arg_no, direction, x, y):
         """
         adds a dimension line!
         """
-        points = utils.dimension_line(direction, x, y)
-        new._add_points(line_no, arg_no, points)
+        new._add(line_no, arg_no, (direction, x, y))
  
     @Producer
     def add_points_to_callstack(old, new, walking_env, arg_no, points):
-        while walking_env.parent is not None:
-            line_no = walking_env.base_line_no
-            if line_no == -1:
-                raise AssertionError("base_line_no of an environment should not be -1 unless it is the root environment")
-            new._add_points(line_no, arg_no, points)
-            walking_env = walking_env.parent
+        """
+        points is a pair of arrays (xs, ys)
+        """
+        new._add_to_callstack(walking_env, arg_no, flat_pixels(*points))
             
     @Producer
     def add_point_to_callstack(old, new, walking_env, arg_no, point):
-        while walking_env.parent is not None:
-            line_no = walking_env.base_line_no
-            if line_no == -1:
-                raise AssertionError("base_line_no of an environment should not be -1 unless it is the root environment")
-            new._add_points(line_no, arg_no, [point])
-            walking_env = walking_env.parent
+        new._add_to_callstack(walking_env, arg_no, flat_pixel(*point))
+    
+    @Producer
+    def add_dot(old, new, line_no, walking_env, x, y):
+        """
+        the ghosts of a Set [x y]: the dot and its dimension lines on
+        line_no, and the dot on every line of the callstack
+        """
+        pixel = flat_pixel(x, y)
+        new._add(line_no, 0, pixel)
+        new._add(line_no, 1, ('horizontal', x, y))
+        new._add(line_no, 2, ('vertical', x, y))
+        new._add_to_callstack(walking_env, 0, pixel)
+    
+    @Producer
+    def add_line(old, new, line_no, walking_env, ends, points):
+        """
+        the ghosts of a Line: the dimension lines of its ends on line_no,
+        and its points (a pair of arrays) on every line of the callstack
+        """
+        blX, blY, trX, trY = ends
+        new._add(line_no, 1, ('horizontal', blX, blY))
+        new._add(line_no, 2, ('vertical', blX, blY))
+        new._add(line_no, 3, ('horizontal', trX, trY))
+        new._add(line_no, 4, ('vertical', trX, trY))
+        new._add_to_callstack(walking_env, 0, flat_pixels(*points))
+
+
+NO_PIXELS = numpy.zeros(0, numpy.int16)
+NO_PIXELS.setflags(write=False)
+
+def flat_pixel(x, y):
+    """
+    returns the flat index y * 101 + x of a pixel, or NO_PIXELS if it is outside the image
+    """
+    if 0 <= x <= 100 and 0 <= y <= 100:
+        return int(y * DBNImage.SIZE + x)
+    return NO_PIXELS
+
+
+def flat_pixels(xs, ys):
+    """
+    returns an int16 array of the flat indexes of the pixels inside the image
+    """
+    inside = (xs >= 0) & (xs <= 100) & (ys >= 0) & (ys <= 100)
+    return (ys[inside] * DBNImage.SIZE + xs[inside]).astype(numpy.int16)
         
 
-class DBNImage():
+class DBNImage(object):
     """
-    Primitive wrapper around pil image
-    
+    Persistent wrapper around a pil image
+
     in PIL represention, not DBN (255, upper left origin, etc)
+
+    the pixels live in square numpy uint8 tiles of TILE_SIZE. a copy shares
+    every tile with the image it came from, and a write only copies the
+    tiles it touches, so a long chain of states costs memory in proportion
+    to the pixels that changed, not to the number of states.
+    the PIL image is only built (and then cached) when someone asks for _image
+
+    a mutable image is written in place, it copies a shared tile only
+    the first time it writes to it
     """
-    def __init__(self, color=255, new=True, mode='L'):
+    SIZE = 101
+    TILE_SIZE = 16
+    # by every image together, for the profiler
+    pixels_written = 0
+    TILES_ACROSS = (SIZE + TILE_SIZE - 1) // TILE_SIZE
+
+    def __init__(self, color=255, new=True, mode='L', mutable=False):
+        self.mode = mode
+        self.mutable = mutable
+        self._pil_image = None
+        self._owned = set() if mutable else None  # tiles a mutable image has already copied
         if new:
-            self._image = Image.new(mode, (101, 101), color)
-            self._image_array = self._image.load()
-        
+            blank_tile = numpy.empty((self.TILE_SIZE, self.TILE_SIZE), numpy.uint8)
+            blank_tile.fill(self._normalize(color))
+            # every tile can share the one blank tile, nobody writes to it in place
+            self._tiles = [blank_tile] * (self.TILES_ACROSS * self.TILES_ACROSS)
+
     def __copy__(self):
-         new = DBNImage(new=False)
-         new._image = self._image.copy()
-         new._image_array = new._image.load()
-         return new
-    
+        new = DBNImage(new=False, mode=self.mode)
+        new._tiles = list(self._tiles)
+        if self.mutable:
+            # the copy shares our tiles now, so we must not write into them
+            self._owned = set()
+        return new
+
+    def _normalize(self, value):
+        if self.mode == '1':
+            return 255 if value else 0
+        return value
+
+    def as_array(self):
+        """
+        returns a new SIZE x SIZE uint8 array of the pixels, indexed [y, x]
+        """
+        tile_size, across = self.TILE_SIZE, self.TILES_ACROSS
+        pixels = numpy.empty((across * tile_size, across * tile_size), numpy.uint8)
+        for index, tile in enumerate(self._tiles):
+            tile_row, tile_column = divmod(index, across)
+            pixels[tile_row * tile_size:(tile_row + 1) * tile_size,
+                   tile_column * tile_size:(tile_column + 1) * tile_size] = tile
+        return numpy.ascontiguousarray(pixels[:self.SIZE, :self.SIZE])
+
+    def _get_image(self):
+        if self._pil_image is None:
+            image = Image.fromarray(self.as_array(), 'L')
+            if self.mode == '1':
+                image = image.convert('1', dither=Image.NONE)
+            self._pil_image = image
+        return self._pil_image
+    _image = property(_get_image)
+
     def query_pixel(self, x, y):
-        return self._image_array[x, y]
-    
+        # negative indices wrap around, the same way PIL pixel access does
+        if not -self.SIZE <= x < self.SIZE or not -self.SIZE <= y < self.SIZE:
+            raise IndexError("image index out of range")
+        tile_row, tile_y = divmod(y % self.SIZE, self.TILE_SIZE)
+        tile_column, tile_x = divmod(x % self.SIZE, self.TILE_SIZE)
+        tile = self._tiles[tile_row * self.TILES_ACROSS + tile_column]
+        return int(tile[tile_y, tile_x])
+
+    def __writable_tile(self, index, copied):
+        """
+        returns the tile at index, copying it first unless it has been
+        copied already (copied is the set of those)
+        """
+        if index not in copied:
+            self._tiles[index] = self._tiles[index].copy()
+            copied.add(index)
+        return self._tiles[index]
+
+    def __copied_tiles(self):
+        if self.mutable:
+            self._pil_image = None
+            return self._owned
+        # only ever called on a fresh copy, which doesn't own anything yet
+        return set()
+
     def __set_pixel(self, x, y, value):
         if not 0 <= x <= 100:
-            return False
-        
+            return
+
         if not 0 <= y <= 100:
-            return False
-        
-        self._image_array[x, y] = value
-        return True
-    
+            return
+
+        DBNImage.pixels_written += 1
+        tile_row, tile_y = divmod(y, self.TILE_SIZE)
+        tile_column, tile_x = divmod(x, self.TILE_SIZE)
+        tile = self.__writable_tile(tile_row * self.TILES_ACROSS + tile_column, self.__copied_tiles())
+        tile[tile_y, tile_x] = self._normalize(value)
+
+    def __set_pixel_arrays(self, xs, ys, values):
+        """
+        xs and ys are integer arrays, values is an array or a single value.
+        pixels outside the image are skipped, and when a pixel is written
+        more than once the last write wins
+        """
+        xs = numpy.asarray(xs)
+        ys = numpy.asarray(ys)
+        several_values = numpy.ndim(values) > 0
+        if several_values:
+            values = numpy.asarray(values)
+        if self.mode == '1':
+            values = numpy.where(values, 255, 0) if several_values else self._normalize(values)
+
+        inside = (xs >= 0) & (xs <= 100) & (ys >= 0) & (ys <= 100)
+        if not inside.all():
+            xs, ys = xs[inside], ys[inside]
+            if several_values:
+                values = values[inside]
+        if not len(xs):
+            return
+        DBNImage.pixels_written += len(xs)
+
+        if several_values and len(xs) > 1:
+            # keep only the last write of each pixel
+            flat = ys * self.SIZE + xs
+            _, last = numpy.unique(flat[::-1], return_index=True)
+            keep = len(flat) - 1 - last
+            xs, ys, values = xs[keep], ys[keep], values[keep]
+
+        tile_size = self.TILE_SIZE
+        tile_ids = (ys // tile_size) * self.TILES_ACROSS + xs // tile_size
+        copied = self.__copied_tiles()
+        if tile_ids.min() == tile_ids.max():
+            tile = self.__writable_tile(int(tile_ids[0]), copied)
+            tile[ys % tile_size, xs % tile_size] = values
+            return
+
+        # group the writes by tile, keeping their order within each tile
+        order = numpy.argsort(tile_ids, kind='mergesort')
+        tile_ids, xs, ys = tile_ids[order], xs[order] % tile_size, ys[order] % tile_size
+        if several_values:
+            values = values[order]
+        bounds = numpy.flatnonzero(numpy.diff(tile_ids)) + 1
+        starts = [0] + bounds.tolist()
+        ends = bounds.tolist() + [len(tile_ids)]
+        for start, end in zip(starts, ends):
+            tile = self.__writable_tile(int(tile_ids[start]), copied)
+            tile[ys[start:end], xs[start:end]] = values[start:end] if several_values else values
+
     @Producer
     def set_pixel(old, new, x, y, value):
         new.__set_pixel(x, y, value)
         return new
-        
+
     @Producer
-    def set_pixels(old, new, pixel_iterator):
-        for x, y, value in pixel_iterator:
-            new.__set_pixel(x, y, value)
+    def set_pixels(old, new, pixels, ys=None, values=None):
+        """
+        either set_pixels(iterable of (x, y, value)),
+        or set_pixels(xs, ys, values) with arrays of coordinates and an
+        array of values (or one value for all of them)
+        """
+        if ys is None:
+            pixels = list(pixels)
+            if not pixels:
+                return new
+            xs, ys, values = numpy.array(pixels, dtype=int).T
+            if values.min() == values.max():
+                values = values[0]
+        else:
+            xs = pixels
+        new.__set_pixel_arrays(xs, ys, values)
         return new
 
 import builtins
\ No newline at end of file
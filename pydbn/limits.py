@@ -0,0 +1,117 @@
+"""
+limits on a run of the tree engine, for workers that can't let one
+script run forever or eat all the memory
+
+a state made with DBNLimits carries them (every state after it shares
+the same DBNLimits), and blocks check them before each statement, and
+Repeats before each time around (a batched Repeat takes all its steps at
+once, and runs as usual if they don't fit). checking only counts a step, the rest
+is done every CHECK_EVERY steps: the clock, the memory, the number of
+states, and whether someone called cancel (from another thread, say).
+so those can go a little over before they're caught
+
+a run that hits one raises DBNLimitExceeded, with the state it had got to
+"""
+import resource
+import sys
+import time
+
+CHECK_EVERY = 256
+
+
+def memory_used():
+    """
+    how much memory this process has now, in bytes. without /proc to ask,
+    the most it has ever had
+    """
+    try:
+        pages = int(open('/proc/self/statm').read().split()[1])
+        return pages * resource.getpagesize()
+    except (IOError, ValueError, IndexError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak  # already bytes there
+    return peak * 1024
+
+
+class DBNLimitExceeded(Exception):
+    """
+    limit is the one that was hit: steps, seconds, states, bytes or
+    cancelled. state is the state the run had got to, and line_no its line
+    """
+
+    def __init__(self, limit, state, message):
+        Exception.__init__(self, "%s at line %d" % (message, state.line_no))
+        self.limit = limit
+        self.state = state
+        self.line_no = state.line_no
+
+
+class DBNLimits(object):
+    """
+    steps is how many statements and Repeat iterations a run can take,
+    seconds how long it can take, states how many states it can make
+    (with a history), and bytes how much more memory the process can
+    use than it had when the run started. None is no limit
+
+    start (dbn.run_script_text calls it) starts the clock again
+    """
+
+    def __init__(self, steps=None, seconds=None, states=None, bytes=None):
+        self.steps = steps
+        self.seconds = seconds
+        self.states = states
+        self.bytes = bytes
+        self.cancelled = False
+        self.start()
+
+    def start(self):
+        self.taken = 0
+        self.next_check = CHECK_EVERY
+        if self.steps is not None:
+            self.next_check = min(self.next_check, self.steps + 1)
+        self.deadline = None if self.seconds is None else time.time() + self.seconds
+        self.memory_limit = None if self.bytes is None else memory_used() + self.bytes
+
+    def cancel(self):
+        """
+        stops the run at its next full check. safe to call from any thread
+        """
+        self.cancelled = True
+
+    def check(self, state):
+        self.taken += 1
+        if self.taken >= self.next_check:
+            self.check_all(state)
+
+    def fits(self, steps):
+        """
+        whether there are steps more steps left
+        """
+        return self.steps is None or self.taken + steps <= self.steps
+
+    def charge(self, steps, state):
+        """
+        takes steps at once, for something that did that many steps' work
+        without checking (a batch.DBNBatch)
+        """
+        self.taken += steps
+        if self.taken >= self.next_check:
+            self.check_all(state)
+
+    def check_all(self, state):
+        if self.cancelled:
+            raise DBNLimitExceeded('cancelled', state, "Cancelled")
+        if self.steps is not None and self.taken > self.steps:
+            raise DBNLimitExceeded('steps', state, "Used up the %d steps" % self.steps)
+        if self.states is not None and state.step >= self.states:
+            raise DBNLimitExceeded('states', state, "Made %d states" % state.step)
+        if self.deadline is not None and time.time() > self.deadline:
+            raise DBNLimitExceeded('seconds', state, "Ran out of the %g seconds" % self.seconds)
+        if self.memory_limit is not None and memory_used() > self.memory_limit:
+            raise DBNLimitExceeded('bytes', state, "Used more than %d more bytes" % self.bytes)
+
+        self.next_check = self.taken + CHECK_EVERY
+        if self.steps is not None:
+            self.next_check = min(self.next_check, self.steps + 1)
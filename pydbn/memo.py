@@ -0,0 +1,213 @@
+"""
+memoized Commands, for the tree engine on states without a history
+
+a Command is pure when all it does is draw: its body never reads a
+pixel, defines a Command or calls Paper or Pen, and the Commands it
+calls are pure too. (Set always writes the innermost frame, so a body
+can't change its callers' variables anyway.) what a call draws then
+only depends on its arguments, the pen color, the other variables the
+body reads (from its callers, scoping is dynamic) and which procedures
+its own calls find. the first call with each of those runs as usual,
+with a DBNPixelRecorder standing in for the image, and later ones just
+write the recorded pixels again
+"""
+import numpy
+
+import builtins
+from dbnstate import RECURSION_LIMIT
+
+# recordings kept per Command, later ones just run
+MAX_ENTRIES = 1024
+
+
+def body_footprint(node):
+    """
+    (slots of the variables read, names of Commands called) of a Command
+    body, or None if it isn't pure
+    """
+    slots, commands = set(), []
+    def statements(node):
+        if node.type == 'block':
+            for child in node.children:
+                if not statements(child):
+                    return False
+            return True
+        if node.type == 'set':
+            lvalue, rvalue = node.children
+            if lvalue.type == 'bracket' and not (expression(lvalue.children[0]) and expression(lvalue.children[1])):
+                return False
+            return expression(rvalue)
+        if node.type == 'repeat':
+            return expression(node.children[1]) and expression(node.children[2]) and statements(node.children[3])
+        if node.type == 'question':
+            return expression(node.children[0]) and expression(node.children[1]) and statements(node.children[2])
+        if node.type == 'command':
+            if node.name not in commands:
+                commands.append(node.name)
+            return all(expression(child) for child in node.children)
+        return False  # Command definitions, python nodes
+
+    def expression(node):
+        if node.type == 'number':
+            return True
+        if node.type == 'word':
+            slots.add(node.slot)
+            return True
+        if node.type in ('operation', 'hoisted'):
+            return all(expression(child) for child in node.children)
+        return False  # pixel reads
+
+    if not statements(node):
+        return None
+    return slots, commands
+
+
+class DBNPixelRecorder(object):
+    """
+    the image while a pure Command is recorded: keeps the pixels written
+    to it, in order (set_pixels takes care of the last write winning)
+    """
+    mutable = True
+
+    def __init__(self):
+        self.writes = []
+
+    def set_pixel(self, x, y, value):
+        if 0 <= x <= 100 and 0 <= y <= 100:
+            self.writes.append(([x], [y], [value]))
+        return self
+
+    def set_pixels(self, pixels, ys=None, values=None):
+        if ys is None:
+            pixels = list(pixels)
+            if not pixels:
+                return self
+            xs, ys, values = numpy.array(pixels, dtype=int).T
+        else:
+            xs = pixels
+        xs, ys = numpy.asarray(xs), numpy.asarray(ys)
+        if numpy.ndim(values) == 0:
+            values = numpy.repeat(values, len(xs))
+        self.writes.append((xs, ys, numpy.asarray(values)))
+        return self
+
+    def pixels(self):
+        """
+        (xs, ys, values) of everything written
+        """
+        if not self.writes:
+            return numpy.zeros(0, int), numpy.zeros(0, int), numpy.zeros(0, int)
+        return tuple(numpy.concatenate([write[index] for write in self.writes]) for index in range(3))
+
+
+class DBNCommandMemo(object):
+    """
+    the recordings of one Command definition (every procedure it defines
+    shares them), and how often calls found one: hits and misses. calls
+    that had to run as usual, because something they call isn't pure,
+    aren't either
+    """
+
+    def __init__(self, definition):
+        self.name = definition.children[0].name
+        formals = set(word.slot for word in definition.children[1:-1])
+        footprint = body_footprint(definition.children[-1])
+        self.pure = footprint is not None
+        if self.pure:
+            slots, self.commands = footprint
+            self.slots = frozenset(slots - formals)
+            self.formal_slots = frozenset(formals)
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_hit_rate(self):
+        calls = self.hits + self.misses
+        return calls and float(self.hits) / calls
+    hit_rate = property(get_hit_rate)
+
+    def footprint(self, state, seen=()):
+        """
+        what a call from state depends on besides its arguments and the
+        pen color: (the slots it reads from its callers, the procedures
+        its calls find, how many frames deep it goes), or None if one of
+        those procedures isn't pure
+        """
+        slots = self.slots
+        procs = ()
+        depth = 1
+        seen = seen + (self,)
+        for name in self.commands:
+            proc = state.lookup_command(name)
+            if proc is builtins.BUILTIN_PROCS['Line']:
+                depth = max(depth, 2)
+                continue
+            memo = proc and proc.memo
+            if memo is None or not memo.pure or memo in seen:
+                return None
+            found = memo.footprint(state, seen)
+            if found is None:
+                return None
+            callee_slots, callee_procs, callee_depth = found
+            slots = slots | (callee_slots - self.formal_slots)
+            procs += callee_procs + (proc,)
+            depth = max(depth, callee_depth + 1)
+        return slots, procs, depth
+
+    def apply(self, proc, args, state):
+        """
+        returns the state after calling proc (one of this definition's)
+        with args, or None if it has to run as usual. state has to be mutable
+        """
+        footprint = self.footprint(state)
+        if footprint is None:
+            return None
+        slots, procs, depth = footprint
+        if state.stack_depth + depth > RECURSION_LIMIT:
+            return None  # leave the error to the call
+
+        key = (tuple(args), state.pen_color, tuple([state.lookup_slot(slot) for slot in sorted(slots)]), procs)
+        entry = self.cache.get(key)
+        limits = state.limits
+        # one recorded without limits doesn't know its steps, so it's recorded again
+        if entry is not None and (limits is None or entry[4] is not None):
+            xs, ys, values, line_no, steps = entry
+            if limits is not None:
+                if not limits.fits(steps):
+                    return None  # so the call stops at the same step it would have
+                limits.charge(steps, state)
+            self.hits += 1
+            if len(xs):
+                state.image = state.image.set_pixels(xs, ys, values)
+            return state.set_line_no(line_no)
+
+        self.misses += 1
+        entry = self.record(proc, args, state)
+        if key in self.cache or len(self.cache) < MAX_ENTRIES:
+            self.cache[key] = entry
+        return state
+
+    def record(self, proc, args, state):
+        """
+        runs the call as usual and returns (xs, ys, values, line_no, steps)
+        of what it did. steps is how many steps (see limits.py) it took,
+        None without limits
+        """
+        limits = state.limits
+        taken = limits and limits.taken
+        image = state.image
+        recorder = DBNPixelRecorder()
+        state.image = recorder
+        try:
+            state.push()
+            state.set_arguments(proc.formal_slots, args)
+            proc.body.apply(state)
+            state.pop()
+        finally:
+            # the pixels go on the image even when the body fails, like they would have
+            xs, ys, values = recorder.pixels()
+            state.image = image
+            if len(xs):
+                state.image = image.set_pixels(xs, ys, values)
+        steps = None if limits is None else limits.taken - taken
+        return xs, ys, values, state.line_no, steps
@@ -0,0 +1,207 @@
+"""
+an optimization pass over a parsed dbn ast, to run between
+DBNParser.parse and an engine
+
+arithmetic on numbers is folded into a single DBNNumberNode, which
+keeps the tokens and line_no of the operation it replaces (so the gui
+still finds its arguments where they are in the text), and Repeats
+whose start and end are numbers get their static_range.
+(number literals themselves are converted to ints when they are parsed)
+
+hoist is a second pass, for the tree engine: expressions in a Repeat body
+that come out the same on every time around are worked out once when the
+Repeat starts (see DBNHoistedNode). variables are dynamically scoped, but
+Set always writes the innermost frame, so a Command called from the body
+can't change the body's variables; only the body's own Sets and Repeat
+variables can. those are the names that make an expression vary
+
+batch, also for the tree engine, gives every Repeat nest that only draws
+a batch.DBNBatch, to run it all at once when there's no history to keep
+
+memoize, the same, gives every Command definition that only draws a
+memo.DBNCommandMemo, to replay what its calls drew the last time they
+were made the same way
+"""
+from dbnast import DBNNumberNode, DBNHoistedNode, OPERATIONS
+from batch import DBNBatch, batchable
+from memo import DBNCommandMemo
+
+
+class DBNOptimizer:
+    """
+    optimizes trees in place, children first
+
+    a node with an optimize_<type> method is replaced by what it returns
+    folded counts the operation nodes folded away, static_repeats the
+    Repeats found to have static ranges
+    """
+
+    def __init__(self):
+        self.folded = 0
+        self.static_repeats = 0
+        self.hoisted = 0
+        self.batched = 0
+        self.memos = []
+
+    def optimize(self, node):
+        for index, child in enumerate(node.children):
+            node.children[index] = self.optimize(child)
+
+        method = getattr(self, 'optimize_' + node.type, None)
+        if method is None:
+            return node
+        return method(node)
+
+    def optimize_operation(self, node):
+        left, right = node.children
+        if left.type != 'number' or right.type != 'number':
+            return node
+        if node.name == '/' and right.value == 0:
+            return node  # left to fail when it runs, like it would have
+
+        self.folded += 1
+        value = OPERATIONS[node.name](left.value, right.value)
+        return DBNNumberNode(
+            name=str(value),
+            tokens=node.tokens,
+            line_no=node.line_no,
+        )
+
+    def optimize_repeat(self, node):
+        var, start, end, body = node.children
+        if start.type == 'number' and end.type == 'number':
+            node.static_range = (start.value, end.value)
+            self.static_repeats += 1
+        return node
+
+    def hoist(self, block, repeats=()):
+        """
+        hoists the invariant expressions of every Repeat in block, in place
+
+        repeats are the Repeats around block in the same frame, outermost
+        first, each with the names its body can set. an expression goes to
+        the outermost one it doesn't depend on
+        """
+        for statement in block.children:
+            if statement.type == 'command_definition':
+                # the body gets a frame of its own when it runs
+                self.hoist(statement.children[-1])
+            elif statement.type == 'set':
+                lvalue = statement.children[0]
+                if lvalue.type == 'bracket':
+                    self.hoist_children(lvalue, [0, 1], repeats)
+                self.hoist_children(statement, [1], repeats)
+            elif statement.type == 'command':
+                self.hoist_children(statement, range(len(statement.children)), repeats)
+            elif statement.type == 'question':
+                self.hoist_children(statement, [0, 1], repeats)
+                self.hoist(statement.children[2], repeats)
+            elif statement.type == 'repeat':
+                self.hoist_children(statement, [1, 2], repeats)
+                inner = repeats + ((statement, assigned_names(statement)),)
+                self.hoist(statement.children[3], inner)
+        return block
+
+    def hoist_children(self, node, indexes, repeats):
+        for index in indexes:
+            node.children[index] = self.hoist_expression(node.children[index], repeats)
+
+    def hoist_expression(self, node, repeats):
+        """
+        returns node, or the DBNHoistedNode standing in for it
+        """
+        if node.type != 'operation':
+            if node.type == 'bracket':
+                self.hoist_children(node, [0, 1], repeats)
+            return node
+
+        names = expression_names(node)
+        if names is not None:
+            for repeat, assigned in repeats:
+                if not names & assigned:
+                    hoisted = DBNHoistedNode(children=[node], tokens=node.tokens, line_no=node.line_no)
+                    repeat.hoisted = repeat.hoisted + (hoisted,)
+                    self.hoisted += 1
+                    return hoisted
+
+        self.hoist_children(node, [0, 1], repeats)
+        return node
+
+    def batch(self, node):
+        """
+        gives every batchable Repeat in node its batch, in place
+        """
+        if node.type == 'repeat' and batchable(node):
+            node.batch = DBNBatch(node)
+            self.batched += 1
+        for child in node.children:
+            self.batch(child)
+        return node
+
+    def memoize(self, node):
+        """
+        gives every pure Command definition in node its memo, in place.
+        memos has them all, for their hits and misses
+        """
+        if node.type == 'command_definition':
+            memo = DBNCommandMemo(node)
+            if memo.pure:
+                node.memo = memo
+                self.memos.append(memo)
+        for child in node.children:
+            self.memoize(child)
+        return node
+
+    def memo_stats(self):
+        """
+        (hits, misses, hit rate) of all the memos together
+        """
+        hits = sum(memo.hits for memo in self.memos)
+        misses = sum(memo.misses for memo in self.memos)
+        return hits, misses, (hits + misses) and float(hits) / (hits + misses)
+
+
+def assigned_names(node):
+    """
+    the variable names a statement can set in its own frame
+    """
+    if node.type == 'set':
+        lvalue = node.children[0]
+        if lvalue.type == 'word':
+            return set([lvalue.name])
+        return set()
+
+    names = set()
+    if node.type == 'repeat':
+        names.add(node.children[0].name)
+        names.update(assigned_names(node.children[3]))
+    elif node.type == 'question':
+        names.update(assigned_names(node.children[2]))
+    elif node.type == 'block':
+        for child in node.children:
+            names.update(assigned_names(child))
+    return names
+
+
+def expression_names(node):
+    """
+    the variable names an expression reads, or None if it can't be
+    hoisted: it reads pixels, or divides by something that might be 0.
+    a hoisted expression is evaluated even when the code it came from
+    wouldn't have run, so it must not be able to fail
+    """
+    if node.type == 'number':
+        return set()
+    if node.type == 'word':
+        return set([node.name])
+    if node.type != 'operation':
+        return None
+
+    left, right = node.children
+    if node.name == '/' and (right.type != 'number' or right.value == 0):
+        return None
+    left_names = expression_names(left)
+    right_names = expression_names(right)
+    if left_names is None or right_names is None:
+        return None
+    return left_names | right_names
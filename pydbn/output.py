@@ -14,7 +14,21 @@ from structures import DBNStateWrapper
 import dbngui
 
 
-def animate_state(state, direction):
+def walk(state, direction):
+    """
+    state, then the states next (or previous) to it, one after the other
+    """
+    while state is not None:
+        yield state
+        state = getattr(state, direction, None)
+
+
+def animate_state(states):
+    """
+    draws states (any iterable, like stream.stream_states or walk) as
+    they come
+    """
+    states = iter(states)
     master = Tkinter.Tk()
 
     w = Tkinter.Canvas(master, width=302, height=302)
@@ -34,11 +48,14 @@ def animate_state(state, direction):
             w.itemconfigure(canvas_image, image=tkinter_image)
         w.tkinter_image = tkinter_image
         
-        if getattr(state, direction, None) is not None:
-            master.after(1, draw_state, getattr(state, direction, None), canvas_image)
+        state = next(states, None)
+        if state is not None:
+            master.after(1, draw_state, state, canvas_image)
 
 
-    master.after(10, draw_state, state, None)
+    state = next(states, None)
+    if state is not None:
+        master.after(10, draw_state, state, None)
     master.mainloop()
 
 
@@ -61,18 +78,17 @@ def draw_window(image, time=False):
     master.mainloop()
 
 
-def print_line_numbers(state):
+def print_line_numbers(states):
     """
-    will walk the state forward, printing when the line number
-    is new
+    will go through states (any iterable, like stream.stream_states or
+    walk), printing when the line number is new
     """
-    current = state
     last = -1
-    while current is not None:
-        if current.line_no != last:
-            print current.line_no
-            last = current.line_no
-        current = current.next
+    for state in states:
+        if state.line_no != last:
+            print state.line_no
+            sys.stdout.flush()
+            last = state.line_no
 
 def make_gif(state):
     
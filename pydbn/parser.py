@@ -1,10 +1,132 @@
 """
 a module that implements the parsing classes
+
+the parser walks one list of tokens by index. DBNTokenStream works out
+up front, in one pass, where every grouper closes and where the next
+NEWLINE and OPENBRACE are, so no token is scanned more than once, and
+nodes keep DBNTokenSpan views of the token list rather than copies.
+
+the parse_* functions take the stream and a [start, end) range of it
 """
 from dbnast import *
 from tokenizer import DBNToken
-          
-def parse_block(tokens, commands_allowed=False):
+from structures import DBNSlotted, DBNSymbolTable
+
+GROUPERS = {
+    'OPENPAREN': 'CLOSEPAREN',
+    'OPENBRACKET': 'CLOSEBRACKET',
+    'OPENBRACE': 'CLOSEBRACE',
+}
+
+
+class DBNTokenSpan(DBNSlotted):
+    """
+    a read only view of tokens[start:end]
+    """
+    __slots__ = ('_tokens', 'start', 'end')
+
+    def __init__(self, tokens, start, end):
+        self._tokens = tokens
+        self.start = start
+        self.end = end
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __iter__(self):
+        tokens = self._tokens
+        for index in xrange(self.start, self.end):
+            yield tokens[index]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("token span index out of range")
+        return self._tokens[self.start + index]
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+
+class DBNTokenStream(object):
+    """
+    a list of tokens, and where things are in it
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+
+        # index of an open grouper -> index of the token that closes it.
+        # each kind of grouper is balanced on its own
+        self.closes = {}
+        open_indexes = dict((open_type, []) for open_type in GROUPERS)
+        openers = dict((close_type, open_type) for open_type, close_type in GROUPERS.items())
+        for index, token in enumerate(tokens):
+            if token.type in open_indexes:
+                open_indexes[token.type].append(index)
+            elif token.type in openers:
+                waiting = open_indexes[openers[token.type]]
+                if waiting:
+                    self.closes[waiting.pop()] = index
+
+        # type -> list where [index] is the index of the next token of
+        # that type at or after index (len(tokens) if there isn't one)
+        self.next_of = {}
+        for token_type in ('NEWLINE', 'OPENBRACE'):
+            next_indexes = [len(tokens)] * (len(tokens) + 1)
+            for index in xrange(len(tokens) - 1, -1, -1):
+                if tokens[index].type == token_type:
+                    next_indexes[index] = index
+                else:
+                    next_indexes[index] = next_indexes[index + 1]
+            self.next_of[token_type] = next_indexes
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def span(self, start, end):
+        return DBNTokenSpan(self.tokens, start, end)
+
+    def find_next(self, token_type, start, end):
+        """
+        returns the index of the next token_type in [start, end), or end
+        """
+        if start >= end:
+            return end
+        return min(self.next_of[token_type][start], end)
+
+    def find_close(self, open_index, end):
+        """
+        returns the index of the token that closes the grouper
+        at open_index, or None if it doesn't close before end
+        """
+        close_index = self.closes.get(open_index)
+        if close_index is None or close_index >= end:
+            return None
+        return close_index
+
+    def find_body(self, start, end):
+        """
+        for Repeat, questions and Command: the arguments run from start
+        to the next OPENBRACE, and the body to its CLOSEBRACE
+        returns (args end, body start, body end, index after the statement)
+        """
+        open_index = self.find_next('OPENBRACE', start, end)
+        if open_index == end:
+            return end, end, end, end
+        close_index = self.find_close(open_index, end)
+        if close_index is None:
+            return open_index, open_index + 1, end, end
+        return open_index, open_index + 1, close_index, close_index + 1
+
+
+def parse_block(stream, start, end, commands_allowed=False):
     """
     parses a block of statements
     currently handles:
@@ -15,40 +137,40 @@ def parse_block(tokens, commands_allowed=False):
     Command (procedure) (if commands_allowed)
     word \implies command
     """    
+    tokens = stream.tokens
     block_nodes = []
-    all_tokens = tokens[:]
-    while tokens:
-        first_token = tokens.pop(0)
+    index = start
+    while index < end:
+        first_index = index
+        first_token = tokens[index]
+        index += 1
 
         next_node = None
         if first_token.type == 'SET':
-            set_tokens, _ = collect_until_next(tokens, 'NEWLINE')
-            set_token = first_token
-            next_node = parse_set(set_token, set_tokens)
+            args_end = stream.find_next('NEWLINE', index, end)
+            next_node = parse_set(stream, first_index, args_end)
+            index = args_end + 1
             
         elif first_token.type == 'REPEAT':
-            arg_tokens, open_brace_token = collect_until_next(tokens, 'OPENBRACE')
-            body_tokens, close_brace_token = collect_until_balanced(tokens, 'OPENBRACE', 'CLOSEBRACE')
-            repeat_token = first_token
-            next_node = parse_repeat(repeat_token, arg_tokens, open_brace_token, body_tokens, close_brace_token)
+            body = stream.find_body(index, end)
+            next_node = parse_repeat(stream, first_index, body)
+            index = body[-1]
             
         elif first_token.type == 'QUESTION':
-            arg_tokens, open_brace_token = collect_until_next(tokens, 'OPENBRACE')
-            body_tokens, close_brace_token = collect_until_balanced(tokens, 'OPENBRACE', 'CLOSEBRACE')
-            question_token = first_token
-            next_node = parse_question(question_token, arg_tokens, open_brace_token, body_tokens, close_brace_token)
+            body = stream.find_body(index, end)
+            next_node = parse_question(stream, first_index, body)
+            index = body[-1]
             
         elif first_token.type == 'COMMAND' and commands_allowed:
-            arg_tokens, open_brace_token = collect_until_next(tokens, 'OPENBRACE')
-            body_tokens, close_brace_token = collect_until_balanced(tokens, 'OPENBRACE', 'CLOSEBRACE')
-            command_token = first_token
-            next_node = parse_define_command(command_token, arg_tokens, open_brace_token, body_tokens, close_brace_token)
+            body = stream.find_body(index, end)
+            next_node = parse_define_command(stream, first_index, body)
+            index = body[-1]
         
         elif first_token.type == 'WORD':
             # then we treat it as a command :/
-            arg_tokens, _ = collect_until_next(tokens, 'NEWLINE')
-            command_token = first_token  
-            next_node = parse_command(command_token, arg_tokens)
+            args_end = stream.find_next('NEWLINE', index, end)
+            next_node = parse_command(stream, first_index, args_end)
+            index = args_end + 1
             
         elif first_token.type == 'NEWLINE':
             # then it is just an extra blank new line...
@@ -63,93 +185,103 @@ def parse_block(tokens, commands_allowed=False):
         
     return DBNBlockNode(
         children=block_nodes,
-        tokens=all_tokens,
+        tokens=stream.span(start, end),
     )
 
-def parse_command(command_token, arg_tokens):
+def parse_command(stream, start, end):
     """
     parses a command
     """
-    all_tokens = [command_token] + arg_tokens[:]
-    command_name = command_token.value
-    args = parse_args(arg_tokens)    
+    command_token = stream.tokens[start]
+    args = parse_args(stream, start + 1, end)
     return DBNCommandNode(
-        name=command_name,
+        name=command_token.value,
         children=args,
-        tokens=all_tokens,
+        tokens=stream.span(start, end),
         line_no=command_token.line_no
     )
     
-def parse_set(set_token, arg_tokens):
+def parse_set(stream, start, end):
     """
     parses a Set
     """
-    all_tokens = [set_token] + arg_tokens[:]
-    args = parse_args(arg_tokens)
+    set_token = stream.tokens[start]
+    args = parse_args(stream, start + 1, end)
     valid, error = assert_args(args, length=2, match=((DBNBracketNode, DBNWordNode), ) )
     if not valid:
         raise ValueError("Bad arguments parsing Set: %s" % error)
     
     return DBNSetNode(
         children=args,
-        tokens=all_tokens,
+        tokens=stream.span(start, end),
         line_no=set_token.line_no,
     )
+
+def strip_newline(stream, start, end):
+    """
+    returns end, less the last token if it is a NEWLINE
+    """
+    if end > start and stream.tokens[end - 1].type == 'NEWLINE':
+        return end - 1
+    return end
             
-def parse_repeat(repeat_token, arg_tokens, open_brace_token, body_tokens, close_brace_token):
+def parse_repeat(stream, start, body):
     """
     parses a Repeat
+    body is what stream.find_body returned
     """
-    all_tokens = [repeat_token] + arg_tokens[:] + [open_brace_token] + body_tokens[:] + [close_brace_token]
-    strip_newline(arg_tokens) # newline between args and bracket is optional
-
-    args = parse_args(arg_tokens)
+    args_end, body_start, body_end, end = body
+    repeat_token = stream.tokens[start]
+    # newline between args and bracket is optional
+    args = parse_args(stream, start + 1, strip_newline(stream, start + 1, args_end))
     valid, error = assert_args(args, length=3, match=(DBNWordNode, ))
     if not valid:
         raise ValueError("bad arguments while parsing Repeat: %s" % error)
         
-    body = parse_block(body_tokens)
-    var, start, end = args
+    body = parse_block(stream, body_start, body_end)
+    var, start_arg, end_arg = args
     return DBNRepeatNode(
-        children=[var, start, end, body],
-        tokens=all_tokens,
+        children=[var, start_arg, end_arg, body],
+        tokens=stream.span(start, end),
         line_no=repeat_token.line_no,
     )
     
-def parse_question(question_token, arg_tokens, open_brace_token, body_tokens, close_brace_token):
+def parse_question(stream, start, body):
     """
     parses a question!
     """
-    all_tokens = [question_token] + arg_tokens[:] + [open_brace_token] + body_tokens[:] + [close_brace_token]
+    args_end, body_start, body_end, end = body
+    question_token = stream.tokens[start]
     question_name = question_token.value
-    strip_newline(arg_tokens)
     
-    args = parse_args(arg_tokens)
+    args = parse_args(stream, start + 1, strip_newline(stream, start + 1, args_end))
     valid, error = assert_args(args, length=2)
     if not valid:
-        raise ValueError("bad arguments while parsing question %s: " % (question_name, error))
+        raise ValueError("bad arguments while parsing question %s: %s" % (question_name, error))
         
-    body = parse_block(body_tokens)
+    body = parse_block(stream, body_start, body_end)
     lvalue, rvalue = args
     return DBNQuestionNode(
         name=question_name,
         children=[lvalue, rvalue, body],
-        tokens=all_tokens,
+        tokens=stream.span(start, end),
         line_no=question_token.line_no,
     )
 
-def parse_define_command(command_token, arg_tokens, open_brace_token, body_tokens, close_brace_token):
+def parse_define_command(stream, start, body):
     """
     parses a command definition!
     """
-    all_tokens = [command_token] + arg_tokens[:] + [open_brace_token] + body_tokens[:] + [close_brace_token]
+    args_end, body_start, body_end, end = body
+    command_token = stream.tokens[start]
     # arg tokens MUST ALL BE WORDS. so we can bypass the normal parsing route.    
     args = []
-    for index, arg_token in enumerate(arg_tokens):
+    for index in xrange(start + 1, args_end):
+        arg_token = stream.tokens[index]
         if not arg_token.type == 'WORD':
             raise ValueError(
                 "Every argument to Command must be a WORD. arg %d is a %s" %
-                (index, arg_token.type)
+                (index - start - 1, arg_token.type)
             )
         args.append(parse_word(arg_token))
         
@@ -157,172 +289,177 @@ def parse_define_command(command_token, arg_tokens, open_brace_token, body_token
     if not args:
         raise ValueError("There must be at least one argument to Command!")
     
-    body = parse_block(body_tokens)
+    body = parse_block(stream, body_start, body_end)
     args.append(body)
     return DBNCommandDefinitionNode(
         children=args,
-        tokens=all_tokens,
+        tokens=stream.span(start, end),
         line_no=command_token.line_no,
     )
     
-def parse_bracket(open_bracket_token, content_tokens, close_bracket_token):
+def parse_bracket(stream, open_index, content_end, end):
     """
-    ok, so tokens is everything in the brackets
+    the bracket's contents run from after open_index to content_end
 
-    pretty simple... call parse args on tokens, then make sure that
+    pretty simple... call parse args on the contents, then make sure that
     there are only two, then store left, right
     """
-    all_tokens = [open_bracket_token] + list(content_tokens) + [close_bracket_token]
-    args = parse_args(content_tokens)
+    args = parse_args(stream, open_index + 1, content_end)
     valid, error = assert_args(args, length=2)
     if not valid:
         raise ValueError("Bad bracket contents: %s" % error)
     
     return DBNBracketNode(
         children=args,
-        tokens=all_tokens,
+        tokens=stream.span(open_index, end),
     )
+
+def parse_grouper(stream, open_index, end, parse_function):
+    """
+    parses the grouper at open_index with parse_function,
+    returns (node, index after the grouper)
+    """
+    close_index = stream.find_close(open_index, end)
+    if close_index is None:
+        # never closed, so it takes everything up to end
+        return parse_function(stream, open_index, end, end), end
+    return parse_function(stream, open_index, close_index, close_index + 1), close_index + 1
     
-def parse_args(tokens):
+def parse_args(stream, start, end):
     """
-    tokens is a series of tokens that represents some arguments
+    [start, end) is a series of tokens that represents some arguments
     4 5 6
     a b c
     a [...] (...)
     
     returns a list of arguments
     """ 
+    tokens = stream.tokens
     arg_list = []
-    while tokens:
-        first_token = tokens.pop(0)
+    index = start
+    while index < end:
+        first_token = tokens[index]
         
         # i know how to handle NUMBER, WORD, OPENPAREN and OPENBRACKET
         if first_token.type == 'NUMBER':
             arg_list.append(parse_number(first_token))
+            index += 1
         
         elif first_token.type == 'WORD':
             arg_list.append(parse_word(first_token))
+            index += 1
             
         elif first_token.type == 'OPENPAREN':
-            arithmetic_tokens, close_paren_token = collect_until_balanced(tokens, 'OPENPAREN', 'CLOSEPAREN')
-            open_paren_token = first_token
-            arg_list.append(parse_arithmetic(open_paren_token, arithmetic_tokens, close_paren_token))
+            node, index = parse_grouper(stream, index, end, parse_arithmetic)
+            arg_list.append(node)
         
         elif first_token.type == 'OPENBRACKET':
-            bracket_tokens, close_bracket_token = collect_until_balanced(tokens, 'OPENBRACKET', 'CLOSEBRACKET')
-            open_bracket_token = first_token
-            arg_list.append(parse_bracket(open_bracket_token, bracket_tokens, close_bracket_token))
+            node, index = parse_grouper(stream, index, end, parse_bracket)
+            arg_list.append(node)
             
         else:
             raise ValueError("I don't know how to handle token type %s while parsing args!" % first_token.type)
             
     return arg_list
     
-def parse_arithmetic(open_paren_token, tokens, close_paren_token):
+# how tightly each operation binds. operations of the same
+# power are grouped left to right
+BINDING_POWER = {
+    '*': 2,
+    '/': 2,
+    '+': 1,
+    '-': 1,
+}
+
+def parse_arithmetic(stream, open_index, content_end, end):
     """
-    mega function to parse a set of tokens representing 'arithmatic'
-    
-    so algorithm:
-    we walk down to precedence levels, looking for things.
-    if we find one, look for its left,
-    and its right, combine them!
+    parses the arithmetic between the parens at open_index and content_end
     
-    would love to make this recrusive to match the rest of how I parse.
-    but. I'd also love to be an astronaut
+    the operands (and operations) are collected in one pass, then
+    parse_operation climbs the precedence levels over them, so
+    * and / come before + and -, and 10 - 2 - 3 is (10 - 2) - 3
     """
-    PRECEDENCE = ['*', '/', '-', '+'] # ok?
+    tokens = stream.tokens
     
-    # first build a list of nodes, separated by operation tokens
-    nodes_and_ops = []
-    while tokens:
-        first_token = tokens.pop(0)
+    # a list of (node, start index, end index) for operands and
+    # (token, index, index + 1) for operations
+    items = []
+    index = open_index + 1
+    while index < content_end:
+        first_token = tokens[index]
         if first_token.type == 'WORD':
-            nodes_and_ops.append(parse_word(first_token))
+            items.append((parse_word(first_token), index, index + 1))
+            index += 1
         
         elif first_token.type == 'NUMBER':
-            nodes_and_ops.append(parse_number(first_token))
+            items.append((parse_number(first_token), index, index + 1))
+            index += 1
         
         elif first_token.type == 'OPENPAREN':
-            arithmetic_tokens, close_paren_token = collect_until_balanced(tokens, 'OPENPAREN', 'CLOSEPAREN')
-            open_paren_token = first_token
-            nodes_and_ops.append(parse_arithmetic(open_paren_token, arithmetic_tokens, close_paren_token))
+            node, next_index = parse_grouper(stream, index, content_end, parse_arithmetic)
+            items.append((node, index, next_index))
+            index = next_index
         
         elif first_token.type == 'OPENBRACKET':
-            bracket_tokens, close_bracket_token = collect_until_balanced(tokens, 'OPENBRACKET', 'CLOSEBRACKET')
-            open_bracket_token = first_token
-            nodes_and_ops.append(parse_bracket(open_bracket_token, bracket_tokens, close_bracket_token))
+            node, next_index = parse_grouper(stream, index, content_end, parse_bracket)
+            items.append((node, index, next_index))
+            index = next_index
             
-        elif first_token.type == 'OPERATOR':
-            nodes_and_ops.append(first_token)
+        else:
+            if first_token.type == 'OPERATOR':
+                items.append((first_token, index, index + 1))
+            index += 1
+    
+    if not items:
+        raise ValueError("There is nothing in the parentheses at %d:%d" % (tokens[open_index].line_no, tokens[open_index].char_no))
     
-    # now we take multiple passes over that list, reducing
-    # it by making binary operations, until it only has one
-    # root binary operation node
-    while len(nodes_and_ops) > 1:
-        #look down the operator precedence chain
-        #find a location where that operator occurs
-        active_operation = None
-        active_index = None  # of the nodes_and_ops list
-        for operation in PRECEDENCE:
-            active_operation = operation
-            found = False
-            for index, node_or_op in enumerate(nodes_and_ops):
-                if isinstance(node_or_op, DBNToken):
-                    if node_or_op.value == active_operation:
-                        found = True
-                        active_index = index
-            if found:
-                break
-                
-        # so now we now where we have to do our thing
-        # active index is the index in node_or_op where
-        # the operation that we are going to compress is found
-        left_index = active_index - 1
-        right_index = active_index + 1
+    final_op, _, _, index = parse_operation(stream, items, 0, 1)
+    if index < len(items):
+        # parse_operation only stops early before an operand
+        node, start, _ = items[index]
+        raise ValueError("There is no operation before the node at %d:%d" % (tokens[start].line_no, tokens[start].char_no))
+    
+    # the parens belong to it too
+    final_op.tokens = stream.span(open_index, end)
+    return final_op
+
+def parse_operation(stream, items, index, min_power):
+    """
+    parses items from index into one node, combining operations that
+    bind at least as tightly as min_power
+    returns (node, start, end, index of the first item not used)
+    """
+    left, start, stop = items[index]
+    if isinstance(left, DBNToken):
+        raise ValueError("There is no node! to the left of the %s operation" % left.value)
+    index += 1
+    
+    while index < len(items):
+        operation = items[index][0]
+        if not isinstance(operation, DBNToken):
+            break
+        if operation.value not in BINDING_POWER:
+            raise ValueError("Unknown operation %s at %d:%d" % (operation.value, operation.line_no, operation.char_no))
+        power = BINDING_POWER[operation.value]
+        if power < min_power:
+            break
         
-        # some structural validation...
-        try:
-            left_node = nodes_and_ops[left_index]
-        except IndexError:
-            raise ValueError("There is no node! to the left of the %s operation" % active_operation)
-            
-        try:
-            right_node = nodes_and_ops[right_index]
-        except IndexError:
-            raise ValueError("There is no node! to the right of the %s operation" % active_operation)
+        index += 1
+        if index == len(items):
+            raise ValueError("There is no node! to the right of the %s operation" % operation.value)
+        if isinstance(items[index][0], DBNToken):
+            raise ValueError("The node to the right is not a node, but a string! %s" % items[index][0])
         
-        # some semanitc? validation...
-        if isinstance(left_node, DBNToken):
-            raise ValueError("The node to the left is not a node, but a string! %s" % left_node)
-            
-        if isinstance(right_node, DBNToken):
-            raise ValueError("The node to the right is not a node, but a string! %s" % right_node)
-            
-        # ok but here, we know that they are both nodes (and they both exist!)
-        all_tokens = left_node.tokens + [nodes_and_ops[active_index]] + right_node.tokens
-        new_node = DBNBinaryOpNode(
-            name=active_operation,
-            children=[left_node, right_node],
-            tokens=all_tokens,
+        # the right side only takes operations that bind tighter,
+        # which makes this one left associative
+        right, _, stop, index = parse_operation(stream, items, index, power + 1)
+        left = DBNBinaryOpNode(
+            name=operation.value,
+            children=[left, right],
+            tokens=stream.span(start, stop),
         )
-        
-        new_nodes_and_ops = []
-        for index, node_or_op in enumerate(nodes_and_ops):
-            if index == left_index:
-                pass
-            elif index == right_index:
-                pass
-            elif index == active_index:
-                new_nodes_and_ops.append(new_node)
-            else:
-                new_nodes_and_ops.append(node_or_op)
-                
-        nodes_and_ops = new_nodes_and_ops
-
-    final_op = nodes_and_ops[0] # a DBNBinaryOpNode
-    # adding the close parents
-    final_op.tokens = [open_paren_token] + final_op.tokens + [close_paren_token]
-    return final_op
+    
+    return left, start, stop, index
                             
 def parse_word(token):
     """
@@ -355,12 +492,13 @@ def parse_ghost_line(tokens):
     if not tokens:
         return None
     
+    stream = DBNTokenStream(tokens)
     first_token = tokens[0]
     if first_token.type == 'WORD':
-        return parse_args(tokens)
+        return parse_args(stream, 0, len(tokens))
         
     elif first_token.type == 'SET':
-        args = parse_args(tokens[1:])
+        args = parse_args(stream, 1, len(tokens))
         if not args:
             return None
         
@@ -370,51 +508,6 @@ def parse_ghost_line(tokens):
         # no idea whats going on here \\\
         return [DBNWordNode(children=[first_token.value], tokens=[first_token]), first_arg.left_child(), first_arg.right_child()] + args[1:]
 
-def collect_until_next(tokens, token_type):
-    """
-    will return a list of tokens unit the next
-    one of type token_type or the end of the list
-    
-    throws away the terminating token of type token_type
-    """
-    out_tokens = []
-    last_token = None
-    while tokens:
-      next_token = tokens.pop(0)
-      if next_token.type == token_type:
-          last_token = next_token
-          break
-      else:
-          out_tokens.append(next_token)
-    return out_tokens, last_token
-
-def collect_until_balanced(tokens, left_type, right_type):
-    """
-    will parse until a balance is found
-
-    assumes that there is already a score of 1 (one open)
-    
-    throws away the final right_type token
-    """
-    if left_type == right_type:
-      raise AssertionError("louis, why is left_type == right_type?")
-
-    score = 1 # will return once 0
-    out_tokens = []
-    last_token = None
-    while tokens:
-      next_token = tokens.pop(0)
-      if next_token.type == right_type:
-          score -= 1
-          if score == 0:
-              last_token = next_token
-              break
-      elif next_token.type == left_type:
-          score += 1
-
-      out_tokens.append(next_token)
-    return out_tokens, last_token    
-
 def assert_args(args, length=None, match=None):
     """
     makes sure the given argument list matches the given constraints
@@ -474,17 +567,31 @@ def assert_node(node, matches=None, node_name=None):
         
     return (True, None)
     
-def strip_newline(tokens):
+
+
+def resolve_slots(tree, symbols):
     """
-    from the given token set.
-    mutates.
+    gives every word in tree its slot in symbols
     """
-    last_token = tokens[-1]
-    if last_token.type == 'NEWLINE':
-        tokens.pop()
-    return tokens
-    
+    nodes = [tree]
+    while nodes:
+        node = nodes.pop()
+        if node.type == 'word':
+            node.resolve(symbols)
+        nodes.extend(reversed(node.children))
+
 
 class DBNParser:
-    def parse(self, tokens):
-        return parse_block(tokens, commands_allowed=True)
+    def parse(self, tokens, symbols=None):
+        """
+        the tree of tokens, with the symbol table its slots are in as its
+        symbols: a new one, or symbols, to run it on states that already
+        have that table
+        """
+        if symbols is None:
+            symbols = DBNSymbolTable()
+        stream = DBNTokenStream(tokens)
+        tree = parse_block(stream, 0, len(stream), commands_allowed=True)
+        resolve_slots(tree, symbols)
+        tree.symbols = symbols
+        return tree
@@ -0,0 +1,297 @@
+"""
+persistent maps: set returns a new map and leaves the old one alone,
+copying only the nodes on the way down to the key, so successive maps
+share everything else
+
+DBNPersistentMap is a hash array mapped trie, for any hashable keys.
+a node has a bitmap of which of its 32 children are there, and a list
+of only those, each either a (key, value) pair or a node one level down
+(at most one level per 5 bits of the hash). keys whose whole hashes are
+the same share a collision node
+
+DBNPersistentVector is the same trie for small int keys (variable slots),
+where the nodes are full, so a key's place in a node is just its next 5
+bits and there's no bitmap or hashing to do. it's the one environments use,
+because variables are read a lot more than they're set
+"""
+
+BITS = 5
+MASK = (1 << BITS) - 1
+
+# bits set in every 16 bit number, to find an entry's place in a node
+POPCOUNT_16 = [bin(n).count('1') for n in range(1 << 16)]
+
+
+def popcount(n):
+    return POPCOUNT_16[n & 0xffff] + POPCOUNT_16[n >> 16]
+
+
+class BitmapNode(object):
+    __slots__ = ('bitmap', 'entries')
+
+    def __init__(self, bitmap, entries):
+        self.bitmap = bitmap
+        self.entries = entries
+
+
+class CollisionNode(object):
+    __slots__ = ('hash', 'entries')
+
+    def __init__(self, hash_, entries):
+        self.hash = hash_
+        self.entries = entries
+
+
+EMPTY_NODE = BitmapNode(0, [])
+
+
+def pair_node(shift, first, hash_, key, value):
+    """
+    a node holding the pair first and (key, value), which go in the same place one level up
+    """
+    first_hash = hash(first[0])
+    if first_hash == hash_:
+        return CollisionNode(hash_, [first, (key, value)])
+    first_bit = 1 << ((first_hash >> shift) & MASK)
+    bit = 1 << ((hash_ >> shift) & MASK)
+    if first_bit == bit:
+        return BitmapNode(bit, [pair_node(shift + BITS, first, hash_, key, value)])
+    if first_bit < bit:
+        return BitmapNode(first_bit | bit, [first, (key, value)])
+    return BitmapNode(first_bit | bit, [(key, value), first])
+
+
+def node_set(node, shift, hash_, key, value):
+    """
+    returns (a copy of node with key set to value, whether key is new)
+    """
+    if type(node) is CollisionNode:
+        if node.hash != hash_:
+            # push the collisions down a level, next to the new key
+            bit = 1 << ((node.hash >> shift) & MASK)
+            return node_set(BitmapNode(bit, [node]), shift, hash_, key, value)
+        entries = list(node.entries)
+        for index, (entry_key, _) in enumerate(entries):
+            if entry_key == key:
+                entries[index] = (key, value)
+                return CollisionNode(hash_, entries), False
+        entries.append((key, value))
+        return CollisionNode(hash_, entries), True
+
+    bit = 1 << ((hash_ >> shift) & MASK)
+    index = popcount(node.bitmap & (bit - 1))
+    entries = list(node.entries)
+    if not node.bitmap & bit:
+        entries.insert(index, (key, value))
+        return BitmapNode(node.bitmap | bit, entries), True
+
+    entry = entries[index]
+    if type(entry) is tuple:
+        if entry[0] == key:
+            entries[index] = (key, value)
+            added = False
+        else:
+            entries[index] = pair_node(shift + BITS, entry, hash_, key, value)
+            added = True
+    else:
+        entries[index], added = node_set(entry, shift + BITS, hash_, key, value)
+    return BitmapNode(node.bitmap, entries), added
+
+
+def node_items(node):
+    for entry in node.entries:
+        if type(entry) is tuple:
+            yield entry
+        else:
+            for item in node_items(entry):
+                yield item
+
+
+class DBNPersistentMap(object):
+    """
+    an immutable dict, set and update return new maps
+    """
+    __slots__ = ('root', 'count')
+
+    def __init__(self, root=EMPTY_NODE, count=0):
+        self.root = root
+        self.count = count
+
+    def get(self, key, default=None):
+        hash_ = hash(key)
+        node = self.root
+        shift = 0
+        while True:
+            if type(node) is CollisionNode:
+                for entry_key, value in node.entries:
+                    if entry_key == key:
+                        return value
+                return default
+            bit = 1 << ((hash_ >> shift) & MASK)
+            bitmap = node.bitmap
+            if not bitmap & bit:
+                return default
+            entry = node.entries[popcount(bitmap & (bit - 1))]
+            if type(entry) is tuple:
+                if entry[0] == key:
+                    return entry[1]
+                return default
+            node = entry
+            shift += BITS
+
+    def __getitem__(self, key):
+        missing = []
+        value = self.get(key, missing)
+        if value is missing:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        missing = []
+        return self.get(key, missing) is not missing
+
+    def set(self, key, value):
+        root, added = node_set(self.root, 0, hash(key), key, value)
+        return DBNPersistentMap(root, self.count + added)
+
+    def update(self, items):
+        """
+        items is a dict or a sequence of (key, value) pairs
+        """
+        if hasattr(items, 'items'):
+            items = items.items()
+        root, count = self.root, self.count
+        for key, value in items:
+            root, added = node_set(root, 0, hash(key), key, value)
+            count += added
+        return DBNPersistentMap(root, count)
+
+    def __len__(self):
+        return self.count
+
+    def items(self):
+        return list(node_items(self.root))
+
+    def keys(self):
+        return [key for key, _ in node_items(self.root)]
+
+    def __iter__(self):
+        for key, _ in node_items(self.root):
+            yield key
+
+
+class DBNPersistentVector(object):
+    """
+    an immutable list-like map from ints >= 0 to values, None where nothing is set
+
+    the nodes are lists of up to 32 values (at the bottom) or nodes,
+    only as long as they need to be. shift is how far down the root's
+    index bits start; the root gets another level above it when a key
+    doesn't fit under it
+    """
+    __slots__ = ('root', 'shift')
+
+    def __init__(self, root=None, shift=0):
+        if root is None:
+            root = []
+        self.root = root
+        self.shift = shift
+
+    def get(self, index, default=None):
+        shift = self.shift
+        node = self.root
+        if not shift:
+            # one level, which is most of the time
+            if index < len(node):
+                value = node[index]
+                if value is not None:
+                    return value
+            return default
+        if index >> shift > MASK:
+            return default
+        while shift:
+            node_index = (index >> shift) & MASK
+            if node_index >= len(node):
+                return default
+            node = node[node_index]
+            shift -= BITS
+        index &= MASK
+        if index >= len(node):
+            return default
+        value = node[index]
+        if value is None:
+            return default
+        return value
+
+    def set(self, index, value):
+        root, shift = self.root, self.shift
+        if not shift and index < len(root):
+            root = list(root)
+            root[index] = value
+            return DBNPersistentVector(root, 0)
+        while index >> shift > MASK:
+            root = [root]
+            shift += BITS
+        return DBNPersistentVector(vector_set(root, shift, index, value), shift)
+
+    def copy(self):
+        return self  # it never changes
+
+    def items(self):
+        return list(vector_items(self.root, self.shift, 0))
+
+    def __len__(self):
+        return len(self.items())
+
+
+class DBNMutableVector(list):
+    """
+    DBNPersistentVector's interface on a plain list that set changes in
+    place, for states without a history, which never look back.
+    copy is the way to get one that doesn't change with it
+    """
+
+    def get(self, index, default=None):
+        if index < len(self):
+            value = self[index]
+            if value is not None:
+                return value
+        return default
+
+    def set(self, index, value):
+        if index >= len(self):
+            self.extend([None] * (index + 1 - len(self)))
+        self[index] = value
+        return self
+
+    def copy(self):
+        return DBNMutableVector(self)
+
+    def items(self):
+        return [(index, value) for index, value in enumerate(self) if value is not None]
+
+
+def vector_set(node, shift, index, value):
+    """
+    returns a copy of node with index set to value
+    """
+    node = list(node)
+    node_index = (index >> shift) & MASK
+    if node_index >= len(node):
+        node.extend([None if shift == 0 else []] * (node_index + 1 - len(node)))
+    if shift == 0:
+        node[node_index] = value
+    else:
+        node[node_index] = vector_set(node[node_index], shift - BITS, index, value)
+    return node
+
+
+def vector_items(node, shift, base):
+    for node_index, entry in enumerate(node):
+        index = base | (node_index << shift)
+        if shift == 0:
+            if entry is not None:
+                yield index, entry
+        else:
+            for item in vector_items(entry, shift - BITS, index):
+                yield item
@@ -0,0 +1,138 @@
+"""
+where a run of the tree engine spends its time, by source line and by
+Command (user Commands and the builtins alike)
+
+while a DBNProfiler is on (see profiling), every statement a block runs
+and every Command call goes through it. each line and each Command name
+gets an entry with its calls, its total time (everything it ran, the
+statements or Commands inside it included) and its self time (without
+those), and the same two ways the states it produced (step counts, so
+none without a history) and the pixels it wrote
+
+statements that run some other way, like the bodies of batched Repeats
+(see batch.py), don't get entries of their own, their parent gets it all.
+the pixels of a memoized Command (see memo.py) are written when the
+call is done, so they are the calling line's own too
+"""
+import time
+from contextlib import contextmanager
+
+import dbnast
+from dbnstate import DBNImage
+
+FIELDS = ('calls', 'time', 'self_time', 'states', 'self_states', 'pixels', 'self_pixels')
+
+
+class DBNProfileEntry(object):
+    __slots__ = FIELDS
+
+    def __init__(self):
+        for field in FIELDS:
+            setattr(self, field, 0)
+
+    def as_dict(self):
+        return dict((field, getattr(self, field)) for field in FIELDS)
+
+
+class DBNProfiler(object):
+    """
+    lines maps line numbers, and commands maps Command names, to their
+    DBNProfileEntry. lines and Commands are timed separately, so a line's
+    self time leaves out the statements inside it (in its Repeat or
+    Question, or the body of the Command it calls), and a Command's self
+    time leaves out the Commands it calls
+    """
+
+    def __init__(self):
+        self.lines = {}
+        self.commands = {}
+        self.line_stack = []
+        self.command_stack = []
+
+    def enter(self, stack, state):
+        # [start time, start step, start pixels, and the totals of what ran inside]
+        stack.append([time.time(), state.step, DBNImage.pixels_written, 0.0, 0, 0])
+
+    def exit(self, stack, table, key, state):
+        start, step, pixels, inner_time, inner_states, inner_pixels = stack.pop()
+        elapsed = time.time() - start
+        states = state.step - step
+        pixels = DBNImage.pixels_written - pixels
+
+        entry = table.get(key)
+        if entry is None:
+            entry = table[key] = DBNProfileEntry()
+        entry.calls += 1
+        entry.time += elapsed
+        entry.self_time += elapsed - inner_time
+        entry.states += states
+        entry.self_states += states - inner_states
+        entry.pixels += pixels
+        entry.self_pixels += pixels - inner_pixels
+
+        if stack:
+            stack[-1][3] += elapsed
+            stack[-1][4] += states
+            stack[-1][5] += pixels
+
+    def apply_block(self, block, state):
+        limits = state.limits
+        for child in block.children:
+            if limits is not None:
+                limits.check(state)
+            self.enter(self.line_stack, state)
+            state = child.apply(state)
+            self.exit(self.line_stack, self.lines, child.line_no, state)
+        return state
+
+    def apply_command(self, node, state):
+        self.enter(self.command_stack, state)
+        state = node.call(state)
+        self.exit(self.command_stack, self.commands, node.name, state)
+        return state
+
+    def as_dict(self):
+        """
+        everything, as something json can dump (its keys have to be strings)
+        """
+        return {
+            'lines': dict((str(line_no), entry.as_dict()) for line_no, entry in self.lines.items()),
+            'commands': dict((name, entry.as_dict()) for name, entry in self.commands.items()),
+        }
+
+    def report(self, source, limit=20):
+        """
+        the limit hottest lines (by self time) with their source, and
+        every Command, as a table. lines get the states and pixels they
+        made themselves, Commands everything made while they ran
+        """
+        source_lines = source.split('\n')
+        rows = ["%6s%10s%11s%11s%10s%10s  %s" % ("line", "calls", "self", "total", "states", "pixels", "source")]
+        hottest = sorted(self.lines.items(), key=lambda item: item[1].self_time, reverse=True)
+        for line_no, entry in hottest[:limit]:
+            text = source_lines[line_no - 1].strip() if 0 < line_no <= len(source_lines) else ''
+            rows.append("%6d%10d%10.4fs%10.4fs%10d%10d  %s" % (
+                line_no, entry.calls, entry.self_time, entry.time, entry.self_states, entry.self_pixels, text))
+
+        rows.append('')
+        rows.append("%-16s%10s%11s%11s%10s%10s" % ("Command", "calls", "self", "total", "states", "pixels"))
+        for name, entry in sorted(self.commands.items(), key=lambda item: item[1].self_time, reverse=True):
+            rows.append("%-16s%10d%10.4fs%10.4fs%10d%10d" % (
+                name, entry.calls, entry.self_time, entry.time, entry.states, entry.pixels))
+        return '\n'.join(rows)
+
+
+@contextmanager
+def profiling(profiler):
+    """
+    turns profiler on for the tree engine while the block runs
+    """
+    old = dbnast.PROFILER
+    dbnast.PROFILER = profiler
+    try:
+        yield profiler
+    finally:
+        dbnast.PROFILER = old
+        # whatever a failed run left open
+        del profiler.line_stack[:]
+        del profiler.command_stack[:]
@@ -0,0 +1,237 @@
+"""
+renders lots of dbn scripts to PNGs, headless, on a pool of processes
+
+    python render.py [options] DIRECTORY_OR_GLOB ...
+
+a directory means every .dbn under it. each script runs in a worker
+with dbn.run_script_text (without a history, and optimized, since only
+the final image is kept) and its image is written next to it as a .png,
+or under --output with the same relative path
+
+every script gets --timeout seconds and --memory MB (on top of what the
+worker started with). one that goes over is stopped, reported, and the
+worker carries on with the next script. the tree engine stops itself
+(see limits.py), a timer stops anything else, or anything stuck outside
+the interpreter, a little after that. one line is printed per script,
+with its status (ok, error, timeout or memory) and time, and --json
+writes all of it to a file
+"""
+import glob
+import json
+import multiprocessing
+import os
+import resource
+import signal
+import sys
+import time
+from cStringIO import StringIO
+from optparse import OptionParser
+
+import dbn
+from limits import DBNLimits, DBNLimitExceeded
+
+# how much longer than its timeout a script gets before the timer stops it
+TIMER_GRACE = 1.0
+
+# the status of a script that hit one of its DBNLimits
+LIMIT_STATUSES = {'seconds': 'timeout', 'bytes': 'memory'}
+
+option_parser = OptionParser(usage="python render.py [options] DIRECTORY_OR_GLOB ...")
+option_parser.add_option('-o', '--output', dest="output", help="write the PNGs under this directory instead of next to the scripts", metavar="DIRECTORY")
+option_parser.add_option('-j', '--jobs', type="int", dest="jobs", help="how many worker processes (default: one per cpu)", default=None)
+option_parser.add_option('-t', '--timeout', type="float", dest="timeout", help="seconds each script may run (default 10)", default=10.0)
+option_parser.add_option('-m', '--memory', type="int", dest="memory", help="MB each script may use (default 512, 0 for no limit)", default=512)
+option_parser.add_option('-e', '--engine', type="choice", choices=dbn.ENGINES, dest="engine", help="how to execute the scripts: %s" % ', '.join(dbn.ENGINES), default='tree')
+option_parser.add_option('--json', dest="json", help="write the results to this json file", metavar="FILE")
+
+
+class DBNRenderTimeout(Exception):
+    pass
+
+
+def on_alarm(signum, frame):
+    raise DBNRenderTimeout()
+
+
+def address_space():
+    """
+    how much memory this process has mapped, in bytes (0 if there's no /proc to ask)
+    """
+    try:
+        pages = int(open('/proc/self/statm').read().split()[0])
+    except (IOError, ValueError):
+        return 0
+    return pages * resource.getpagesize()
+
+
+def init_worker(memory):
+    signal.signal(signal.SIGALRM, on_alarm)
+    # ctrl-c is for the parent, which stops the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if memory:
+        limit = address_space() + memory * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def find_scripts(patterns):
+    """
+    (path, path relative to where it was found) of every script the
+    patterns name, sorted, each once
+    """
+    found = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, names in os.walk(pattern):
+                for name in names:
+                    if name.endswith('.dbn'):
+                        path = os.path.join(root, name)
+                        found.append((path, os.path.relpath(path, pattern)))
+        else:
+            found.extend((path, os.path.basename(path)) for path in glob.glob(pattern))
+    seen = set()
+    scripts = []
+    for path, relative in sorted(found):
+        if os.path.abspath(path) not in seen:
+            seen.add(os.path.abspath(path))
+            scripts.append((path, relative))
+    return scripts
+
+
+def png_path(path, relative, output):
+    if output is None:
+        return os.path.splitext(path)[0] + '.png'
+    return os.path.join(output, os.path.splitext(relative)[0] + '.png')
+
+
+def render_image(dbn_script, engine='tree', timeout=None):
+    """
+    the final PIL image of dbn_script
+    """
+    limits = None
+    if engine == 'tree' and timeout is not None:
+        limits = DBNLimits(seconds=timeout)
+    return dbn.run_script_text(dbn_script, engine=engine, record_history=False, optimize=True, limits=limits).image._image
+
+
+def render_png(dbn_script, engine='tree', timeout=None):
+    out = StringIO()
+    render_image(dbn_script, engine, timeout).save(out, 'PNG')
+    return out.getvalue()
+
+
+def render_script(path, out_path, engine='tree', timeout=None):
+    image = render_image(open(path).read(), engine, timeout)
+    directory = os.path.dirname(out_path)
+    if directory and not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            pass  # another worker made it first
+    image.save(out_path, 'PNG')
+
+
+def run_limited(timeout, function, *args):
+    """
+    runs in a worker: function(*args), stopped by the timer a little
+    after timeout seconds, and by the worker's memory limit. returns a
+    dict of its status (ok, error, timeout or memory), error message,
+    value and seconds
+    """
+    result = {'status': 'ok', 'error': None, 'value': None}
+    start = time.time()
+    try:
+        try:
+            signal.setitimer(signal.ITIMER_REAL, timeout + TIMER_GRACE)
+            result['value'] = function(*args)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    except DBNRenderTimeout:
+        result['status'] = 'timeout'
+        result['error'] = "took more than %gs" % timeout
+    except DBNLimitExceeded as e:
+        result['status'] = LIMIT_STATUSES.get(e.limit, 'error')
+        result['error'] = str(e)
+    except MemoryError:
+        result['status'] = 'memory'
+        result['error'] = "ran out of memory"
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = '%s: %s' % (type(e).__name__, e)
+    result['seconds'] = time.time() - start
+    return result
+
+
+def render_job(job):
+    """
+    runs in a worker: renders one script file to a PNG file
+    """
+    path, out_path, timeout, engine = job
+    result = run_limited(timeout, render_script, path, out_path, engine, timeout)
+    del result['value']
+    result['path'] = path
+    result['output'] = out_path
+    return result
+
+
+def png_job(job):
+    """
+    runs in a worker: renders one script's text, the PNG is the result's value
+    """
+    dbn_script, timeout, engine = job
+    return run_limited(timeout, render_png, dbn_script, engine, timeout)
+
+
+def render_all(scripts, output=None, jobs=None, timeout=10.0, memory=512, engine='tree', report=None):
+    """
+    renders scripts, (path, relative path) pairs, on a pool of jobs
+    processes. returns a list of render_job's results, in the order the
+    scripts were given. report, if there is one, is called with each
+    result as it comes in
+    """
+    work = [(path, png_path(path, relative, output), timeout, engine) for path, relative in scripts]
+    pool = multiprocessing.Pool(jobs, init_worker, (memory,))
+    try:
+        results = {}
+        for result in pool.imap_unordered(render_job, work):
+            results[result['path']] = result
+            if report is not None:
+                report(result)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return [results[path] for path, _ in scripts]
+
+
+def print_result(result):
+    print "%-8s%9.3fs  %s%s" % (result['status'], result['seconds'], result['path'],
+                                result['error'] and '  (%s)' % result['error'] or '')
+    sys.stdout.flush()
+
+
+def main(args):
+    options, patterns = option_parser.parse_args(args)
+    if not patterns:
+        option_parser.error("nothing to render")
+    scripts = find_scripts(patterns)
+
+    start = time.time()
+    results = render_all(scripts, options.output, options.jobs, options.timeout, options.memory,
+                         options.engine, report=print_result)
+    elapsed = time.time() - start
+
+    statuses = [result['status'] for result in results]
+    print "%d scripts in %.2fs (%.1f a second): %s" % (
+        len(results), elapsed, len(results) / max(elapsed, 1e-9),
+        ', '.join("%d %s" % (statuses.count(status), status) for status in ('ok', 'error', 'timeout', 'memory')))
+
+    if options.json:
+        with open(options.json, 'w') as out:
+            json.dump({'seconds': elapsed, 'results': results}, out, indent=2, sort_keys=True)
+    return 0 if statuses.count('ok') == len(statuses) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -6,9 +6,39 @@ suite = unittest.TestLoader().loadTestsFromModule(tokenizer_tests)
 runner = unittest.TextTestRunner(verbosity=2)
 runner.run(suite)
 
+suite = unittest.TestLoader().loadTestsFromModule(state_tests)
+runner.run(suite)
+
+suite = unittest.TestLoader().loadTestsFromModule(engine_tests)
+runner.run(suite)
+
+
+suite = unittest.TestLoader().loadTestsFromModule(parser_tests)
+runner.run(suite)
+
+suite = unittest.TestLoader().loadTestsFromModule(optimizer_tests)
+runner.run(suite)
+
+suite = unittest.TestLoader().loadTestsFromModule(pmap_tests)
+runner.run(suite)
 
-#suite = unittest.TestLoader().loadTestsFromModule(parser_tests)
-#runner.run(suite)
+suite = unittest.TestLoader().loadTestsFromModule(profiler_tests)
+runner.run(suite)
+
+suite = unittest.TestLoader().loadTestsFromModule(render_tests)
+runner.run(suite)
+
+suite = unittest.TestLoader().loadTestsFromModule(limits_tests)
+runner.run(suite)
 
+suite = unittest.TestLoader().loadTestsFromModule(stream_tests)
+runner.run(suite)
 
+suite = unittest.TestLoader().loadTestsFromModule(render_pool_tests)
+runner.run(suite)
 
+suite = unittest.TestLoader().loadTestsFromModule(compile_cache_tests)
+runner.run(suite)
+
+suite = unittest.TestLoader().loadTestsFromModule(suite_tests)
+runner.run(suite)
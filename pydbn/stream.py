@@ -0,0 +1,95 @@
+"""
+runs a script on a thread, and hands over its states as they are made
+
+    for state in stream_states(dbn_script):
+        ...
+
+instead of linking each state to the one before (which keeps every one
+of them until the run is done), the run gives them to a queue that
+holds at most buffer_size, and waits when it's full. so the first state
+is there straight away, and a run only keeps buffer_size states ahead of
+whoever is reading them, however long it is. the states have no ghosts
+(and no next or previous), but they're still immutable, so the ones
+that have been read can be kept, or let go of
+
+closing the generator (or dropping it) stops the run. an error in the
+run is raised from the generator, after the states before it
+"""
+import Queue
+import sys
+import threading
+
+import dbn
+
+BUFFER_SIZE = 64
+
+# how long the reader waits between looking at whether the run is still going
+POLL_SECONDS = 0.1
+
+
+class DBNStreamClosed(Exception):
+    """
+    stops a run whose states nobody is reading any more
+    """
+    pass
+
+
+def stream_states(dbn_script, buffer_size=BUFFER_SIZE, **options):
+    """
+    a generator of the states of dbn_script, first to last. options are
+    dbn.run_script_text's (not record_history, and not the python engine)
+    """
+    if not options.get('record_history', True):
+        raise ValueError("Only states with a history can be streamed")
+    if options.get('engine') == 'python':
+        raise ValueError("The python engine can't be streamed")
+    return generate_states(dbn_script, buffer_size, options)
+
+
+def generate_states(dbn_script, buffer_size, options):
+    states = Queue.Queue(buffer_size)
+    closed = threading.Event()
+    done = object()
+    failure = []
+
+    def put(state):
+        if closed.is_set():
+            raise DBNStreamClosed()
+        states.put(state)
+
+    def run():
+        try:
+            dbn.run_script_text(dbn_script, stream=put, **options)
+        except DBNStreamClosed:
+            return
+        except Exception:
+            failure.append(sys.exc_info())
+        # the reader might already be gone
+        while not closed.is_set():
+            try:
+                states.put(done, timeout=POLL_SECONDS)
+                return
+            except Queue.Full:
+                pass
+
+    runner = threading.Thread(target=run, name="dbn stream")
+    runner.daemon = True
+    runner.start()
+
+    try:
+        while True:
+            state = states.get()
+            if state is done:
+                break
+            yield state
+        if failure:
+            error_type, error, traceback = failure[0]
+            raise error_type, error, traceback
+    finally:
+        closed.set()
+        # unblock the run, if it's waiting for room
+        while runner.is_alive():
+            try:
+                states.get(timeout=POLL_SECONDS)
+            except Queue.Empty:
+                pass
@@ -2,66 +2,192 @@
 Module to hold DBN data datastructures
 """
 
-class DBNVariable:
-    def __init__(self, name):
+# the formal arguments of the builtins (see builtins.py). every symbol
+# table starts with them, so the builtin procedures, which every run
+# shares, have the same slots in all of them
+BUILTIN_FORMALS = ('blX', 'blY', 'trX', 'trY', 'value')
+
+
+def slot_names(cls):
+    """
+    the __slots__ of cls and every class it comes from
+    """
+    names = []
+    for klass in reversed(cls.__mro__):
+        for name in klass.__dict__.get('__slots__', ()):
+            if name not in names:
+                names.append(name)
+    return names
+
+
+class DBNSlotted(object):
+    """
+    a base for the classes there are lots of (states, tokens, ast nodes),
+    which keep their attributes in __slots__ instead of a __dict__
+
+    pickle (any protocol) and copy go through __getstate__ and __setstate__,
+    with a dict of the slots that are set
+    """
+    __slots__ = ()
+
+    def __getstate__(self):
+        return dict((name, getattr(self, name)) for name in slot_names(type(self)) if hasattr(self, name))
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
+class DBNSymbolTable(DBNSlotted):
+    """
+    the slot number of every variable name in a script (the parser
+    resolves them, see parser.resolve_slots), and environments keep their
+    values in lists indexed by slot
+
+    a tree has its own, and so do the states of a run of it, so frames
+    are only as big as the script needs. a tree run on states that came
+    from another tree (like dbn.DBNIncrementalRunner does) has to be
+    parsed with their table
+    """
+    __slots__ = ('slots', 'names')
+
+    def __init__(self):
+        self.slots = {}
+        self.names = []
+        for name in BUILTIN_FORMALS:
+            self.slot(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def slot(self, name):
+        """
+        the slot of name, a new one if it hasn't got one yet
+        """
+        slot = self.slots.get(name)
+        if slot is None:
+            slot = len(self.names)
+            self.names.append(name)
+            self.slots[name] = slot
+        return slot
+
+    def get(self, name):
+        """
+        the slot of name, or None if it hasn't got one
+        """
+        return self.slots.get(name)
+
+    def __getstate__(self):
+        return {'names': self.names}
+
+    def __setstate__(self, state):
+        self.names = list(state['names'])
+        self.slots = dict((name, slot) for slot, name in enumerate(self.names))
+
+
+BUILTIN_SYMBOLS = DBNSymbolTable()
+
+
+class DBNVariable(DBNSlotted):
+    __slots__ = ('name', 'slot')
+
+    def __init__(self, name, slot):
         self.name = name
+        self.slot = slot
             
             
-class DBNDot:
+class DBNDot(DBNSlotted):
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
         
         
-class DBNProcedure():
+class DBNProcedure(object):
     """
     never created by the parser, only by the evaluation of a command definition node!
 
     halfy implements the DBNBaseNodeInterface, but really belongs here
+
+    a builtin (see builtins.builtin) has a builtin_name, and pickles as just that.
+    a pure one has its definition's memo (see memo.py), which doesn't pickle
     """
+    builtin_name = None
+    memo = None
 
-    def __init__(self, formal_args, body, line_no=-1):
+    def __init__(self, formal_args, formal_slots, body, line_no=-1):
         self.formal_args = formal_args
+        # in the symbol table of the tree that defined it
+        self.formal_slots = formal_slots
         self.arg_count = len(formal_args)
         self.body = body        
         self.line_no = line_no
 
+    def __reduce__(self):
+        if self.builtin_name is not None:
+            import builtins
+            return (builtins.builtin_procedure, (self.builtin_name,))
+        return (DBNProcedure, (self.formal_args, self.formal_slots, self.body, self.line_no))
+
         
 class DBNStateWrapper():
+    """
+    a cursor over the linked states of a run
+
+    every KEYFRAME_INTERVAL-th state is kept in an index, and the states
+    between two keyframes are only reachable through their next links
+    (they are cheap, because states share their images). so seeking
+    is a list lookup plus fewer than KEYFRAME_INTERVAL steps, and length
+    and cursor index come straight from the step count on each state
+    """
     
+    KEYFRAME_INTERVAL = 64
     
     def __init__(self, state):
         self.change_state(state)
     
     def change_state(self, state):
         self.cursor = state
-        self.start = self.get_start()
         self.end = self.get_end()
-        self.length = None # to trigger a cache refrese
+        self._index_keyframes()
+        self.start = self.get_start()
+        if self.start is None:
+            self.length = 0
+        else:
+            self.length = self.end.step - self.start.step
         self.cursor_index = self._find_index()
         
+    def _index_keyframes(self):
+        """
+        walks back from the end once, keeping every KEYFRAME_INTERVAL-th state
+        keyframes[i] is the state with step i * KEYFRAME_INTERVAL
+
+        stops early at a keyframe the last timeline had too, the new
+        timeline continues an old one (see dbn.DBNIncrementalRunner)
+        """
+        old_keyframes = getattr(self, 'keyframes', [])
+        keyframes = []
+        stepper = self.end
+        while stepper is not None:
+            if stepper.step % self.KEYFRAME_INTERVAL == 0:
+                index = stepper.step // self.KEYFRAME_INTERVAL
+                if index < len(old_keyframes) and old_keyframes[index] is stepper:
+                    break
+                keyframes.append(stepper)
+            stepper = stepper.previous
+        keyframes.reverse()
+        if stepper is not None:
+            keyframes = old_keyframes[:index + 1] + keyframes
+        self.keyframes = keyframes
+        
     def __len__(self):
-        if self.length is not None:
-            return self.length
-        else:
-            i = 0
-            stepper = self.start
-            if stepper is None:
-                return 0
-            while stepper.next is not None:
-                i += 1
-                stepper = stepper.next
-            self.length = i
-            return i
+        return self.length
     
     def _find_index(self):
-        # count backwards!
-        index = 0
-        pos = self.cursor
-        while pos.previous is not None:
-            pos = pos.previous
-            index += 1
-        return index
+        if self.start is None:
+            return 0
+        return self.cursor.step - self.start.step
             
     def next_scrub(self):
         """
@@ -93,10 +219,9 @@ class DBNStateWrapper():
         """
         returns the first state of the cursor
         """
-        first = self.cursor
-        while first.previous is not None:
-            first = first.previous
-        return first.next #  because the first one is a nubile state
+        if not self.keyframes:
+            return None
+        return self.keyframes[0].next #  because the first one is a nubile state
         
     def get_end(self):
         """
@@ -126,16 +251,13 @@ class DBNStateWrapper():
         moves the cursor to the nth state (1 indexed)
         raises IndexError if n is out of range
         """
-        self.rewind()
-        for i in range(0,n):
-            try:
-                self.cursor = self.cursor.next
-                self.cursor_index += 1
-            except AttributeError: # if cursor is None
-                raise IndexError
-        if self.cursor is None:
-            raise IndexError
-        # ok.
+        if self.start is None or not 0 <= n <= self.length:
+            raise IndexError("no state %d in a timeline of %d" % (n, self.length))
         
-            
-        
\ No newline at end of file
+        step = self.start.step + n
+        cursor = self.keyframes[step // self.KEYFRAME_INTERVAL]
+        while cursor.step < step:
+            cursor = cursor.next
+        
+        self.cursor = cursor
+        self.cursor_index = n
@@ -1,3 +1,15 @@
 __all__ = [
     'tokenizer_tests',
+    'state_tests',
+    'engine_tests',
+    'parser_tests',
+    'optimizer_tests',
+    'pmap_tests',
+    'profiler_tests',
+    'render_tests',
+    'limits_tests',
+    'stream_tests',
+    'render_pool_tests',
+    'compile_cache_tests',
+    'suite_tests',
 ]
\ No newline at end of file
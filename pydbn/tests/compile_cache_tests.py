@@ -0,0 +1,112 @@
+from __future__ import absolute_import
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+# compile_cache is next to web.py, above pydbn
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from compile_cache import DBNCompileCache, script_key, source_version
+
+
+class Compiler(object):
+    """
+    upper cases scripts, and remembers what it was asked to
+    """
+
+    def __init__(self):
+        self.compiled = []
+
+    def __call__(self, script):
+        if script == 'broken':
+            raise ValueError("can't compile that")
+        self.compiled.append(script)
+        return script.upper()
+
+
+class DBNCompileCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def counts(self, cache):
+        stats = cache.stats()
+        return stats['hits'], stats['disk_hits'], stats['misses'], stats['evictions']
+
+    def test_least_recently_used_goes(self):
+        compiler = Compiler()
+        cache = DBNCompileCache(compiler, size=2)
+        self.assertEqual(cache.compile('a'), 'A')
+        cache.compile('b')
+        cache.compile('a')  # now b is the oldest
+        cache.compile('c')
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(self.counts(cache), (1, 0, 3, 1))
+        cache.compile('a')
+        cache.compile('b')
+        self.assertEqual(compiler.compiled, ['a', 'b', 'c', 'b'])
+        self.assertEqual(self.counts(cache), (2, 0, 4, 2))
+
+    def test_restart_reads_the_disk(self):
+        cache = DBNCompileCache(Compiler(), size=1, directory=self.directory)
+        cache.compile('a')
+        cache.compile('b')
+        compiler = Compiler()
+        restarted = DBNCompileCache(compiler, size=1, directory=self.directory)
+        self.assertEqual(restarted.compile('a'), 'A')
+        self.assertEqual(restarted.compile('a'), 'A')
+        self.assertEqual(compiler.compiled, [])
+        self.assertEqual(self.counts(restarted), (1, 1, 0, 0))
+
+    def test_new_version_compiles_again(self):
+        DBNCompileCache(Compiler(), directory=self.directory, version='1').compile('a')
+        compiler = Compiler()
+        cache = DBNCompileCache(compiler, directory=self.directory, version='2')
+        cache.compile('a')
+        self.assertEqual(compiler.compiled, ['a'])
+        self.assertNotEqual(script_key('a', '1'), script_key('a', '2'))
+        self.assertNotEqual(source_version(shutil, tempfile), source_version(shutil))
+
+    def test_disk_is_bounded(self):
+        cache = DBNCompileCache(Compiler(), size=1, directory=self.directory, disk_size=4)
+        for script in 'abcde':
+            cache.compile(script)
+            time.sleep(0.01)  # so their times differ
+        files = [name for name in os.listdir(self.directory) if name.endswith('.js')]
+        self.assertEqual(len(files), 3)
+        self.assertEqual(cache.stats()['disk_evictions'], 2)
+        # the newest are the ones kept
+        self.assertTrue(script_key('e') + '.js' in files)
+        self.assertFalse(script_key('a') + '.js' in files)
+
+    def test_disk_errors_still_compile(self):
+        compiler = Compiler()
+        cache = DBNCompileCache(compiler, directory=self.directory)
+        # a directory where the script should be can't be read
+        os.mkdir(os.path.join(self.directory, script_key('a') + '.js'))
+        self.assertEqual(cache.compile('a'), 'A')
+        # and without the directory nothing can be written
+        shutil.rmtree(self.directory)
+        self.assertEqual(cache.compile('b'), 'B')
+        self.assertEqual(cache.compile('b'), 'B')
+        self.assertEqual(compiler.compiled, ['a', 'b'])
+        self.assertEqual(self.counts(cache), (1, 0, 2, 0))
+        self.assertEqual(cache.stats()['disk_errors'], 3)
+        os.mkdir(self.directory)
+
+    def test_errors_are_not_cached(self):
+        compiler = Compiler()
+        cache = DBNCompileCache(compiler, directory=self.directory)
+        self.assertRaises(ValueError, cache.compile, 'broken')
+        self.assertRaises(ValueError, cache.compile, 'broken')
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(os.listdir(self.directory), [])
+        self.assertEqual(self.counts(cache), (0, 0, 0, 0))
@@ -0,0 +1,346 @@
+from __future__ import absolute_import
+
+import dbn
+from structures import DBNStateWrapper
+
+import unittest
+
+scripts = [
+    """Paper 30
+Pen 80
+Line 0 0 100 (30 + 20 * 2)
+Set A (100 - 50)
+Set [A (A / 3)] 75
+Set B [A (100 - A / 3)]
+Set [10 10] (B / 4)
+""",
+    """Paper 0
+Repeat B 0 30 {
+  Repeat A 30 0 {
+    Smaller? A B {
+      Set [A B] (A + B)
+    }
+    NotSmaller? A B {
+      Same? (A / 2 * 2) A {
+        Set [A B] 100
+      }
+    }
+  }
+}
+""",
+    """Command Rectangle L B R T {
+  Line L B R B
+  Line R B R T
+  Line R T L T
+  Line L T L B
+}
+
+Command RectInRect H V N S {
+    Repeat B 0 N {
+        Set A (B * S)
+        Rectangle (H-A) (V-A) (A+H) (A+V)
+    }
+}
+
+Command Dot X Y {
+  Set [X Y] C
+  Set C (C + 10)
+}
+
+Paper 0
+Pen 100
+RectInRect 50 50 12 4
+Set C 20
+Dot 5 5
+Dot 6 6
+Set [7 7] C
+""",
+    """Command Spiral N D {
+  Repeat A 0 N {
+    Set [(A * 2 + D * 20) (D * 2 + 10 / 3)] (N * 20)
+    Smaller? D 3 {
+      Spiral (N - 1) (D + 1)
+    }
+  }
+}
+
+Command Row Y {
+  Repeat X 0 20 {
+    Set [X (Y + Shift)] (X * 4)
+    Set Shift (Shift + 1)
+  }
+}
+
+Paper 0
+Set Shift 40
+Spiral 4 0
+Repeat Y 0 5 {
+  Set K (Y * 3)
+  Repeat X 0 10 {
+    Set [(X + K) (Y * 5 + 60)] (K + 20)
+    Set K (K + 1)
+  }
+  Row (Y + 10)
+}
+""",
+]
+
+def deep_nest(depth):
+    """
+    depth Repeats inside each other (too many for one python function),
+    with a Question in the middle, and Sets and a Command call at the bottom
+    """
+    lines = ["Command Mark X {", "  Set [X (X + 5)] 80", "}", "Set C 0"]
+    for level in range(depth):
+        lines.append("  " * level + "Repeat L%d 0 %d {" % (level, 1 if level % 7 == 0 else 0))
+    lines.append("  " * depth + "Set C (C + 3)")
+    lines.append("  " * depth + "Same? L0 1 {")
+    lines.append("  " * depth + "  Set [C 50] 100")
+    lines.append("  " * depth + "  Mark C")
+    lines.append("  " * depth + "}")
+    for level in reversed(range(depth)):
+        lines.append("  " * level + "}")
+    lines.append("Line 0 C 100 C")
+    return '\n'.join(lines) + '\n'
+
+scripts.append(deep_nest(22))
+
+# drawing Repeat nests, for the batches: overlapping writes, ranges that
+# depend on the Repeat around them, a redefined Line, dividing by 0
+batch_scripts = [
+    """Paper 20
+Pen 70
+Repeat A 10 0 {
+  Set [A (A * 2)] (A * 7)
+  Repeat B 0 A {
+    Set [(A + B) B] (B * 3 - A)
+    Line A B (100 - A) (B / 2)
+  }
+  Set [A A] 0
+}
+Set [1 1] (A + B)
+""",
+    """Set S 3
+Repeat A 0 50 {
+  Set [(A / S) 5] A
+  Set [(A / S) 5] (100 - A)
+}
+Command Line a b c d {
+  Set [a b] 50
+}
+Repeat A 0 5 {
+  Line A A 3 3
+}
+""",
+    """Set Z 0
+Repeat A 0 5 {
+  Set [A (10 / Z)] 3
+}
+""",
+]
+
+# Commands for the memos: variables from the caller, nested and redefined
+# Commands, pen changes, pixel reads, recursion, dividing by 0 (on a
+# call that was already recorded)
+memo_scripts = [
+    """Command Tick X Y {
+  Set T (X + S)
+  Line X Y T (Y + 10)
+  Set [T Y] (X * 2)
+}
+Command Ticks X {
+  Repeat I 0 3 {
+    Tick X (I * 20)
+  }
+}
+Repeat A 0 40 {
+  Set S (A / 10)
+  Pen (A / 20 * 50)
+  Ticks (A / 4)
+  Tick 1 1
+}
+Command Tick X Y {
+  Set [X Y] 100
+}
+Ticks 5
+Ticks 5
+""",
+    """Command Dim X {
+  Set [X X] ([X 0] + 10)
+}
+Command Ink X {
+  Pen X
+  Line 0 0 X X
+}
+Repeat A 0 20 {
+  Set [(A / 2) 0] A
+  Dim (A / 2)
+  Ink (A / 3 * 40)
+}
+""",
+    """Command Down N {
+  Line N 0 N N
+  Same? N 0 {
+  }
+  NotSame? N 0 {
+    Down (N - 1)
+  }
+}
+Command Split N {
+  Set [N (100 / N)] 0
+}
+Down 5
+Down 5
+Down 40
+Down 40
+Split 4
+Split (N + 4)
+Split 0
+""",
+]
+
+error_scripts = [
+    "Nope 1 2\n",
+    "Command Two A B {\n  Set [A B] 0\n}\nTwo 1\n",
+    "Command Forever A {\n  Forever A\n}\nForever 1\n",
+]
+
+
+def history(state):
+    states = []
+    while state is not None:
+        states.append(state)
+        state = state.previous
+    states.reverse()
+    return states
+
+
+def changes(states):
+    """
+    the line of every state that changed more than the line, and what it changed
+    """
+    found = []
+    for old, new in zip(states, states[1:]):
+        changed = (new.image is not old.image, new.env is not old.env,
+                   new.commands is not old.commands, new.pen_color != old.pen_color)
+        if any(changed):
+            found.append((new.line_no,) + changed)
+    return found
+
+
+class EngineTest(unittest.TestCase):
+    def assertSameRun(self, script, engine):
+        expected = history(dbn.run_script_text(script))
+        got = history(dbn.run_script_text(script, engine=engine))
+        # the vm leaves out the states that would only have moved the line
+        self.assertTrue(len(got) <= len(expected))
+        self.assertEqual(changes(got), changes(expected))
+        self.assertEqual(got[-1].image._image.tobytes(), expected[-1].image._image.tobytes())
+        self.assertEqual(got[-1].pen_color, expected[-1].pen_color)
+
+    def assertSameError(self, script, engine):
+        try:
+            dbn.run_script_text(script)
+        except ValueError as e:
+            expected = str(e)
+        self.assertRaisesRegexp(ValueError, expected, dbn.run_script_text, script, engine=engine)
+
+    def test_vm(self):
+        for script in scripts:
+            self.assertSameRun(script, 'vm')
+
+    def test_vm_errors(self):
+        for script in error_scripts:
+            self.assertSameError(script, 'vm')
+
+    def test_python(self):
+        for script in scripts:
+            expected = dbn.run_script_text(script)
+            got = dbn.run_script_text(script, engine='python')
+            self.assertEqual(got.image._image.tobytes(), expected.image._image.tobytes())
+            self.assertEqual(got.pen_color, expected.pen_color)
+
+    def test_without_history(self):
+        for script in scripts:
+            for engine in ('tree', 'vm'):
+                expected = dbn.run_script_text(script, engine=engine)
+                got = dbn.run_script_text(script, engine=engine, record_history=False)
+                self.assertEqual(got.image._image.tobytes(), expected.image._image.tobytes())
+                self.assertEqual(got.pen_color, expected.pen_color)
+                self.assertTrue(got.previous is None)
+                self.assertTrue(got.ghosts is None)
+
+    def test_without_history_errors(self):
+        for script in error_scripts:
+            self.assertRaises(ValueError, dbn.run_script_text, script, record_history=False)
+
+    def test_optimized(self):
+        for script in scripts:
+            for engine in ('tree', 'vm'):
+                expected = history(dbn.run_script_text(script, engine=engine))
+                got = history(dbn.run_script_text(script, engine=engine, optimize=True))
+                self.assertEqual([s.line_no for s in got], [s.line_no for s in expected])
+                self.assertEqual(got[-1].image._image.tobytes(), expected[-1].image._image.tobytes())
+
+    def test_batched(self):
+        def run(script, optimize):
+            try:
+                state = dbn.run_script_text(script, record_history=False, optimize=optimize)
+            except ZeroDivisionError:
+                return 'ZeroDivisionError'
+            return state.image._image.tobytes(), state.line_no, state.env.variables()
+        for script in scripts + batch_scripts + memo_scripts:
+            self.assertEqual(run(script, True), run(script, False))
+
+    def test_python_errors(self):
+        for script in error_scripts:
+            self.assertSameError(script, 'python')
+
+
+class DBNIncrementalRunnerTest(unittest.TestCase):
+    def assertSameHistory(self, got, expected):
+        got, expected = history(got), history(expected)
+        self.assertEqual([s.line_no for s in got], [s.line_no for s in expected])
+        self.assertEqual([s.step for s in got], [s.step for s in expected])
+        self.assertEqual(got[-1].image._image.tobytes(), expected[-1].image._image.tobytes())
+        self.assertEqual(sorted(got[-1].ghosts.keys()), sorted(expected[-1].ghosts.keys()))
+
+    def test_edit_reuses_prefix(self):
+        runner = dbn.DBNIncrementalRunner()
+        first = runner.run(scripts[2])
+        wrapper = DBNStateWrapper(first)
+
+        edited = scripts[2].replace("Set [7 7] C", "Set [8 8] C\nLine 0 0 C C")
+        state = runner.run(edited)
+        self.assertEqual(runner.reused, 9)
+        self.assertSameHistory(state, dbn.run_script_text(edited))
+
+        wrapper.change_state(state)
+        expected = history(state)[1:]
+        self.assertEqual(len(wrapper), len(expected) - 1)
+        for n in [0, 64, 65, len(wrapper)]:
+            wrapper.seek(n)
+            self.assertTrue(wrapper.cursor is expected[n])
+
+    def test_unchanged_and_shorter_scripts(self):
+        runner = dbn.DBNIncrementalRunner()
+        runner.run(scripts[2])
+        state = runner.run(scripts[2])
+        self.assertEqual(runner.reused, 10)
+        self.assertTrue(state.next is None)
+
+        shorter = scripts[2].replace("Set [7 7] C\n", "")
+        state = runner.run(shorter)
+        self.assertTrue(state.next is None)
+        self.assertSameHistory(state, dbn.run_script_text(shorter))
+
+    def test_errors_leave_last_run_alone(self):
+        runner = dbn.DBNIncrementalRunner()
+        first = runner.run(scripts[0])
+        self.assertRaises(ValueError, runner.run, scripts[0] + "Nope 1 2\n")
+        self.assertEqual(history(first)[-1].next, None)
+        self.assertSameHistory(runner.run(scripts[0]), first)
+
+
+if __name__ == "__main__":
+    unittest.main()
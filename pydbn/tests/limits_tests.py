@@ -0,0 +1,107 @@
+from __future__ import absolute_import
+
+import dbn
+from limits import DBNLimits, DBNLimitExceeded
+from tokenizer import DBNTokenizer
+from parser import DBNParser
+from optimizer import DBNOptimizer
+from dbnstate import DBNInterpreterState
+
+import threading
+import time
+import unittest
+
+forever = """Set B 5
+Repeat A 0 100000000 {
+  Set B A
+}
+"""
+
+
+class DBNLimitsTest(unittest.TestCase):
+    def run_limited(self, script, limits, **options):
+        try:
+            dbn.run_script_text(script, limits=limits, **options)
+        except DBNLimitExceeded as e:
+            return e
+        self.fail("no limit hit")
+
+    def test_steps(self):
+        for record_history in (True, False):
+            e = self.run_limited(forever, DBNLimits(steps=1000), record_history=record_history)
+            self.assertEqual(e.limit, 'steps')
+            self.assertEqual(e.line_no, 3)
+            # the Set B 5, the Repeat, then 499 times around with their Sets
+            self.assertEqual(e.state.lookup_variable('B'), 498)
+            self.assertTrue("line 3" in str(e))
+        self.assertEqual(self.run_limited("Repeat A 0 100000000 {\n}\n", DBNLimits(steps=10)).limit, 'steps')
+
+    def test_no_limit_hit(self):
+        limits = DBNLimits(steps=1000, seconds=10, states=1000, bytes=1 << 30)
+        state = dbn.run_script_text("Repeat A 0 10 {\n  Set [A A] 0\n}\n", limits=limits)
+        self.assertEqual(state.limits, limits)
+        self.assertTrue(limits.taken < 50)
+        # and again, the steps start over
+        dbn.run_script_text("Repeat A 0 10 {\n  Set [A A] 0\n}\n", limits=limits)
+
+    def test_states(self):
+        e = self.run_limited(forever, DBNLimits(states=2000))
+        self.assertEqual(e.limit, 'states')
+        self.assertTrue(2000 <= e.state.step < 2000 + 3 * 256)
+
+    def test_seconds(self):
+        start = time.time()
+        e = self.run_limited(forever, DBNLimits(seconds=0.2), record_history=False)
+        self.assertEqual(e.limit, 'seconds')
+        self.assertTrue(time.time() - start < 2)
+
+    def test_cancel(self):
+        limits = DBNLimits()
+        timer = threading.Timer(0.2, limits.cancel)
+        timer.start()
+        e = self.run_limited(forever, limits, record_history=False)
+        self.assertEqual(e.limit, 'cancelled')
+        self.assertTrue(e.state.lookup_variable('B') > 0)
+
+    def test_batched(self):
+        grid = "Repeat A 0 1000 {\n  Repeat B 0 1000 {\n    Set [A B] 5\n  }\n}\n"
+        expected = self.run_limited(grid, DBNLimits(steps=1000), record_history=False)
+        limits = DBNLimits(steps=1000)
+        e = self.run_limited(grid, limits, record_history=False, optimize=True)
+        self.assertEqual(e.limit, 'steps')
+        self.assertEqual(e.state.lookup_variable('B'), expected.state.lookup_variable('B'))
+        self.assertEqual(limits.taken, 1001)
+
+        # a batch that fits takes the steps it would have
+        small = "Repeat A 0 10 {\n  Repeat B 0 10 {\n    Set [A B] 5\n  }\n}\n"
+        for optimize in (False, True):
+            limits = DBNLimits(steps=1000)
+            dbn.run_script_text(small, limits=limits, record_history=False, optimize=optimize)
+            self.assertEqual(limits.taken, 1 + 11 * 2 + 121 * 2)
+
+    def test_commands_and_optimized(self):
+        # a memoized Command call takes the steps its first call did
+        script = "Command Row N {\n  Repeat B 0 N {\n    Set [B N] B\n  }\n}\nRepeat A 0 1000000 {\n  Row 100\n}\n"
+        expected = self.run_limited(script, DBNLimits(steps=5000), record_history=False)
+        limits = DBNLimits(steps=5000)
+        e = self.run_limited(script, limits, record_history=False, optimize=True)
+        self.assertEqual(e.limit, 'steps')
+        self.assertEqual(e.state.lookup_variable('A'), expected.state.lookup_variable('A'))
+        self.assertEqual(limits.taken, 5001)
+
+        # and so does one recorded by a run without limits
+        optimizer = DBNOptimizer()
+        marks = "Command Mark N {\n  Set [N N] 0\n  Set [N 0] 0\n}\nMark 5\nMark 5\nMark 5\n"
+        dbn_ast = optimizer.memoize(DBNParser().parse(DBNTokenizer().tokenize(marks)))
+        dbn_ast.apply(DBNInterpreterState(record_history=False, symbols=dbn_ast.symbols))
+        limits = DBNLimits(steps=1000)
+        dbn_ast.apply(DBNInterpreterState(record_history=False, limits=limits, symbols=dbn_ast.symbols))
+        self.assertEqual(limits.taken, 1 + 3 * 3)
+        self.assertEqual(optimizer.memos[0].hits, 2 + 2)
+
+    def test_only_the_tree_engine(self):
+        self.assertRaises(ValueError, dbn.run_script_text, forever, engine='vm', limits=DBNLimits(steps=10))
+
+
+if __name__ == "__main__":
+    unittest.main()
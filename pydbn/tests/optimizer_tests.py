@@ -0,0 +1,145 @@
+from __future__ import absolute_import
+
+from tokenizer import DBNTokenizer
+from parser import DBNParser
+from optimizer import DBNOptimizer
+from dbnstate import DBNInterpreterState
+
+import unittest
+
+
+def optimize(string):
+    optimizer = DBNOptimizer()
+    tree = optimizer.optimize(DBNParser().parse(DBNTokenizer().tokenize(string)))
+    return optimizer.hoist(tree), optimizer
+
+
+class OptimizerTest(unittest.TestCase):
+    def test_folding(self):
+        tree, optimizer = optimize("Set A ((50 + 10) * 2 - B)\nSet [(100 / 3) 0] (1 - 6)\n")
+        first, second = tree.children
+        operation = first.children[1]
+        self.assertEqual(operation.name, '-')
+        self.assertEqual(operation.children[0].type, 'number')
+        self.assertEqual(operation.children[0].value, 120)
+        self.assertEqual(second.children[0].children[0].value, 33)
+        self.assertEqual(second.children[1].value, -5)
+        self.assertEqual(optimizer.folded, 4)
+
+    def test_folded_nodes_keep_locations(self):
+        tree, _ = optimize("Line 0 0 (50 + (10 * 2)) 5\n")
+        number = tree.children[0].children[2]
+        self.assertEqual(number.value, 70)
+        self.assertEqual(number.start_location(), "1.9")
+        self.assertEqual(number.end_location(), "1.24")
+
+    def test_division_by_zero_is_left_alone(self):
+        tree, optimizer = optimize("Set A (1 / 0)\n")
+        self.assertEqual(tree.children[0].children[1].type, 'operation')
+        self.assertEqual(optimizer.folded, 0)
+
+    def test_static_repeat_ranges(self):
+        tree, optimizer = optimize("Repeat A (10 * 10) 0 {\n  Repeat B 0 A {\n  }\n}\n")
+        outer = tree.children[0]
+        inner = outer.children[3].children[0]
+        self.assertEqual(outer.static_range, (100, 0))
+        self.assertEqual(inner.static_range, None)
+        self.assertEqual(optimizer.static_repeats, 1)
+
+    def test_hoisting(self):
+        tree, optimizer = optimize("""Repeat A 0 10 {
+  Repeat B 0 10 {
+    Set [(A * 2) (C - 1)] ((B + A) * 2)
+  }
+}
+""")
+        outer = tree.children[0]
+        inner = outer.children[3].children[0]
+        x, y = inner.children[3].children[0].children[0].children
+        self.assertEqual([h.children[0] for h in outer.hoisted], [y.children[0]])
+        self.assertEqual([h.children[0] for h in inner.hoisted], [x.children[0]])
+        self.assertEqual((x.type, y.type), ('hoisted', 'hoisted'))
+        self.assertEqual(optimizer.hoisted, 2)
+
+    def test_no_hoisting(self):
+        for body in ["Set [A (C - 1)] 0\n  Set C (C + 1)", "Set [A (100 / C)] 0", "Set [A ([0 0] + 1)] 0",
+                     "Repeat C 0 1 {\n  Set [A (C - 1)] 0\n  }", "Same? 1 1 {\n  Set C 2\n  }\n  Set [A (C - 1)] 0"]:
+            tree, optimizer = optimize("Repeat A 0 10 {\n  %s\n}\n" % body)
+            self.assertEqual(optimizer.hoisted, 0, body)
+
+    def test_hoisted_values_go_when_one_fails(self):
+        class Failing(object):
+            def evaluate(self, state):
+                raise ZeroDivisionError("integer division or modulo by zero")
+
+        tree, optimizer = optimize("Repeat A 0 10 {\n  Set [(C - 1) (D - 1)] 0\n}\n")
+        repeat = tree.children[0]
+        self.assertEqual(len(repeat.hoisted), 2)
+        repeat.hoisted[1].children[0] = Failing()
+        self.assertRaises(ZeroDivisionError, tree.apply, DBNInterpreterState(symbols=tree.symbols))
+        self.assertEqual([hoisted.values for hoisted in repeat.hoisted], [[], []])
+
+    def test_command_bodies_hoist_in_their_own_frame(self):
+        tree, optimizer = optimize("Repeat C 0 10 {\n  Set [C (D - 1)] 0\n}\nCommand Line1 D {\n  Repeat A 0 10 {\n    Set [A (D - 1)] C\n  }\n}\n")
+        repeat, definition = tree.children
+        self.assertEqual(len(repeat.hoisted), 1)
+        self.assertEqual(len(definition.children[-1].children[0].hoisted), 1)
+
+    def test_batches(self):
+        tree, optimizer = optimize("""Repeat A 0 10 {
+  Repeat B 0 A {
+    Set [A B] (A + B)
+    Line A B 0 (B / 2)
+  }
+}
+Repeat A 0 10 {
+  Set [A 0] B
+  Repeat B 0 2 {
+  }
+}
+Repeat A 0 10 {
+  Set C A
+  Set [A [A 0]] 0
+  Same? A 1 {
+  }
+}
+""")
+        optimizer.batch(tree)
+        first, second, third = tree.children
+        self.assertTrue(first.batch is not None)
+        self.assertTrue(first.children[3].children[0].batch is not None)
+        self.assertEqual(second.batch, None)  # B before its Repeat
+        self.assertEqual(third.batch, None)
+        self.assertEqual(optimizer.batched, 3)
+
+    def test_memos(self):
+        tree, optimizer = optimize("""Command K X Y {
+  Line X (Y + 10) X Y
+  Set [X Y] Z
+}
+Command Read X {
+  Set [X 0] [0 X]
+}
+Repeat A 0 10 {
+  K 50 50
+  K (A / 5) 0
+  Set Z (A / 4)
+}
+""")
+        optimizer.memoize(tree)
+        k, read = tree.children[:2]
+        self.assertTrue(k.memo is not None)
+        self.assertEqual(read.memo, None)
+        self.assertEqual(optimizer.memos, [k.memo])
+
+        tree.apply(DBNInterpreterState(record_history=False, symbols=tree.symbols))
+        # K 50 50 with Z 0, 1 and 2, K 0 0 with Z 0, K 1 0 with Z 1 and 2, K 2 0 with Z 2
+        self.assertEqual((k.memo.hits, k.memo.misses), (15, 7))
+        self.assertEqual(optimizer.memo_stats(), (15, 7, 15 / 22.0))
+
+        tree.apply(DBNInterpreterState(record_history=True, symbols=tree.symbols))
+        self.assertEqual((k.memo.hits, k.memo.misses), (15, 7))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+from __future__ import absolute_import
+
+from tokenizer import DBNTokenizer
+from parser import DBNParser, DBNTokenStream, DBNTokenSpan
+
+import unittest
+
+
+def parse(string):
+    return DBNParser().parse(DBNTokenizer().tokenize(string))
+
+def shape(node):
+    """
+    (name, [children]), or just the name of a leaf
+    """
+    if not node.children:
+        return node.name
+    return (node.name, [shape(child) for child in node.children])
+
+
+class ParserTest(unittest.TestCase):
+    def test_tree(self):
+        tree = parse("Paper 0\nRepeat A 0 10 {\n  Set [A (A * 2)] 100\n}\n")
+        self.assertEqual(shape(tree),
+            ('block', [
+                ('Paper', ['0']),
+                ('repeat', ['A', '0', '10', ('block', [
+                    ('set', [('bracket', ['A', ('*', ['A', '2'])]), '100']),
+                ])]),
+            ]))
+
+    def test_token_spans(self):
+        tree = parse("Paper 0\nRepeat A 0 10 {\n  Set [A (A * 2)] 100\n}\nLine 0 0 5 5")
+        paper, repeat, line = tree.children
+        self.assertEqual([t.value for t in paper.tokens], ['Paper', '0'])
+        self.assertEqual(repeat.start_location(), "2.0")
+        self.assertEqual(repeat.end_location(), "4.1")
+        self.assertEqual(len(line.tokens), 5)
+
+        set_node = repeat.children[3].children[0]
+        bracket, _ = set_node.children
+        self.assertEqual(bracket.start_location(), "3.6")
+        self.assertEqual(bracket.end_location(), "3.17")
+        self.assertEqual(bracket.children[1].start_location(), "3.9")
+        self.assertEqual(bracket.children[1].end_location(), "3.16")
+
+    def test_token_stream(self):
+        tokens = DBNTokenizer().tokenize("Repeat A 0 (1 + [2 3]) {\n  Set B (A\n}\nLine ] 0")
+        stream = DBNTokenStream(tokens)
+        types = [token.type for token in tokens]
+        paren, bracket, brace = types.index('OPENPAREN'), types.index('OPENBRACKET'), types.index('OPENBRACE')
+        self.assertEqual(types[stream.find_close(paren, len(tokens))], 'CLOSEPAREN')
+        self.assertEqual(stream.find_close(bracket, len(tokens)), bracket + 3)
+        self.assertEqual(types[stream.find_close(brace, len(tokens))], 'CLOSEBRACE')
+        # not before end, never closed, or not a grouper at all
+        self.assertEqual(stream.find_close(brace, brace + 2), None)
+        self.assertEqual(stream.find_close(types.index('OPENPAREN', brace), len(tokens)), None)
+        self.assertEqual(stream.find_close(0, len(tokens)), None)
+
+        newline = types.index('NEWLINE')
+        self.assertEqual(stream.find_next('NEWLINE', 0, len(tokens)), newline)
+        self.assertEqual(stream.find_next('NEWLINE', newline, len(tokens)), newline)
+        self.assertEqual(stream.find_next('NEWLINE', 0, 3), 3)
+        self.assertEqual(stream.find_next('OPENBRACE', brace + 1, len(tokens)), len(tokens))
+        self.assertEqual(stream.find_body(0, len(tokens))[:2], (brace, brace + 1))
+
+    def test_token_span_views(self):
+        tokens = DBNTokenizer().tokenize("Line 0 1 2 3")
+        span = DBNTokenSpan(tokens, 1, 4)
+        self.assertEqual(len(span), 3)
+        self.assertEqual([token.value for token in span], ['0', '1', '2'])
+        self.assertEqual((span[0].value, span[-1].value), ('0', '2'))
+        self.assertEqual([token.value for token in span[1:]], ['1', '2'])
+        self.assertRaises(IndexError, lambda: span[3])
+        self.assertRaises(IndexError, lambda: span[-4])
+        self.assertEqual(len(span + [tokens[0]]), 4)
+        self.assertEqual(([tokens[0]] + span)[0].value, 'Line')
+        self.assertEqual(len(DBNTokenSpan(tokens, 2, 2)), 0)
+
+    def test_nesting(self):
+        depth = 200
+        script = "Repeat A 0 1 {\n" * depth + "Set B 1\n" + "}\n" * depth
+        node = parse(script)
+        for _ in range(depth):
+            node = node.children[0].children[3]
+        self.assertEqual(node.children[0].type, 'set')
+
+    def test_unclosed_groupers(self):
+        self.assertEqual(len(parse("Repeat A 1 2 {\nSet B 1").children[0].children[3].children), 1)
+        self.assertEqual(parse("Line (1 + 2").children[0].children[0].name, '+')
+
+    def test_precedence_and_associativity(self):
+        def expression(string):
+            return shape(parse("Set A %s\n" % string).children[0].children[1])
+        self.assertEqual(expression("(10 - 2 - 3)"), ('-', [('-', ['10', '2']), '3']))
+        self.assertEqual(expression("(80 / 4 / 2)"), ('/', [('/', ['80', '4']), '2']))
+        self.assertEqual(expression("(8 / 2 * 2)"), ('*', [('/', ['8', '2']), '2']))
+        self.assertEqual(expression("(1 + 2 * 3 - 4)"), ('-', [('+', ['1', ('*', ['2', '3'])]), '4']))
+        self.assertEqual(expression("((1 + 2) * [3 4])"), ('*', [('+', ['1', '2']), ('bracket', ['3', '4'])]))
+        self.assertEqual(expression("(7)"), '7')
+
+    def test_errors(self):
+        for script in ["Set [1 2]\n", "Repeat {\n}\n", "Same? 1 {\n}\n", "Line ()\n", "Line (+)\n", "}\n",
+                       "Line (1 2)\n", "Line (- 1)\n", "Line (1 -)\n", "Line (1 - * 2)\n", "Line (1 , 2)\n"]:
+            self.assertRaises(ValueError, parse, script)
+
+
+if __name__ == "__main__":
+    unittest.main()
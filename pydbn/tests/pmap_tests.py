@@ -0,0 +1,82 @@
+from __future__ import absolute_import
+
+from pmap import DBNPersistentMap, DBNPersistentVector, DBNMutableVector
+
+import random
+import unittest
+
+
+class Colliding(object):
+    """
+    a key whose hash only depends on n % 3, so lots of them collide
+    """
+    def __init__(self, n):
+        self.n = n
+
+    def __hash__(self):
+        return [1, 33, -1][self.n % 3]
+
+    def __eq__(self, other):
+        return isinstance(other, Colliding) and other.n == self.n
+
+    def __ne__(self, other):
+        return not self == other
+
+
+class DBNPersistentMapTest(unittest.TestCase):
+    def test_like_a_dict(self):
+        generator = random.Random(1)
+        pmap, expected, older = DBNPersistentMap(), {}, []
+        for _ in range(2000):
+            key = generator.choice([generator.randint(-500, 500), 'name%d' % generator.randint(0, 300),
+                                    Colliding(generator.randint(0, 20)), generator.randint(0, 1 << 62)])
+            older.append((pmap, dict(expected)))
+            pmap = pmap.set(key, generator.random())
+            expected[key] = pmap[key]
+        self.assertEqual(len(pmap), len(expected))
+        self.assertEqual(dict(pmap.items()), expected)
+        for key in expected:
+            self.assertEqual(pmap.get(key), expected[key])
+        self.assertFalse('missing' in pmap)
+        self.assertRaises(KeyError, pmap.__getitem__, Colliding(21))
+        # and every map before is still what it was
+        for old, old_expected in older[::10]:
+            self.assertEqual(dict(old.items()), old_expected)
+
+    def test_update(self):
+        pmap = DBNPersistentMap().update({'a': 1, 'b': 2}).update([('b', 3), ('c', 4)])
+        self.assertEqual(dict(pmap.items()), {'a': 1, 'b': 3, 'c': 4})
+        self.assertEqual(len(pmap), 3)
+
+
+class DBNVectorTest(unittest.TestCase):
+    def test_persistent_vector(self):
+        vector = DBNPersistentVector()
+        first = vector.set(3, 'a')
+        second = first.set(5000, 'b').set(3, 'c')
+        self.assertEqual((vector.get(3), first.get(3), second.get(3)), (None, 'a', 'c'))
+        self.assertEqual(second.get(5000), 'b')
+        self.assertEqual(second.get(4999, 0), 0)
+        self.assertEqual(second.get(1 << 40, 0), 0)
+        self.assertEqual(second.items(), [(3, 'c'), (5000, 'b')])
+        self.assertTrue(second.copy() is second)
+
+    def test_shared_nodes(self):
+        vector = DBNPersistentVector()
+        for index in range(1000):
+            vector = vector.set(index, index)
+        changed = vector.set(999, 'x')
+        shared = [a is b for a, b in zip(vector.root, changed.root)]
+        self.assertEqual(shared.count(False), 1)
+
+    def test_mutable_vector(self):
+        vector = DBNMutableVector()
+        self.assertTrue(vector.set(40, 'a') is vector)
+        copy = vector.copy()
+        vector.set(40, 'b')
+        self.assertEqual((vector.get(40), copy.get(40), copy.get(41, 0)), ('b', 'a', 0))
+        self.assertEqual(copy.items(), [(40, 'a')])
+
+
+if __name__ == "__main__":
+    unittest.main()
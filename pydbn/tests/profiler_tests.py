@@ -0,0 +1,71 @@
+from __future__ import absolute_import
+
+import dbn
+import dbnast
+from profiler import DBNProfiler, profiling
+
+import json
+import unittest
+
+script = """Command Box X {
+  Line X X (X + 10) X
+  Set [X 0] 0
+}
+Repeat A 1 3 {
+  Box (A * 10)
+}
+Box 50
+"""
+
+
+class DBNProfilerTest(unittest.TestCase):
+    def profile(self, **options):
+        profiler = DBNProfiler()
+        dbn.run_script_text(script, profiler=profiler, **options)
+        return profiler
+
+    def test_counts(self):
+        for record_history in (True, False):
+            profiler = self.profile(record_history=record_history)
+            lines = profiler.lines
+            self.assertEqual(sorted(lines), [1, 2, 3, 5, 6, 8])
+            self.assertEqual(lines[2].calls, 4)
+            self.assertEqual(lines[6].calls, 3)
+            self.assertEqual(lines[2].self_pixels, 44)
+            self.assertEqual(lines[3].self_pixels, 4)
+            # the Repeat's own pixels are the ones its Box calls wrote
+            self.assertEqual((lines[5].pixels, lines[5].self_pixels), (36, 0))
+            self.assertEqual(profiler.commands['Box'].calls, 4)
+            self.assertEqual(profiler.commands['Line'].calls, 4)
+            self.assertEqual(profiler.commands['Box'].pixels, 48)
+
+    def test_times_and_states_add_up(self):
+        profiler = self.profile()
+        self.assertEqual(sum(entry.self_states for entry in profiler.lines.values()),
+                         sum(profiler.lines[line_no].states for line_no in (1, 5, 8)))
+        for entry in profiler.lines.values() + profiler.commands.values():
+            self.assertTrue(0 <= entry.self_time <= entry.time)
+        self.assertEqual(profiler.lines[8].states, profiler.commands['Box'].states // 4)
+        self.assertTrue(profiler.lines[8].states > 0)
+
+    def test_report_and_json(self):
+        profiler = self.profile()
+        report = profiler.report(script)
+        self.assertTrue("Line X X (X + 10) X" in report)
+        self.assertTrue(report.split('\n')[1].split()[0] in ('1', '2', '3', '5', '6', '8'))
+        loaded = json.loads(json.dumps(profiler.as_dict()))
+        self.assertEqual(loaded['lines']['2']['calls'], 4)
+        self.assertEqual(loaded['commands']['Box']['calls'], 4)
+
+    def test_only_while_on(self):
+        profiler = DBNProfiler()
+        with profiling(profiler):
+            self.assertTrue(dbnast.PROFILER is profiler)
+        self.assertEqual(dbnast.PROFILER, None)
+        dbn.run_script_text(script)
+        self.assertEqual(profiler.lines, {})
+        self.assertRaises(ValueError, dbn.run_script_text, script, engine='vm', profiler=profiler)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+from __future__ import absolute_import
+
+import multiprocessing.pool
+import os
+import signal
+import sys
+import threading
+import time
+import unittest
+
+# render_pool is next to web.py, above pydbn
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from render_pool import DBNRenderPool, DBNRenderPoolFull, DBNRenderError
+
+forever = "Repeat A 0 100000000 {\n  Set B A\n}\n"
+
+
+class DBNRenderPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = DBNRenderPool(1, queue_size=0, timeout=0.5)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def render_error(self, dbn_script):
+        try:
+            self.pool.render(dbn_script)
+        except DBNRenderError as e:
+            return e
+        self.fail("no error")
+
+    def test_png(self):
+        png = self.pool.render("Paper 50\nLine 0 0 100 100\n")
+        self.assertTrue(png.startswith('\x89PNG'))
+        self.assertEqual(self.pool.stats()['rendered'], 1)
+
+    def test_errors(self):
+        e = self.render_error("Line 0 0\n")
+        self.assertEqual(e.status, 'error')
+        self.assertTrue("Line requires 4 arguments" in str(e))
+        e = self.render_error(forever)
+        self.assertEqual(e.status, 'timeout')
+        stats = self.pool.stats()
+        self.assertEqual((stats['failed'], stats['timeouts'], stats['in_flight']), (1, 1, 0))
+
+    def test_full(self):
+        busy = threading.Thread(target=self.render_error, args=(forever,))
+        busy.start()
+        while self.pool.stats()['in_flight'] == 0:
+            time.sleep(0.01)
+        self.assertRaises(DBNRenderPoolFull, self.pool.render, "Paper 50\n")
+        busy.join()
+        self.assertEqual(self.pool.stats()['rejected'], 1)
+        # and there's room again once it's done
+        self.assertTrue(self.pool.render("Paper 50\n").startswith('\x89PNG'))
+
+    def test_stuck_worker(self):
+        workers = [process.pid for process in self.pool._pool._pool]
+        for pid in workers:
+            os.kill(pid, signal.SIGSTOP)
+        try:
+            start = time.time()
+            e = self.render_error("Paper 50\n")
+            self.assertEqual(e.status, 'timeout')
+            self.assertTrue(time.time() - start >= self.pool.hard_timeout)
+        finally:
+            for pid in workers:
+                os.kill(pid, signal.SIGCONT)
+        stats = self.pool.stats()
+        self.assertEqual((stats['restarts'], stats['in_flight']), (1, 0))
+        # the new workers are fine
+        self.assertTrue(self.pool.render("Paper 50\n").startswith('\x89PNG'))
+
+    def test_replaced_pool(self):
+        replaced = self.pool._pool
+        self.pool.restart(replaced)
+        while replaced._state == multiprocessing.pool.RUN:
+            time.sleep(0.01)
+        # as if the renders got the pool just before it was replaced
+        current, self.pool._pool = self.pool._pool, replaced
+        try:
+            for _ in range(2):  # the first one gave its place back
+                e = self.render_error("Paper 50\n")
+                self.assertEqual(e.status, 'error')
+                self.assertTrue("couldn't be started" in str(e))
+        finally:
+            self.pool._pool = current
+        stats = self.pool.stats()
+        self.assertEqual((stats['failed'], stats['in_flight']), (2, 0))
+        self.assertTrue(self.pool.render("Paper 50\n").startswith('\x89PNG'))
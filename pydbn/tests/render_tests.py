@@ -0,0 +1,56 @@
+from __future__ import absolute_import
+
+import dbn
+import render
+
+from PIL import Image
+
+import os
+import shutil
+import tempfile
+import unittest
+
+scripts = {
+    'line.dbn': "Paper 0\nLine 0 0 100 100\n",
+    os.path.join('sub', 'square.dbn'): "Repeat A 10 20 {\n  Line 10 A 20 A\n}\n",
+    'broken.dbn': "Set A\n",
+    'forever.dbn': "Repeat A 0 10000 {\n  Repeat B 0 10000 {\n    Set C B\n  }\n}\n",
+    'notes.txt': "not a script\n",
+}
+
+
+class DBNRenderTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.output = os.path.join(self.directory, 'out')
+        for name, text in scripts.items():
+            path = os.path.join(self.directory, 'in', name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            open(path, 'w').write(text)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_find_scripts(self):
+        found = render.find_scripts([os.path.join(self.directory, 'in'),
+                                     os.path.join(self.directory, 'in', '*.dbn')])
+        self.assertEqual(sorted(relative for _, relative in found),
+                         ['broken.dbn', 'forever.dbn', 'line.dbn', os.path.join('sub', 'square.dbn')])
+
+    def test_render_all(self):
+        found = render.find_scripts([os.path.join(self.directory, 'in')])
+        results = render.render_all(found, self.output, jobs=2, timeout=1)
+        statuses = dict((os.path.basename(result['path']), result['status']) for result in results)
+        self.assertEqual(statuses, {'broken.dbn': 'error', 'forever.dbn': 'timeout', 'line.dbn': 'ok', 'square.dbn': 'ok'})
+
+        image = Image.open(os.path.join(self.output, 'line.png'))
+        expected = dbn.run_script_text(scripts['line.dbn']).image._image
+        self.assertEqual(image.size, (101, 101))
+        self.assertEqual(image.tobytes(), expected.tobytes())
+        self.assertTrue(os.path.exists(os.path.join(self.output, 'sub', 'square.png')))
+        self.assertFalse(os.path.exists(os.path.join(self.output, 'broken.png')))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,200 @@
+from __future__ import absolute_import
+
+from dbnstate import DBNImage, DBNGhosts, DBNEnvironment
+from tokenizer import DBNTokenizer
+from parser import DBNParser
+import utils
+from structures import DBNStateWrapper, BUILTIN_FORMALS
+import dbn
+
+import copy
+import pickle
+import unittest
+
+
+class DBNImageTest(unittest.TestCase):
+    def test_set_pixel_leaves_parent_alone(self):
+        image = DBNImage(color=255)
+        changed = image.set_pixel(10, 20, 0)
+        self.assertEqual(image.query_pixel(10, 20), 255)
+        self.assertEqual(changed.query_pixel(10, 20), 0)
+
+    def test_untouched_tiles_are_shared(self):
+        image = DBNImage(color=255)
+        changed = image.set_pixel(0, 0, 0)
+        shared = [a is b for a, b in zip(image._tiles, changed._tiles)]
+        self.assertEqual(shared.count(False), 1)
+
+    def test_out_of_range_writes_are_ignored(self):
+        image = DBNImage(color=255).set_pixels([(101, 5, 0), (5, -1, 0)])
+        self.assertEqual(image._image.getextrema(), (255, 255))
+
+    def test_pil_image_matches_pixels(self):
+        points = [(x, (x * 7) % 101, x * 2) for x in range(101)]
+        image = DBNImage(color=80).set_pixels(points)
+        pil_image = image._image
+        for x, y, value in points:
+            self.assertEqual(pil_image.getpixel((x, y)), value)
+        self.assertEqual(pil_image.getpixel((1, 0)), 80)
+
+    def test_set_pixel_arrays(self):
+        xs = [5, 6, 5, 200, 40]
+        ys = [5, 6, 5, 5, 90]
+        image = DBNImage(color=255).set_pixels(xs, ys, [10, 20, 30, 40, 50])
+        self.assertEqual(image.query_pixel(5, 5), 30)  # the last write wins
+        self.assertEqual(image.query_pixel(6, 6), 20)
+        self.assertEqual(image.query_pixel(40, 90), 50)
+
+        image = DBNImage(color=255).set_pixels(xs, ys, 7)
+        self.assertEqual([image.query_pixel(x, y) for x, y in [(5, 5), (6, 6), (40, 90)]], [7, 7, 7])
+
+    def test_bresenham_arrays(self):
+        for ends in [(0, 0, 100, 100), (3, 90, 97, 12), (50, 50, 50, 50), (-20, 5, 130, 40), (7, 0, 9, 100)]:
+            xs, ys = utils.bresenham_arrays(*ends)
+            self.assertEqual(zip(xs.tolist(), ys.tolist()), list(utils.bresenham_line(*ends)))
+
+    def test_query_pixel_out_of_range(self):
+        image = DBNImage()
+        self.assertRaises(IndexError, image.query_pixel, 101, 0)
+        self.assertEqual(image.query_pixel(-1, -1), 255)
+
+    def test_bitmap_mode(self):
+        image = DBNImage(color=0, mode='1').set_pixel(3, 4, 1)
+        self.assertEqual(image._image.mode, '1')
+        self.assertEqual(image._image.getpixel((3, 4)), 255)
+
+
+class DBNGhostsTest(unittest.TestCase):
+    def test_render_matches_points(self):
+        ghosts = DBNGhosts().add_point(3, 0, (10, 20)).add_point(3, 0, (30, 40))
+        ghosts = ghosts.add_dimension_line(3, 1, 'horizontal', 10, 20)
+        self.assertEqual(sorted(ghosts.keys()), [(3, 0), (3, 1)])
+
+        image = ghosts.render((3, 0)).convert('L')
+        self.assertEqual(image.getpixel((10, 20)), 255)
+        self.assertEqual(image.getpixel((30, 40)), 255)
+        self.assertEqual(image.getpixel((20, 30)), 0)
+
+        image = ghosts.render((3, 1)).convert('L')
+        for x, y in utils.dimension_line('horizontal', 10, 20):
+            self.assertEqual(image.getpixel((x, y)), 255)
+
+    def test_copies_leave_parent_alone(self):
+        first = DBNGhosts().add_point(1, 0, (5, 5))
+        second = first.add_point(1, 0, (6, 6)).add_point(2, 0, (7, 7))
+        self.assertEqual(first.keys(), [(1, 0)])
+        self.assertEqual(first.render((1, 0)).convert('L').getpixel((6, 6)), 0)
+        self.assertEqual(second.render((1, 0)).convert('L').getpixel((6, 6)), 255)
+        # a copy shares the list heads until it adds to them
+        self.assertTrue(copy.copy(second)._ghost_hash is second._ghost_hash)
+
+    def test_renders_are_kept_per_copy(self):
+        ghosts = DBNGhosts().add_point(1, 0, (5, 5))
+        image = ghosts.render((1, 0))
+        self.assertTrue(ghosts.render((1, 0)) is image)
+        self.assertEqual(ghosts.add_point(2, 0, (6, 6))._rendered, {})
+
+    def test_blank_and_missing_ghosts(self):
+        ghosts = DBNGhosts().add_point(1, 0, (500, 5))
+        self.assertEqual(ghosts.keys(), [(1, 0)])
+        self.assertEqual(ghosts.render((1, 0)).getbbox(), None)
+        self.assertEqual(ghosts.render((2, 0)), None)
+
+
+class DBNEnvironmentTest(unittest.TestCase):
+    def test_set_leaves_parent_alone(self):
+        env = DBNEnvironment().set('A', 1)
+        changed = env.set('A', 2).set('B', 3)
+        self.assertEqual(env.variables(), {'A': 1})
+        self.assertEqual(changed.variables(), {'A': 2, 'B': 3})
+
+    def test_pushed_frames(self):
+        env = DBNEnvironment().set('A', 1).set('B', 2)
+        child = env.push(base_line_no=4).update({'B': 20, 'C': 30})
+        self.assertEqual((child.get('A'), child.get('B'), child.get('C')), (1, 20, 30))
+        self.assertEqual(child.get('nope', 0), 0)
+        self.assertTrue(child.pop() is env)
+        self.assertEqual(env.get('B'), 2)
+        self.assertEqual(env.get('C'), None)
+        self.assertEqual(child.delete('B').get('B'), 2)
+
+    def test_slots_newer_than_the_frame(self):
+        env = DBNEnvironment()
+        self.assertEqual(env.get('a name first seen just now'), None)
+        self.assertEqual(env.set('another new one', 5)['another new one'], 5)
+
+    def test_slots_per_script(self):
+        script = "Set B 1\nCommand Foo A {\n  Set C A\n}\nFoo 2\n"
+        for name in xrange(1000):
+            dbn.run_script_text("Set V%d 1\n" % name)
+        state = dbn.run_script_text(script, record_history=False)
+        # only the builtins' formals and the script's own names, whatever came before
+        self.assertEqual(len(state.env.symbols), len(BUILTIN_FORMALS) + 4)
+        self.assertTrue(len(state.env.values) <= len(state.env.symbols))
+        self.assertEqual(state.env.variables(), {'B': 1})
+
+
+class DBNPicklingTest(unittest.TestCase):
+    script = "Command Foo A {\n  Set B (A + 1)\n  Line 0 0 B B\n}\nRepeat I 0 5 {\n  Foo I\n}\n"
+    more = "Foo 40\nLine 0 0 10 (I * 2)\n"
+
+    def parse(self, script, symbols=None):
+        return DBNParser().parse(DBNTokenizer().tokenize(script), symbols)
+
+    def test_states_round_trip(self):
+        state = dbn.run_script_text(self.script)
+        more = self.parse(self.more, state.env.symbols)
+        expected = more.apply(state)
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            loaded = pickle.loads(pickle.dumps(state, protocol))
+            self.assertEqual(loaded.env.variables(), {'I': 5})
+            self.assertEqual(loaded.previous.step, state.previous.step)
+            # and it carries on the same, builtins and Foo included
+            result = self.parse(self.more, loaded.env.symbols).apply(loaded)
+            self.assertTrue((result.image.as_array() == expected.image.as_array()).all())
+
+    def test_trees_round_trip(self):
+        tree = self.parse(self.script)
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            loaded = pickle.loads(pickle.dumps(tree, protocol))
+            self.assertEqual(loaded.tokens[0].value, 'Command')
+            self.assertEqual(loaded.children[1].children[0].slot, tree.children[1].children[0].slot)
+
+    def test_copies_are_shallow(self):
+        state = dbn.run_script_text(self.script)
+        copied = copy.copy(state)
+        self.assertTrue(copied.env is state.env)
+        self.assertTrue(copied.image is state.image)
+        self.assertFalse(hasattr(state, '__dict__'))
+
+
+class DBNStateWrapperTest(unittest.TestCase):
+    def setUp(self):
+        self.end = dbn.run_script_text("Repeat A 0 90 {\n  Set [A A] A\n}\n")
+        self.states = []
+        state = self.end
+        while state.previous is not None:
+            self.states.append(state)
+            state = state.previous
+        self.states.reverse()  # without the nubile first state
+
+    def test_length_and_cursor_index(self):
+        wrapper = DBNStateWrapper(self.end)
+        self.assertEqual(len(wrapper), len(self.states) - 1)
+        self.assertEqual(wrapper.cursor_index, len(wrapper))
+
+    def test_seek(self):
+        wrapper = DBNStateWrapper(self.end)
+        for n in [0, 1, 63, 64, 65, 200, len(wrapper)]:
+            wrapper.seek(n)
+            self.assertTrue(wrapper.cursor is self.states[n])
+            self.assertEqual(wrapper.cursor_index, n)
+
+    def test_seek_out_of_range(self):
+        wrapper = DBNStateWrapper(self.end)
+        self.assertRaises(IndexError, wrapper.seek, len(wrapper) + 1)
+        self.assertRaises(IndexError, wrapper.seek, -1)
+
+
+if __name__ == "__main__":
+    unittest.main()
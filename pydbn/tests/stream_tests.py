@@ -0,0 +1,74 @@
+from __future__ import absolute_import
+
+import dbn
+from dbnstate import DBNInterpreterState
+from stream import stream_states
+
+import pickle
+import threading
+import unittest
+
+script = """Set B 5
+Command Dot X Y {
+  Set [X Y] B
+}
+Repeat A 0 20 {
+  Dot A A
+  Line A 0 A 100
+}
+"""
+
+forever = """Repeat A 0 100000000 {
+  Set B A
+}
+"""
+
+
+def history(state):
+    while state.previous is not None:
+        state = state.previous
+    states = []
+    while state is not None:
+        states.append(state)
+        state = state.next
+    return states
+
+
+class DBNStreamTest(unittest.TestCase):
+    def test_same_states(self):
+        for engine in ('tree', 'vm'):
+            for optimize in (False, True):
+                expected = history(dbn.run_script_text(script, engine=engine, optimize=optimize))
+                got = list(stream_states(script, buffer_size=2, engine=engine, optimize=optimize))
+                self.assertEqual([state.line_no for state in got], [state.line_no for state in expected])
+                self.assertEqual([state.step for state in got], range(len(expected)))
+                self.assertEqual(got[-1].image._image.tobytes(), expected[-1].image._image.tobytes())
+                self.assertEqual(got[-1].lookup_variable('A'), expected[-1].lookup_variable('A'))
+
+    def test_not_linked(self):
+        states = list(stream_states(script))
+        for state in states:
+            self.assertTrue(state.next is None)
+            self.assertTrue(state.previous is None)
+            self.assertTrue(state.ghosts is None)
+        # they're still immutable, so an early one is as it was
+        paper = DBNInterpreterState().image.query_pixel(3, 3)
+        self.assertEqual(states[0].image.query_pixel(3, 3), paper)
+        self.assertNotEqual(states[-1].image.query_pixel(3, 3), paper)
+        self.assertEqual(pickle.loads(pickle.dumps(states[-1], 2)).line_no, states[-1].line_no)
+
+    def test_starts_before_the_run_is_done(self):
+        states = stream_states(forever, buffer_size=4)
+        first = next(states)
+        self.assertEqual(first.step, 0)
+        self.assertEqual(next(states).step, 1)
+        states.close()
+        # closing it stops the run
+        self.assertEqual([thread for thread in threading.enumerate() if thread.name == "dbn stream"], [])
+
+    def test_errors(self):
+        states = stream_states("Set B 5\nLine 0 0\n")
+        self.assertEqual(next(states).step, 0)
+        self.assertRaises(ValueError, list, states)
+        self.assertRaises(ValueError, stream_states, script, record_history=False)
+        self.assertRaises(ValueError, stream_states, script, engine='python')
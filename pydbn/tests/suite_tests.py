@@ -0,0 +1,50 @@
+from __future__ import absolute_import
+
+from benchmarks import suite
+
+import unittest
+
+
+def results(repeat=3, **scripts):
+    return {'repeat': repeat, 'scripts': scripts}
+
+
+def timings(tokenize=0.05, parse=0.05, execute=0.5, render=0.05, peak_kb=8192):
+    return {'tokenize': tokenize, 'parse': parse, 'execute': execute,
+            'render': render, 'peak_kb': peak_kb, 'tokens': 100, 'states': 1000}
+
+
+class DBNSuiteTest(unittest.TestCase):
+    def test_real_regression(self):
+        baseline = results(square=timings())
+        found = suite.regressions(results(square=timings(execute=0.8, peak_kb=20000)), baseline)
+        self.assertEqual(found, [('square', 'execute', 0.5, 0.8), ('square', 'peak_kb', 8192, 20000)])
+
+    def test_noise(self):
+        baseline = results(square=timings(), tiny=timings(execute=0.004))
+        # under the threshold
+        self.assertEqual(suite.regressions(results(square=timings(execute=0.55), tiny=timings(execute=0.004)), baseline), [])
+        # over it, but by less than the minimum, or from under the minimum
+        now = results(square=timings(tokenize=0.059), tiny=timings(execute=0.009))
+        self.assertEqual(suite.regressions(now, baseline), [])
+        # and faster is fine
+        self.assertEqual(suite.regressions(results(square=timings(execute=0.1), tiny=timings()), baseline), [])
+
+    def test_broken_and_missing_scripts(self):
+        baseline = results(square=timings(), spiral=timings(), broken={'error': 'ValueError: nope'})
+        now = results(square={'error': 'ValueError: Command Foo not found!'}, broken={'error': 'ValueError: nope'})
+        self.assertEqual(suite.regressions(now, baseline), [
+            ('spiral', 'error', None, 'missing'),
+            ('square', 'error', None, 'ValueError: Command Foo not found!'),
+        ])
+        # a script that's new, or that still fails, isn't one
+        self.assertEqual(suite.regressions(results(square=timings(), spiral=timings(), new=timings()), baseline), [])
+
+    def test_needs_enough_repeats(self):
+        self.assertRaises(ValueError, suite.regressions, results(1, square=timings()), results(square=timings()))
+        self.assertRaises(ValueError, suite.regressions, results(square=timings()), results(2, square=timings()))
+        self.assertRaises(ValueError, suite.regressions, results(square=timings()), {'scripts': {}})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -18,6 +18,62 @@ class TokenizerTest(unittest.TestCase):
     def test_bad_token(self):
         self.assertRaises(ValueError, tokenizer_tester, bad_input)
 
+    def test_bad_token_location(self):
+        self.assertRaisesRegexp(ValueError, "token : at 4:1", tokenizer_tester, bad_input)
+        self.assertRaisesRegexp(ValueError, "token \\$ at 1:9", tokenizer_tester, "Set A (5$2)")
+        # the tokens before it still come out of tokenizeiter
+        tokens = DBNTokenizer().tokenizeiter("Pen 0\n: Goo")
+        self.assertEqual([next(tokens).type for _ in range(3)], ['WORD', 'NUMBER', 'NEWLINE'])
+        self.assertRaises(ValueError, next, tokens)
+
+    def test_locations(self):
+        tokens = DBNTokenizer().tokenize("Set A 5\n\n  Line 0 0 (A*20) 10\nSame? A 5 {")
+        self.assertEqual([(token.line_no, token.char_no) for token in tokens], [
+            (1, 1), (1, 5), (1, 7), (1, 8),
+            (2, 1),
+            (3, 3), (3, 8), (3, 10), (3, 12), (3, 13), (3, 14), (3, 15), (3, 17), (3, 19), (3, 21),
+            (4, 1), (4, 7), (4, 9), (4, 11),
+        ])
+        line, number = tokens[5], tokens[11]
+        self.assertEqual((line.value, line.raw, line.end_char_no), ('Line', 'Line', 7))
+        self.assertEqual((number.value, number.raw, number.end_char_no), ('20', '20', 17))
+        question = tokens[15]
+        self.assertEqual((question.type, question.value, question.raw), ('QUESTION', 'Same', 'Same?'))
+        self.assertEqual((tokens[3].value, tokens[3].raw), ('', '\n'))
+
+    def test_comments(self):
+        tokens = DBNTokenizer().tokenize("//first\nSet A 5 // set A\n  // indented\nPen A//no space")
+        self.assertEqual([(token.type, token.line_no) for token in tokens], [
+            ('NEWLINE', 1),
+            ('SET', 2), ('WORD', 2), ('NUMBER', 2), ('NEWLINE', 2),
+            ('NEWLINE', 3),
+            ('WORD', 4), ('WORD', 4),
+        ])
+        self.assertEqual(tokens[-1].char_no, 5)
+
+    def test_empty_input(self):
+        self.assertEqual(tokenizer_tester(""), [])
+        self.assertEqual(tokenizer_tester("  \t// nothing here"), [])
+
+    def test_register(self):
+        tokenizer = DBNTokenizer().register('COLON', r'(:)')
+        # registered after the catch all, so it never wins
+        self.assertRaises(ValueError, tokenizer.tokenize, ": Goo")
+        tokenizer = DBNTokenizer()
+        tokenizer.token_types.insert(-1, ('COLON', r'(:)'))
+        self.assertEqual([(token.type, token.value) for token in tokenizer.tokenize(": Goo")],
+                         [('COLON', ':'), ('WORD', 'Goo')])
+        # and the plain tokenizer is left alone
+        self.assertRaises(ValueError, tokenizer_tester, ": Goo")
+
+    def test_classify(self):
+        tokenizer = DBNTokenizer()
+        self.assertEqual(tokenizer.classify("Repeat"), ('REPEAT', 'Repeat'))
+        self.assertEqual(tokenizer.classify("NotSmaller?"), ('QUESTION', 'NotSmaller'))
+        self.assertEqual(tokenizer.classify("\n"), ('NEWLINE', ''))
+        self.assertEqual(tokenizer.classify("Woof"), ('WORD', 'Woof'))
+        self.assertRaises(ValueError, tokenizer.classify, ":")
+
 
 teststring1 = """horse ("""
 
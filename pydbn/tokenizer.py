@@ -1,10 +1,14 @@
 import re
 
+from structures import DBNSlotted
 
-class DBNToken:
+
+class DBNToken(DBNSlotted):
     """
     data encapsulation of a token
     """
+    __slots__ = ('type', 'value', 'line_no', 'char_no', 'raw')
+
     def __init__(self, type_, value, line_no, char_no, raw):
         """
         saves the given arguments as like-named attributes
@@ -21,7 +25,7 @@ class DBNToken:
         self.char_no = char_no
 
         self.raw = raw
-        
+
     def get_end_char_no(self):
         return self.char_no + len(self.value)
     end_char_no = property(get_end_char_no)
@@ -36,45 +40,55 @@ class DBNToken:
 
 
 class DBNTokenizer:
+    """
+    every token pattern is one alternative of a master regex, as a named
+    group, so the type of a match is just its lastgroup. the master regex
+    is compiled the first time a set of patterns is used, and shared by
+    every tokenizer with the same patterns
+    """
 
-    def __init__(self):
-        """
-        initializes the tokenizer to a newborn state,
-        then registers the DBNTokenTypes
-        """
-        self.type_re_pairs = []
-        self.raw_patterns = []
-
+    # (type_, pattern) in the order they are tried
+    # the value of a token is the pattern's first group, or ''
+    TOKEN_TYPES = [
         # comment, whitespace garbage first
-        self.register('COMMENT',      r'//(.+)')
-        self.register('WHITESPACE',   r'[^\S\n]+')
+        ('COMMENT',      r'//(.+)'),
+        ('WHITESPACE',   r'[^\S\n]+'),
 
         # operators next
-        self.register('OPERATOR',     r'([*-/+])')
+        ('OPERATOR',     r'([*-/+])'),
 
         # the groupers
-        self.register('OPENPAREN',    r'(\()')
-        self.register('OPENBRACKET',  r'(\[)')
-        self.register('OPENBRACE',    r'({)')
-        self.register('CLOSEPAREN',   r'(\))')
-        self.register('CLOSEBRACKET', r'(\])')
-        self.register('CLOSEBRACE',   r'(})')
+        ('OPENPAREN',    r'(\()'),
+        ('OPENBRACKET',  r'(\[)'),
+        ('OPENBRACE',    r'({)'),
+        ('CLOSEPAREN',   r'(\))'),
+        ('CLOSEBRACKET', r'(\])'),
+        ('CLOSEBRACE',   r'(})'),
 
         # then keywords
-        self.register('SET',          r'(Set)')
-        self.register('REPEAT',       r'(Repeat)')
-        self.register('QUESTION',     r'(Same|NotSame|Smaller|NotSmaller)\?'),
-        self.register('COMMAND',      r'(Command)'),
+        ('SET',          r'(Set)'),
+        ('REPEAT',       r'(Repeat)'),
+        ('QUESTION',     r'(Same|NotSame|Smaller|NotSmaller)\?'),
+        ('COMMAND',      r'(Command)'),
 
         # then literals
-        self.register('WORD',         r'([A-z_][\w\d]*)')
-        self.register('NUMBER',       r'(\d+)')
+        ('WORD',         r'([A-z_][\w\d]*)'),
+        ('NUMBER',       r'(\d+)'),
 
         # then newline (command seperator)
-        self.register('NEWLINE',      r'\n')
+        ('NEWLINE',      r'\n'),
 
         # then everything else... we need this to catch illegal tokens
-        self.register(None,           r".")
+        (None,           r"."),
+    ]
+
+    _compiled = {}  # tuple of TOKEN_TYPES -> (master re, group name -> (type_, value group))
+
+    def __init__(self):
+        """
+        initializes the tokenizer with the DBN token types
+        """
+        self.token_types = list(self.TOKEN_TYPES)
 
     def register(self, type_, type_pattern):
         """
@@ -84,23 +98,40 @@ class DBNTokenizer:
         if type_ is None, then it will not be registered as
         a token type for classification purposes
         """
-        self.raw_patterns.append(type_pattern)
-
-        if type_ is not None:
-            type_re = re.compile(type_pattern)
-            type_re_pair = (type_, type_re)
-            self.type_re_pairs.append(type_re_pair)
-
+        self.token_types.append((type_, type_pattern))
         return self
 
+    def compiled(self):
+        """
+        returns the master re, and a dict from its group names
+        to (type_, the group number of the value or None)
+        """
+        key = tuple(self.token_types)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            alternatives = []
+            groups = {}
+            group_no = 1
+            for index, (type_, type_pattern) in enumerate(self.token_types):
+                name = 't%d' % index
+                alternatives.append('(?P<%s>%s)' % (name, type_pattern))
+                inner_groups = re.compile(type_pattern).groups
+                groups[name] = (type_, group_no + 1 if inner_groups else None)
+                group_no += 1 + inner_groups
+            compiled = (re.compile('|'.join(alternatives)), groups)
+            self._compiled[key] = compiled
+        return compiled
+
     def classify(self, token_string):
         """
         given a string matching a token, returns
         a tuple of its (type_, value)
         we try token types in the order they were registered
         """
-        for type_, type_re in self.type_re_pairs:
-            match = type_re.match(token_string)
+        for type_, type_pattern in self.token_types:
+            if type_ is None:
+                continue
+            match = re.match(type_pattern, token_string)
             if match:
                 try:
                     value = match.group(1)
@@ -114,8 +145,7 @@ class DBNTokenizer:
         """
         returns a re matching all token types (in order)
         """
-        token_pattern = "|".join(self.raw_patterns)
-        return re.compile(token_pattern)
+        return self.compiled()[0]
 
     def tokenizeiter(self, string):
         """
@@ -127,21 +157,27 @@ class DBNTokenizer:
         # the absolute character number at which the current line begins:
         line_start_char_no = 0
 
-        token_re = self.token_re()
-        token_string_iter = token_re.finditer(string)
+        token_re, groups = self.compiled()
+
+        for token_match in token_re.finditer(string):
+            token_type, value_group = groups[token_match.lastgroup]
+            if token_type == 'WHITESPACE' or token_type == 'COMMENT':
+                continue
 
-        for token_match in token_string_iter:
             token_string = token_match.group(0)  # the whole matching string
 
             # character number of the token; plus 1 becaue of 0 indexing
             token_char_no = token_match.start() - line_start_char_no + 1
 
-            try:
-                token_type, token_value = self.classify(token_string)
-            except ValueError as e:
-                raise ValueError(str(e) + " at %d:%d" % (line_no, token_char_no))
+            if token_type is None:
+                raise ValueError("No matching token type for token %s at %d:%d" % (token_string, line_no, token_char_no))
+
+            if value_group is None:
+                token_value = ''
+            else:
+                token_value = token_match.group(value_group)
 
-            token = DBNToken(
+            yield DBNToken(
                 token_type,
                 token_value,
                 line_no,
@@ -149,14 +185,9 @@ class DBNTokenizer:
                 token_string
             )
 
-            if token.type == 'NEWLINE':
+            if token_type == 'NEWLINE':
                 line_no += 1
                 line_start_char_no = token_match.end()
 
-            if not token.type == 'WHITESPACE' and not token.type == 'COMMENT':
-                yield token
-
-        raise StopIteration
-
     def tokenize(self, string):
         return list(self.tokenizeiter(string))
@@ -1,3 +1,4 @@
+import numpy
 
 
 def clip(val, lower, upper):
@@ -15,12 +16,26 @@ def clip_100(val):
 def clip_255(val):
     return clip(val, 0, 255)
 
-def scale_100(val):
+def _scale_100(val):
     #takes the value given, between 0 - 100,
     # and scales it from 0 - 255
     scaled_val = 255 - int(val * (255.0/100))
     return clip_255(scaled_val)
 
+SCALED_100 = [_scale_100(val) for val in range(101)]
+
+def scale_100(val):
+    if 0 <= val <= 100 and val == int(val):
+        return SCALED_100[int(val)]
+    return _scale_100(val)
+
+def scale_100_array(values):
+    """
+    scale_100 for a numpy array of values, returns a uint8 array
+    """
+    scaled = 255 - numpy.trunc(numpy.asarray(values) * (255.0/100))
+    return numpy.clip(scaled, 0, 255).astype(numpy.uint8)
+
 def pixel_to_coord(pixel, direction):
     if direction == 'x':
         return pixel
@@ -62,10 +77,47 @@ def bresenham_line(x0, y0, x1, y1):
             y = y + ystep
             error = error - deltax
     raise StopIteration
+
+def bresenham_arrays(x0, y0, x1, y1):
+    """
+    the points of bresenham_line, in the same order, as two numpy arrays (xs, ys)
+    """
+    steep = abs(y1 - y0) > abs(x1 - x0)
+    if steep:
+        x0, y0 = y0, x0  
+        x1, y1 = y1, x1
+
+    if x0 > x1:
+        x0, x1 = x1, x0
+        y0, y1 = y1, y0
+
+    if y0 < y1: 
+        ystep = 1
+    else:
+        ystep = -1
+
+    deltax = x1 - x0
+    deltay = abs(y1 - y0)
+    error = -deltax / 2
     
-def dimension_line(direction, x, y):
-    """'
-    yields the points for a direction line
+    xs = numpy.arange(x0, x1 + 1)
+    if deltax == 0:
+        ys = numpy.array([y0])
+    else:
+        # the loop above steps y whenever the error goes positive, so
+        # before the kth point it has stepped ceil((error + k * deltay) / deltax) times
+        k = numpy.arange(deltax + 1)
+        steps = numpy.maximum(0, -((-(error + k * deltay)) // deltax))
+        ys = y0 + ystep * steps
+
+    if steep:
+        return ys, xs
+    return xs, ys
+    
+def dimension_line_ends(direction, x, y):
+    """
+    returns the (x1, y1, x2, y2) ends of the three lines
+    that make up a dimension line
     """ 
     L = 2 # end size in pixels (half the end size, actually)
     if direction == 'horizontal':
@@ -102,13 +154,24 @@ def dimension_line(direction, x, y):
         d2_x2 = x + L
         d2_y2 = y
         
-    lines = [
+    return [
         (l_x1, l_y1, l_x2, l_y2),
         (d1_x1, d1_y1, d1_x2, d1_y2),
         (d2_x1, d2_y1, d2_x2, d2_y2),
     ]
     
-    for line_points in lines:
+def dimension_line(direction, x, y):
+    """'
+    yields the points for a direction line
+    """ 
+    for line_points in dimension_line_ends(direction, x, y):
         for point in bresenham_line(*line_points):
             yield point
-    raise StopIteration
\ No newline at end of file
+    raise StopIteration
+
+def dimension_line_arrays(direction, x, y):
+    """
+    the points of dimension_line, as two numpy arrays (xs, ys)
+    """
+    lines = [bresenham_arrays(*line_points) for line_points in dimension_line_ends(direction, x, y)]
+    return numpy.concatenate([xs for xs, _ in lines]), numpy.concatenate([ys for _, ys in lines])
@@ -0,0 +1,120 @@
+"""
+load tests /render: sends the scripts in test_dbns (round and round)
+from some threads at once, and reports throughput, latencies and what
+came back
+
+    python web.py &
+    python render_load.py [-n REQUESTS] [-c CONCURRENCY] [--url URL]
+
+--direct skips the web server, and sends them straight to a
+DBNRenderPool in this process instead
+"""
+import glob
+import os
+import sys
+import threading
+import time
+import urllib2
+from optparse import OptionParser
+
+from render_pool import DBNRenderPool, DBNRenderPoolFull, DBNRenderError
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_dbns')
+
+option_parser = OptionParser(usage="python render_load.py [options]")
+option_parser.add_option('-n', '--requests', type="int", dest="requests", help="how many renders (default 200)", default=200)
+option_parser.add_option('-c', '--concurrency', type="int", dest="concurrency", help="how many at once (default 8)", default=8)
+option_parser.add_option('--url', dest="url", help="where /render is (default http://localhost:4000/render)", default="http://localhost:4000/render")
+option_parser.add_option('--direct', action="store_true", dest="direct", help="use a DBNRenderPool here instead of the server", default=False)
+option_parser.add_option('-w', '--workers', type="int", dest="workers", help="with --direct, how many workers (default one per cpu)", default=None)
+
+
+def corpus():
+    paths = glob.glob(os.path.join(CORPUS_DIR, '*.dbn')) + glob.glob(os.path.join(CORPUS_DIR, '*', '*.dbn'))
+    return [open(path).read() for path in sorted(paths)]
+
+
+def post(url):
+    def send(dbn_script):
+        try:
+            response = urllib2.urlopen(url, dbn_script)
+            response.read()
+            return response.getcode()
+        except urllib2.HTTPError as e:
+            return e.code
+    return send
+
+
+def send_to(pool):
+    codes = {'error': 400, 'memory': 400, 'timeout': 504}
+    def send(dbn_script):
+        try:
+            pool.render(dbn_script)
+            return 200
+        except DBNRenderPoolFull:
+            return 503
+        except DBNRenderError as e:
+            return codes[e.status]
+    return send
+
+
+def load(send, scripts, requests, concurrency):
+    """
+    returns (seconds, latencies of every request, {status code: count})
+    """
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    counter = iter(xrange(requests))
+
+    def worker():
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            start = time.time()
+            status = send(scripts[index % len(scripts)])
+            elapsed = time.time() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.time()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.time() - start, latencies, statuses
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main(args):
+    options, _ = option_parser.parse_args(args)
+    pool = None
+    if options.direct:
+        pool = DBNRenderPool(options.workers, queue_size=options.concurrency)
+        send = send_to(pool)
+    else:
+        send = post(options.url)
+
+    try:
+        elapsed, latencies, statuses = load(send, corpus(), options.requests, options.concurrency)
+    finally:
+        if pool is not None:
+            pool.close()
+
+    print "%d requests, %d at a time, in %.2fs: %.1f a second" % (
+        options.requests, options.concurrency, elapsed, options.requests / elapsed)
+    print "latency: 50%% %.3fs, 95%% %.3fs, 99%% %.3fs, max %.3fs" % (
+        percentile(latencies, 0.5), percentile(latencies, 0.95), percentile(latencies, 0.99), max(latencies))
+    print "statuses: %s" % ', '.join("%d x %d" % (status, count) for status, count in sorted(statuses.items()))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
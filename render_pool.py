@@ -0,0 +1,189 @@
+"""
+a pool of worker processes that render scripts to PNGs, for web.py's /render
+
+the workers start with the pool, and each one renders a little script
+before taking requests, so the first real one doesn't pay for warming
+up. a render runs in a worker with pydbn.render's limits: the pool's
+timeout, and memory MB on top of what the worker started with
+
+at most workers + queue_size renders are running or waiting at once,
+the one after that is turned away (DBNRenderPoolFull) instead of
+queueing behind them. a render keeps its place until its worker is
+done with it, not just until the request gives up on it
+
+a worker stops a script itself, so a render that isn't done in
+hard_timeout (the time the renders ahead of it could take) has a stuck
+worker. the pool is then replaced with a new one, and every render
+still in the old one fails with a timeout
+"""
+import multiprocessing
+import threading
+
+from pydbn import render
+
+WARM_UP_SCRIPT = "Paper 10\nPen 90\nLine 0 0 100 100\n"
+
+
+class DBNRenderPoolFull(Exception):
+    pass
+
+
+class DBNRenderError(Exception):
+    """
+    a script that failed, or went over its limits. status is error,
+    timeout or memory, like pydbn.render's results
+    """
+
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+def init_worker(memory):
+    render.init_worker(memory)
+    render.render_png(WARM_UP_SCRIPT)
+
+
+class DBNRenderJob(object):
+    """
+    a render the pool has taken. done is set once result is there
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.done = threading.Event()
+        self.result = None
+
+
+class DBNRenderPool:
+    """
+    workers is how many processes (None for one per cpu)
+    queue_size is how many renders can wait for one
+    timeout is how many seconds a render can run
+    memory is how many MB a render can use (0 for no limit)
+    """
+
+    def __init__(self, workers=None, queue_size=16, timeout=5.0, memory=256, engine='tree'):
+        if queue_size < 0:
+            raise ValueError("Render queue size can't be negative, not %d" % queue_size)
+        self.workers = workers or multiprocessing.cpu_count()
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.memory = memory
+        self.engine = engine
+        # every render ahead of it on its worker, and itself, taking as long as they can
+        self.hard_timeout = (timeout + render.TIMER_GRACE) * (queue_size // self.workers + 2)
+        self._pool = self.new_pool()
+        self._slots = threading.BoundedSemaphore(self.workers + queue_size)
+        self._lock = threading.Lock()
+        self._jobs = set()
+
+        self.in_flight = 0
+        self.rendered = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.restarts = 0
+
+    def new_pool(self):
+        return multiprocessing.Pool(self.workers, init_worker, (self.memory,))
+
+    def render(self, dbn_script):
+        """
+        returns the PNG of dbn_script, or raises DBNRenderPoolFull or DBNRenderError
+        """
+        if not self._slots.acquire(False):
+            with self._lock:
+                self.rejected += 1
+            raise DBNRenderPoolFull("%d renders are already running or waiting" % (self.workers + self.queue_size))
+
+        with self._lock:
+            job = DBNRenderJob(self._pool)
+            self._jobs.add(job)
+            self.in_flight += 1
+        try:
+            job.pool.apply_async(render.png_job, ((dbn_script, self.timeout, self.engine),),
+                                 callback=lambda result: self.finish(job, result))
+        except Exception as e:
+            # the pool was closed, or replaced and stopped since (then the job's already done)
+            self.finish(job, {'status': 'error', 'error': "the render couldn't be started: %s" % e})
+
+        if not job.done.wait(self.hard_timeout):
+            self.restart(job.pool)
+        job.done.wait()
+        result = job.result
+
+        with self._lock:
+            if result['status'] == 'ok':
+                self.rendered += 1
+            elif result['status'] == 'timeout':
+                self.timeouts += 1
+            else:
+                self.failed += 1
+        if result['status'] != 'ok':
+            raise DBNRenderError(result['status'], result['error'])
+        return result['value']
+
+    def finish(self, job, result):
+        """
+        job is done (its worker's callback, or the pool it was in is gone):
+        gives its place to the next render. only the first call counts
+        """
+        with self._lock:
+            if job not in self._jobs:
+                return
+            self._jobs.remove(job)
+            self.in_flight -= 1
+        job.result = result
+        job.done.set()
+        self._slots.release()
+
+    def restart(self, pool):
+        """
+        replaces pool, which has a stuck worker, with a new one (unless
+        that's been done already), and fails the renders that were in it
+        """
+        with self._lock:
+            if self._pool is not pool:
+                return
+        new_pool = self.new_pool()
+        with self._lock:
+            if self._pool is not pool:
+                orphans = None
+            else:
+                self._pool = new_pool
+                self.restarts += 1
+                orphans = [job for job in self._jobs if job.pool is pool]
+        if orphans is None:
+            new_pool.terminate()
+            return
+
+        # the stuck worker might not go quietly, so don't wait for it
+        stopper = threading.Thread(target=pool.terminate, name="render pool stopper")
+        stopper.daemon = True
+        stopper.start()
+        for job in orphans:
+            self.finish(job, {'status': 'timeout', 'error': "a worker got stuck, no render was done in %gs" % self.hard_timeout})
+
+    def close(self):
+        with self._lock:
+            pool = self._pool
+            orphans = list(self._jobs)
+        pool.terminate()
+        pool.join()
+        for job in orphans:
+            self.finish(job, {'status': 'error', 'error': "the render pool was closed"})
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'timeout': self.timeout,
+                'in_flight': self.in_flight,
+                'rendered': self.rendered,
+                'failed': self.failed,
+                'timeouts': self.timeouts,
+                'rejected': self.rejected,
+                'restarts': self.restarts,
+            }
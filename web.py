@@ -1,7 +1,11 @@
+import os
+
 import flask
 
 import pydbn
 import js_shim
+from compile_cache import DBNCompileCache, source_version
+from render_pool import DBNRenderPool, DBNRenderPoolFull, DBNRenderError
 
 app = flask.Flask(__name__)
 app.debug = True
@@ -9,15 +13,61 @@ app.debug = True
 tokenizer = pydbn.tokenizer.DBNTokenizer()
 parser = pydbn.parser.DBNParser()
 
+# how many compiled scripts to keep in memory, and where to keep them on disk
+COMPILE_CACHE_SIZE = int(os.environ.get('DBN_COMPILE_CACHE_SIZE', 256))
+COMPILE_CACHE_DIR = os.environ.get('DBN_COMPILE_CACHE_DIR') or None
+COMPILE_CACHE_DISK_SIZE = int(os.environ.get('DBN_COMPILE_CACHE_DISK_SIZE', 4096))
+# compiled scripts from before the compiler last changed aren't used
+COMPILER_VERSION = source_version(pydbn.tokenizer, pydbn.parser, pydbn.dbnast, js_shim)
+
+def compile_script(dbn_script):
+    tokens = tokenizer.tokenize(dbn_script)
+    dbn_ast = parser.parse(tokens)
+    return js_shim.pydbn2dbnjs(dbn_ast)
+
+compile_cache = DBNCompileCache(compile_script, size=COMPILE_CACHE_SIZE, directory=COMPILE_CACHE_DIR,
+                                disk_size=COMPILE_CACHE_DISK_SIZE, version=COMPILER_VERSION)
+
 @app.route('/compile', methods=('POST',))
 def index():
     dbn_script = flask.request.stream.read()
     try:
-        tokens = tokenizer.tokenize(dbn_script)
-        dbn_ast = parser.parse(tokens)
-        return js_shim.pydbn2dbnjs(dbn_ast)
+        return compile_cache.compile(dbn_script)
     except Exception as e:
         return "null;"
 
+@app.route('/compile/stats')
+def compile_stats():
+    return flask.jsonify(compile_cache.stats())
+
+# how many processes render scripts (0 for one per cpu), how many renders
+# can wait for one, and how long (seconds) and how big (MB) a render can get
+RENDER_WORKERS = int(os.environ.get('DBN_RENDER_WORKERS', 0)) or None
+RENDER_QUEUE_SIZE = int(os.environ.get('DBN_RENDER_QUEUE_SIZE', 16))
+RENDER_TIMEOUT = float(os.environ.get('DBN_RENDER_TIMEOUT', 5))
+RENDER_MEMORY = int(os.environ.get('DBN_RENDER_MEMORY', 256))
+
+render_pool = DBNRenderPool(RENDER_WORKERS, queue_size=RENDER_QUEUE_SIZE, timeout=RENDER_TIMEOUT, memory=RENDER_MEMORY)
+
+# the script's fault, or it went over its limits
+RENDER_ERROR_CODES = {'error': 400, 'memory': 400, 'timeout': 504}
+
+@app.route('/render', methods=('POST',))
+def render():
+    dbn_script = flask.request.stream.read()
+    try:
+        png = render_pool.render(dbn_script)
+    except DBNRenderPoolFull as e:
+        return flask.Response(str(e) + "\n", status=503, mimetype='text/plain', headers={'Retry-After': '1'})
+    except DBNRenderError as e:
+        return flask.Response(str(e) + "\n", status=RENDER_ERROR_CODES[e.status], mimetype='text/plain')
+    return flask.Response(png, mimetype='image/png')
+
+@app.route('/render/stats')
+def render_stats():
+    return flask.jsonify(render_pool.stats())
+
 if __name__ == "__main__":
-    app.run('0.0.0.0', port=4000)
\ No newline at end of file
+    # threaded, so renders can wait for the pool without holding up everything else
+    # and without the reloader, which would import this twice, and start two render pools
+    app.run('0.0.0.0', port=4000, threaded=True, use_reloader=False)